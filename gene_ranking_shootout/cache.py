@@ -0,0 +1,175 @@
+"""Persistent cache of ranking results.
+
+The cache is a SQLite database that maps a hash of the runner identity and the normalized query
+to the ranked gene list.  It may be shared by multiple runs and methods at the same time.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+import typing
+
+import attrs
+from loguru import logger
+
+
+def default_cache_dir() -> pathlib.Path:
+    """Return the directory for cached data, following the XDG conventions."""
+    base = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(base) / "gene-ranking-shootout"
+
+
+def default_cache_path() -> pathlib.Path:
+    """Return the default path of the ranking cache database."""
+    return default_cache_dir() / "rankings.sqlite3"
+
+
+def hash_json(value: typing.Any) -> str:
+    """Return SHA256 hex digest of the canonical JSON representation of ``value``."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+@attrs.define()
+class CacheStats:
+    """Hit and miss counts of the cache."""
+
+    #: The number of lookups that were answered from the cache.
+    hits: int = 0
+    #: The number of lookups that were not found in the cache.
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class RankingCache:
+    """On-disk cache of ranked gene lists with size-bounded LRU eviction.
+
+    Each process opens its own connection to the database; SQLite's locking makes concurrent
+    use from multiple processes safe.
+
+    :param path: Path to the SQLite database, created if necessary.
+    :param max_size: Maximal total size of the cached values in bytes.
+    """
+
+    #: Number of insertions between checks of the total size.
+    evict_interval = 1000
+
+    def __init__(self, path: typing.Union[str, pathlib.Path], *, max_size: int = 2**30):
+        #: Path to the database.
+        self.path = pathlib.Path(path)
+        #: Maximal total size of the cached values in bytes.
+        self.max_size = max_size
+        #: Lookup statistics.
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._conn: typing.Optional[sqlite3.Connection] = None
+        self._puts = 0
+
+    def __getstate__(self):
+        return {"path": self.path, "max_size": self.max_size}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], max_size=state["max_size"])  # type: ignore[misc]
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60.0, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rankings (
+                    key TEXT PRIMARY KEY,
+                    runner TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS rankings_lru ON rankings (last_used)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS rankings_runner ON rankings (runner)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(runner_hash: str, query: typing.Any) -> str:
+        """Return the cache key for ``query`` run by the runner with ``runner_hash``."""
+        return hash_json([runner_hash, query])
+
+    def contains(self, key: str) -> bool:
+        """Return whether there is a cached ranking for ``key``, without counting a lookup."""
+        with self._lock:
+            row = self.conn.execute("SELECT 1 FROM rankings WHERE key = ?", (key,)).fetchone()
+            return row is not None
+
+    def get(self, key: str) -> typing.Optional[typing.List[str]]:
+        """Return cached ranking for ``key`` or ``None``; counts a hit or miss."""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM rankings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            self.conn.execute("UPDATE rankings SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return json.loads(row[0])
+
+    def put(self, key: str, runner_hash: str, ranking: typing.List[str]):
+        """Store ``ranking`` for ``key``."""
+        value = json.dumps(ranking)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rankings VALUES (?, ?, ?, ?, ?)",
+                (key, runner_hash, value, len(value), time.time()),
+            )
+            self.conn.commit()
+            self._puts += 1
+            if self._puts % self.evict_interval == 0:
+                self._evict()
+
+    def invalidate(self, runner_hash: typing.Optional[str] = None):
+        """Remove the entries of the runner with ``runner_hash``, or all entries."""
+        with self._lock:
+            if runner_hash is None:
+                cursor = self.conn.execute("DELETE FROM rankings")
+            else:
+                cursor = self.conn.execute("DELETE FROM rankings WHERE runner = ?", (runner_hash,))
+            self.conn.commit()
+            logger.info("Removed {} entries from ranking cache", cursor.rowcount)
+
+    def evict(self):
+        """Remove least recently used entries until the total size is below ``max_size``."""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        (total,) = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM rankings").fetchone()
+        if total <= self.max_size:
+            return
+        removed = 0
+        rows = self.conn.execute("SELECT key, size FROM rankings ORDER BY last_used").fetchall()
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            self.conn.execute("DELETE FROM rankings WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        self.conn.commit()
+        logger.debug("Evicted {} entries from ranking cache", removed)
+
+    def close(self):
+        """Run eviction and close the database connection."""
+        if self._conn is not None:
+            self.evict()
+            with self._lock:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,51 @@
+"""CADA tool module for ``worker_shim.py`` that loads the model once per worker.
+
+This file is mounted into the CADA container next to the worker shim and must only use the
+standard library and the dependencies of CADA (NumPy, NetworkX, gensim).  ``load()`` reads the
+knowledge graph and the node2vec embedding from the CADA checkout (``/app`` in the image), which
+takes seconds, and ``run()`` then answers each request like ``CADA --hpo_terms ... --out_dir
+...`` in milliseconds: each gene of the graph is scored by the mean inner product of its
+embedding with the embeddings of the HPO terms, and ``result.txt`` lists the genes by
+descending score.  HPO terms that are not in the model are skipped; if none is left, the run
+fails like CADA's.
+"""
+
+import argparse
+import os
+import pickle
+
+import numpy as np
+
+#: Path of the knowledge graph in the CADA checkout.
+GRAPH_PATH = os.path.join("data", "processed", "knowledge_graph", "unweighted", "train100.gpickle")
+#: Path of the node2vec embedding in the CADA checkout.
+MODEL_PATH = os.path.join("models", "unweighted", "node2vec.model")
+
+
+def load(cada_dir="/app"):
+    """Return the gene IDs of the graph and the embedding of CADA in ``cada_dir``."""
+    from gensim.models import Word2Vec
+
+    with open(os.path.join(cada_dir, GRAPH_PATH), "rb") as inputf:
+        graph = pickle.load(inputf)
+    vectors = Word2Vec.load(os.path.join(cada_dir, MODEL_PATH)).wv
+    gene_ids = [node for node in graph.nodes() if str(node).startswith("Entrez:")]
+    return gene_ids, np.array([vectors[gene_id] for gene_id in gene_ids]), vectors
+
+
+def run(state, args):
+    """Rank the genes for the HPO terms of ``args`` and write ``result.txt``."""
+    parser = argparse.ArgumentParser(prog="CADA")
+    parser.add_argument("--hpo_terms", required=True)
+    parser.add_argument("--out_dir", required=True)
+    parsed = parser.parse_args(args)
+
+    gene_ids, gene_vectors, vectors = state
+    hpo_terms = [term for term in parsed.hpo_terms.split(",") if term in vectors]
+    if not hpo_terms:
+        raise SystemExit("no valid HPO terms in query")
+    scores = gene_vectors @ np.mean([vectors[term] for term in hpo_terms], axis=0)
+    with open(os.path.join(parsed.out_dir, "result.txt"), "wt") as outputf:
+        outputf.write("rank\tgene_id\tgene_name\tscore\n")
+        for rank, i in enumerate(np.argsort(-scores, kind="stable"), 1):
+            outputf.write(f"{rank}\t{gene_ids[i]}\t\t{scores[i]}\n")
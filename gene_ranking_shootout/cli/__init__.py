@@ -1,18 +1,39 @@
-"""CLI interface"""
+"""CLI interface
 
-import csv
+The modules of the package, and with them NumPy, requests etc., are imported in the commands
+that use them rather than here, so that each command only pays for the imports it needs; see
+``benchmark startup``.
+"""
+
+import importlib
 import json
-import pathlib
+import shlex
 import sys
 import typing
 
-import attrs
-import cattrs
 import click
 from loguru import logger
-import numpy as np
 
-from gene_ranking_shootout import models, runner
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from gene_ranking_shootout import cache as cache_
+
+
+class LazyChoice(click.Choice):
+    """``click.Choice`` with the choices from ``module.attribute``, imported when first needed.
+
+    :param module: The module defining the choices, e.g., ``"gene_ranking_shootout.strata"``.
+    :param attribute: The name of the choices in ``module``, e.g., ``"STRATIFICATIONS"``.
+    """
+
+    def __init__(self, module: str, attribute: str, case_sensitive: bool = True):
+        # ``click.Choice.__init__()`` would set ``choices``, which is computed here.
+        self.module = module
+        self.attribute = attribute
+        self.case_sensitive = case_sensitive
+
+    @property
+    def choices(self) -> typing.Sequence[str]:  # type: ignore[override]
+        return list(getattr(importlib.import_module(self.module), self.attribute))
 
 
 @click.group()
@@ -33,78 +54,733 @@ def benchmark():
 
 
 @benchmark.command()
-@click.option("--bars-top-n", default=10)
+@click.option("--bars-top-n", default=10, help="Number of ranks to show bars and top-k for.")
 @click.option("--total-width", default=80)
+@click.option(
+    "--format",
+    "format_",
+    type=click.Choice(["bars", "json", "tsv"]),
+    default="bars",
+    help="Bars with the main metrics, or all metrics as JSON or TSV.",
+)
+@click.option(
+    "--bootstrap", default=2000, help="Number of bootstrap resamples, 0 for no intervals."
+)
+@click.option("--confidence", default=0.95, help="Confidence level of the intervals.")
+@click.option("--seed", default=42, help="Seed for the bootstrap resamples.")
+@click.option(
+    "--by",
+    multiple=True,
+    type=LazyChoice("gene_ranking_shootout.strata", "STRATIFICATIONS"),
+    help="Also show the metrics by this feature of the cases, may be given multiple times.",
+)
+@click.option("--omim-top-n", default=20, help="Number of OMIM diseases to show for --by omim.")
+@click.option(
+    "--strata-datasets",
+    default=None,
+    help="Comma-separated datasets for --by dataset; a case belongs to the first containing it "
+    "[default: cada_clinvar_cases,cada_collaborator_cases].",
+)
 @click.argument("results_json")
-def summarize(results_json, bars_top_n, total_width):
+def summarize(
+    results_json,
+    bars_top_n,
+    total_width,
+    format_,
+    bootstrap,
+    confidence,
+    seed,
+    by,
+    omim_top_n,
+    strata_datasets,
+):
     """Summarize the results."""
-    with open(results_json, "rt") as inf:
-        results = cattrs.structure(json.load(inf), typing.List[models.Result])
-    runner.BarPrinter(bars_top_n=bars_top_n, total_width=total_width).print(results)
+    from gene_ranking_shootout import genes as genes_
+    from gene_ranking_shootout import metrics as metrics_
+    from gene_ranking_shootout import strata as strata_
+
+    table = None
+    if by:
+        table = strata_.ResultTable.read(results_json)
+        ranks = table.ranks
+    else:
+        ranks = metrics_.read_ranks(results_json)
+    metrics = metrics_.Metrics.from_ranks(
+        ranks, max_k=bars_top_n, bootstrap=bootstrap, confidence=confidence, seed=seed
+    )
+    strata = {}
+    if table is not None:
+        genes = genes_.GeneTable.load() if "gene-prior" in by else None
+        for name in by:
+            strata[name] = strata_.stratify(
+                table,
+                name,
+                max_k=bars_top_n,
+                genes=genes,
+                omim_top_n=omim_top_n,
+                datasets=(
+                    strata_datasets.split(",") if strata_datasets else strata_.DEFAULT_DATASETS
+                ),
+            )
+    if format_ == "json":
+        data = metrics.to_json()
+        if strata:
+            data["strata"] = {
+                name: [dict(stratum=label, **m.to_json()) for label, m in values]
+                for name, values in strata.items()
+            }
+        json.dump(data, sys.stdout, indent=2)
+        print()
+    elif format_ == "tsv":
+        metrics.write_tsv(sys.stdout, label=results_json)
+        for name, values in strata.items():
+            for label, m in values:
+                m.write_tsv(sys.stdout, header=False, label=results_json, stratum=f"{name}={label}")
+    else:
+        metrics_.BarPrinter(bars_top_n=bars_top_n, total_width=total_width).print_ranks(ranks)
+        print()
+        metrics.print(sys.stdout)
+        for name, values in strata.items():
+            print()
+            strata_.print_strata(name, values, sys.stdout)
 
 
 @benchmark.command()
-@click.option("--bars-top-n", default=10)
+@click.option("--bars-top-n", default=10, help="Number of ranks to compute top-k for.")
+@click.option(
+    "--format",
+    "format_",
+    type=click.Choice(["text", "json", "tsv"]),
+    default="text",
+    help="Text tables, or JSON or TSV.",
+)
+@click.option(
+    "--bootstrap", default=1000, help="Number of bootstrap resamples, 0 for no intervals."
+)
+@click.option("--confidence", default=0.95, help="Confidence level of the intervals.")
+@click.option("--seed", default=42, help="Seed for the bootstrap resamples.")
+@click.argument("results_json", nargs=-1, required=True)
+def compare(results_json, bars_top_n, format_, bootstrap, confidence, seed):
+    """Compare the results of several methods on the same cases.
+
+    Shows the metrics of each method and, for each pair of methods, the wins, ties, differences
+    of the mean rank and MRR, and the p-values of the sign and Wilcoxon signed-rank tests.
+    """
+    from gene_ranking_shootout import compare as compare_
+
+    try:
+        comparison = compare_.Comparison.from_files(
+            results_json, max_k=bars_top_n, bootstrap=bootstrap, confidence=confidence, seed=seed
+        )
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    if format_ == "json":
+        json.dump(comparison.to_json(), sys.stdout, indent=2)
+        print()
+    elif format_ == "tsv":
+        comparison.write_tsv(sys.stdout)
+    else:
+        comparison.print(sys.stdout)
+
+
+@benchmark.command("perf-report")
+@click.option("--slowest", default=10, help="Number of slowest cases to list.")
 @click.option("--total-width", default=80)
+@click.argument("results_json", nargs=-1, required=True)
+def perf_report(results_json, slowest, total_width):
+    """Report the per-phase latencies and throughput of runs."""
+    from gene_ranking_shootout import models
+    from gene_ranking_shootout import perf as perf_
+
+    for i, path in enumerate(results_json):
+        if len(results_json) > 1:
+            if i:
+                print()
+            print(f"== {path} ==")
+        summary = perf_.PerfSummary.from_results(models.iter_results(path), slowest=slowest)
+        summary.print(sys.stdout, total_width=total_width)
+
+
+@benchmark.command()
+@click.option("--keep-top-k", default=0, help="Only keep the top K genes of each result (0: all).")
+@click.argument("results_in")
+@click.argument("results_out")
+def convert(results_in, results_out, keep_top_k):
+    """Convert results between JSON Lines and the compact format.
+
+    The format of RESULTS_OUT is the compact columnar one if it ends in ``.npz`` and JSON Lines
+    otherwise; RESULTS_IN may be in either format.
+    """
+    from gene_ranking_shootout import results as results_
+
+    count = results_.convert(results_in, results_out, keep_top_k=keep_top_k)
+    logger.info("Wrote {} results to {}", count, results_out)
+
+
+@benchmark.command()
+@click.option(
+    "--cases",
+    "simulated_json",
+    default=None,
+    help="The cases of the complete run, for checking that each has exactly one result.",
+)
+@click.option("--allow-missing", is_flag=True, help="Do not fail for cases without result.")
+@click.argument("results_out")
+@click.argument("results_in", nargs=-1, required=True)
+def merge(results_out, results_in, simulated_json, allow_missing):
+    """Merge the results of the shards of a run.
+
+    Fails if a case has more than one result or, with --cases, if a case has no result or a
+    result is not for one of the cases.  The results are written in the order of the cases,
+    in the compact format if RESULTS_OUT ends in ``.npz``.
+    """
+    from gene_ranking_shootout import models
+    from gene_ranking_shootout import shards as shards_
+
+    cases = models.load_cases_json(simulated_json) if simulated_json else None
+    try:
+        report = shards_.merge_results(
+            results_in, results_out, cases=cases, allow_missing=allow_missing
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if report.missing:
+        logger.warning("{} cases have no result", len(report.missing))
+    logger.info("Wrote {} results to {}", report.results, results_out)
+
+
+@benchmark.command()
+@click.option("--repeat", default=5, help="Number of runs of each command.")
+@click.option("--top", default=15, help="Number of slowest imports to list.")
+def startup(repeat, top):
+    """Measure the startup time of the command line interface.
+
+    Runs a few lightweight commands in fresh interpreters and breaks down the import time of
+    the CLI module.
+    """
+    from gene_ranking_shootout import startup as startup_
+
+    startup_.print_measurements(startup_.measure(repeat=repeat), sys.stdout)
+    print()
+    startup_.print_import_times(startup_.import_times(), sys.stdout, top=top)
+
+
+def parse_int_list(ctx, param, value):
+    """Click callback for parsing comma-separated lists of integers."""
+    try:
+        return [int(item) for item in value.split(",")]
+    except ValueError:
+        raise click.BadParameter(f"not a comma-separated list of integers: {value}")
+
+
+def parse_shard(ctx, param, value):
+    """Click callback for parsing ``--shard I/N``."""
+    if value is None:
+        return None
+    from gene_ranking_shootout import simulate as simulate_
+
+    try:
+        return simulate_.parse_shard(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+@benchmark.command()
+@click.option(
+    "--scenario",
+    "scenarios",
+    multiple=True,
+    type=LazyChoice("gene_ranking_shootout.overhead", "SCENARIOS"),
+    help="Scenario to measure, may be given multiple times [default: all].",
+)
+@click.option("--case-counts", default="100,1000", callback=parse_int_list)
+@click.option("--concurrency", "concurrencies", default="1,8", callback=parse_int_list)
+@click.option(
+    "--latency", default=0.01, help="Seconds that the stand-in servers and tools take per query."
+)
+@click.option(
+    "--startup", default=0.0, help="Seconds that the fake podman takes for starting a container."
+)
+@click.option(
+    "--fixtures-dir", default=None, help="The test fixtures [default: tests/data of the repo]."
+)
+@click.option("--output", default=None, help="Write the measurements to this JSON Lines file.")
+@click.option("--baseline", default=None, help="Compare with measurements from --output.")
+def overhead(
+    scenarios, case_counts, concurrencies, latency, startup, fixtures_dir, output, baseline
+):
+    """Measure the throughput of the runners against local stand-ins of the methods.
+
+    Runs without network access, containers, or the tools; see
+    ``gene_ranking_shootout/overhead.py`` for details.
+    """
+    from gene_ranking_shootout import overhead as overhead_
+
+    try:
+        fixtures_dir = overhead_.check_fixtures_dir(fixtures_dir or overhead_.FIXTURES_DIR)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    baseline_by_key = None
+    if baseline:
+        baseline_by_key = {m.key: m for m in overhead_.load_measurements(baseline)}
+    outf = open(output, "wt") if output else None
+    try:
+        overhead_.print_header(sys.stdout, baseline=baseline_by_key is not None)
+        for measurement in overhead_.run_suite(
+            scenarios or list(overhead_.SCENARIOS),
+            case_counts,
+            concurrencies,
+            latency=latency,
+            startup=startup,
+            fixtures_dir=fixtures_dir,
+        ):
+            overhead_.print_measurement(measurement, sys.stdout, baseline=baseline_by_key)
+            if outf:
+                overhead_.dump_measurement_jsonl(measurement, outf)
+                outf.flush()
+    finally:
+        if outf:
+            outf.close()
+
+
+@benchmark.command()
+@click.option(
+    "--runner",
+    "runner_name",
+    required=True,
+    type=LazyChoice("gene_ranking_shootout.matrix", "RUNNERS"),
+    help="The method to run.",
+)
+@click.option(
+    "--args",
+    "args_json",
+    default="{}",
+    help='Keyword arguments of the runner as JSON object, e.g., \'{"base_url": "..."}\'.',
+)
+@click.option(
+    "--candidate-counts",
+    default="10,20,50,100,200,500",
+    callback=parse_int_list,
+    help="Numbers of candidate genes to run the cases with.",
+)
+@click.option("--case-count", default=100, help="Number of cases per candidate count.")
+@click.option(
+    "--dataset",
+    "dataset_name",
+    default="cada_cases_test",
+    help="Bundled dataset or path of the cases to simulate from.",
+)
+@click.option("--seed", default=42)
+@click.option(
+    "--stand-in",
+    is_flag=True,
+    help="Run against a local stand-in of the web service instead, e.g., for testing offline.",
+)
+@click.option("--latency", default=0.01, help="Seconds the stand-in takes per query.")
+@click.option(
+    "--gene-latency", default=0.0, help="Seconds the stand-in takes additionally per gene."
+)
+@click.option(
+    "--format",
+    "format_",
+    type=click.Choice(["text", "json"]),
+    default="text",
+    help="Table or JSON.",
+)
+@click.option("--output", default=None, help="Also write the JSON report to this file.")
+@click.option("--results-dir", default=None, help="Keep the results of each candidate count here.")
+def sweep(
+    runner_name,
+    args_json,
+    candidate_counts,
+    case_count,
+    dataset_name,
+    seed,
+    stand_in,
+    latency,
+    gene_latency,
+    format_,
+    output,
+    results_dir,
+):
+    """Measure latency, throughput, and accuracy of a method by number of candidate genes.
+
+    Simulates cases with each of the candidate counts from the dataset and runs them with the
+    method, see ``gene_ranking_shootout/sweep.py`` for details.
+    """
+    import contextlib
+    import os
+
+    from gene_ranking_shootout import datasets as datasets_
+    from gene_ranking_shootout import sweep as sweep_
+
+    try:
+        args = json.loads(args_json)
+    except json.JSONDecodeError as e:
+        raise click.BadParameter(f"not a JSON object: {e}", param_hint="--args")
+    if os.path.exists(dataset_name):
+        cases = datasets_.Dataset.load(dataset_name)
+    else:
+        cases = datasets_.load_dataset(dataset_name)
+    with contextlib.ExitStack() as stack:
+        if stand_in:
+            try:
+                args.update(
+                    stack.enter_context(
+                        sweep_.stand_in_args(
+                            runner_name, latency=latency, gene_latency=gene_latency
+                        )
+                    )
+                )
+            except ValueError as e:
+                raise click.UsageError(str(e))
+        points = []
+        for point in sweep_.run_sweep(
+            runner_name,
+            args,
+            cases,
+            candidate_counts,
+            case_count=case_count,
+            seed=seed,
+            results_dir=results_dir,
+        ):
+            points.append(point)
+    report = sweep_.SweepReport(runner=runner_name, points=points)
+    if format_ == "json":
+        sweep_.write_report(report)
+    else:
+        report.print(sys.stdout)
+    if output:
+        sweep_.write_report(report, output)
+
+
+def cache_options(func):
+    """Decorator that adds the options for the ranking cache and for resuming."""
+    options = [
+        click.option(
+            "--cache-path",
+            default=None,
+            help="Path to the ranking cache database "
+            "[default: gene-ranking-shootout/rankings.sqlite3 in $XDG_CACHE_HOME or ~/.cache]",
+        ),
+        click.option("--no-cache", is_flag=True, help="Bypass the ranking cache."),
+        click.option(
+            "--cache-invalidate",
+            is_flag=True,
+            help="Remove the method's cached rankings before running, e.g., after a tool update.",
+        ),
+        click.option("--cache-max-size", default=1024, help="Maximal cache size in MB."),
+        click.option(
+            "--resume", is_flag=True, help="Only run the cases missing from the results file."
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def make_cache(
+    cache_path: typing.Optional[str], no_cache: bool, cache_max_size: int
+) -> typing.Optional["cache_.RankingCache"]:
+    """Return the ranking cache configured by the ``cache_options``."""
+    from gene_ranking_shootout import cache as cache_
+
+    if no_cache:
+        return None
+    return cache_.RankingCache(
+        cache_path or cache_.default_cache_path(), max_size=cache_max_size * 2**20
+    )
+
+
+def runner_options(func):
+    """Decorator that adds the options shared by all commands running a benchmark."""
+    options = [
+        click.option("--bars-top-n", default=10),
+        click.option("--total-width", default=80),
+        cache_options,
+        click.option(
+            "--backend",
+            type=LazyChoice("gene_ranking_shootout.executor", "BACKENDS"),
+            default=None,
+            help="How to run cases in parallel [default: thread with --concurrency, else serial]",
+        ),
+        click.option(
+            "--concurrency",
+            default=0,
+            help="Number of cases in flight at the same time (threads/processes).",
+        ),
+        click.option(
+            "--chunksize", default=0, help="Cases per task for the process backend (0: auto)."
+        ),
+        click.option(
+            "--unordered",
+            is_flag=True,
+            help="Write results as they finish rather than in the order of the cases.",
+        ),
+        click.option(
+            "--timeout", default=60.0, help="Timeout in seconds for each HTTP request attempt."
+        ),
+        click.option(
+            "--retries",
+            default=3,
+            help="Number of retries of HTTP requests on timeouts and transient errors.",
+        ),
+        click.option(
+            "--deadline",
+            default=None,
+            type=float,
+            help="Maximal seconds for all attempts of an HTTP request, including the retries.",
+        ),
+        click.option(
+            "--adaptive-concurrency",
+            is_flag=True,
+            help="Reduce the HTTP requests in flight when the server gets slow or fails.",
+        ),
+        click.option(
+            "--keep-top-k",
+            default=0,
+            help="Only write the top K genes of each result, e.g., if only metrics are needed.",
+        ),
+        click.option(
+            "--shard",
+            default=None,
+            callback=parse_shard,
+            help="Only run every N-th case from the I-th one (I/N, 1-based), "
+            "combine the shards' results with benchmark merge.",
+        ),
+        click.option(
+            "--work-queue",
+            default=None,
+            help="Run chunks of cases claimed from this directory shared with other workers; "
+            "the last worker merges the results into RESULTS_JSON.",
+        ),
+        click.option("--chunk-size", default=100, help="Number of cases per work queue chunk."),
+        click.option(
+            "--requeue-after",
+            default=None,
+            type=float,
+            help="Requeue work queue chunks claimed longer than this many seconds ago, "
+            "e.g., by crashed workers.",
+        ),
+        click.option(
+            "--metrics-port",
+            default=None,
+            type=int,
+            help="Serve live metrics on this port of 127.0.0.1 at /metrics (Prometheus) "
+            "and /metrics.json while running (0: a free port).",
+        ),
+        click.option(
+            "--metrics-file",
+            default=None,
+            help="Write live metrics to this file while running, in the Prometheus text "
+            "format if it ends in .prom and as JSON otherwise.",
+        ),
+        click.option(
+            "--metrics-interval", default=10.0, help="Seconds between writes of --metrics-file."
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def run_benchmark(
+    runner_name: str,
+    *args,
+    simulated_json: str,
+    results_json: str,
+    cache_path: typing.Optional[str],
+    no_cache: bool,
+    cache_invalidate: bool,
+    cache_max_size: int,
+    resume: bool,
+    unordered: bool,
+    shard: typing.Optional[typing.Tuple[int, int]],
+    work_queue: typing.Optional[str],
+    chunk_size: int,
+    requeue_after: typing.Optional[float],
+    **kwargs,
+):
+    """Construct runner ``runner.<runner_name>`` with ``args`` and ``kwargs`` and run the
+    benchmark.
+    """
+    from gene_ranking_shootout import runner
+
+    if work_queue and (shard or resume):
+        raise click.UsageError("--work-queue cannot be combined with --shard or --resume")
+    cache = make_cache(cache_path, no_cache, cache_max_size)
+    the_runner = getattr(runner, runner_name)(*args, cache=cache, ordered=not unordered, **kwargs)
+    if cache_invalidate:
+        the_runner.invalidate_cache()
+    if work_queue:
+        the_runner.run_queue(
+            simulated_json,
+            work_queue,
+            results_json,
+            chunk_size=chunk_size,
+            requeue_after=requeue_after,
+        )
+    else:
+        the_runner.run(simulated_json, results_json, resume=resume, shard=shard)
+
+
+@benchmark.command()
+@runner_options
 @click.argument("base_url")
 @click.argument("simulated_json")
 @click.argument("results_json")
-def varfish_phenix(base_url, simulated_json, results_json, bars_top_n, total_width):
+def varfish_phenix(base_url, simulated_json, results_json, **kwargs):
     """Benchmark the VarFish implementation of the Phenix algorithm."""
-    runner.PhenixVarFishRunner(base_url, bars_top_n=bars_top_n, total_width=total_width).run(
-        simulated_json, results_json
+    run_benchmark(
+        "PhenixVarFishRunner",
+        base_url,
+        simulated_json=simulated_json,
+        results_json=results_json,
+        **kwargs,
     )
 
 
 @benchmark.command()
-@click.option("--bars-top-n", default=10)
-@click.option("--total-width", default=80)
+@runner_options
+@click.option("--batch-size", default=1024, help="Number of cases to score at once.")
+@click.argument("hpo_dir")
 @click.argument("simulated_json")
 @click.argument("results_json")
-def phen2gene(simulated_json, results_json, bars_top_n, total_width):
+def phenix(hpo_dir, simulated_json, results_json, **kwargs):
+    """Benchmark the built-in implementation of the Phenix algorithm.
+
+    HPO_DIR contains ``hp.obo`` and ``genes_to_phenotype.txt`` from an HPO release.
+    """
+    run_benchmark(
+        "PhenixRunner",
+        hpo_dir,
+        simulated_json=simulated_json,
+        results_json=results_json,
+        **kwargs,
+    )
+
+
+@benchmark.command()
+@runner_options
+@click.option("--workers", default=0, help="Number of persistent worker containers to use.")
+@click.option("--worker-cmd", default=None, help="Command for starting a worker.")
+@click.option("--batch-size", default=1, help="Number of cases to run per container.")
+@click.argument("simulated_json")
+@click.argument("results_json")
+def phen2gene(simulated_json, results_json, worker_cmd, **kwargs):
     """Benchmark the Phen2Gene container."""
-    runner.Phen2GeneRunner(bars_top_n=bars_top_n, total_width=total_width).run(
-        simulated_json, results_json
+    run_benchmark(
+        "Phen2GeneRunner",
+        simulated_json=simulated_json,
+        results_json=results_json,
+        worker_cmd=shlex.split(worker_cmd) if worker_cmd else None,
+        **kwargs,
     )
 
 
 @benchmark.command()
-@click.option("--bars-top-n", default=10)
-@click.option("--total-width", default=80)
+@runner_options
+@click.option(
+    "--api-url", default=None, help="URL of the AMELIE API [default: the public AMELIE API]."
+)
 @click.argument("simulated_json")
 @click.argument("results_json")
-def amelie(simulated_json, results_json, bars_top_n, total_width):
+def amelie(simulated_json, results_json, api_url, **kwargs):
     """Benchmark the AMELIE web server."""
-    runner.AmelieRunner(bars_top_n=bars_top_n, total_width=total_width).run(
-        simulated_json, results_json
+    if api_url:
+        kwargs["api_url"] = api_url
+    run_benchmark(
+        "AmelieRunner", simulated_json=simulated_json, results_json=results_json, **kwargs
     )
 
 
 @benchmark.command()
-@click.option("--bars-top-n", default=10)
-@click.option("--total-width", default=80)
-@click.option("--threads", default=0)
+@runner_options
+@click.option("--threads", default=0, help="Shortcut for --backend process --concurrency N.")
+@click.option("--workers", default=0, help="Number of persistent worker containers to use.")
+@click.option("--worker-cmd", default=None, help="Command for starting a worker.")
+@click.option("--batch-size", default=1, help="Number of cases to run per container.")
 @click.argument("simulated_json")
 @click.argument("results_json")
-def cada(simulated_json, results_json, bars_top_n, total_width, threads):
+def cada(simulated_json, results_json, worker_cmd, **kwargs):
     """Benchmark the CADA container."""
-    runner.CadaRunner(bars_top_n=bars_top_n, total_width=total_width, threads=threads).run(
-        simulated_json, results_json
+    run_benchmark(
+        "CadaRunner",
+        simulated_json=simulated_json,
+        results_json=results_json,
+        worker_cmd=shlex.split(worker_cmd) if worker_cmd else None,
+        **kwargs,
     )
 
 
 @benchmark.command()
-@click.option("--bars-top-n", default=10)
-@click.option("--total-width", default=80)
+@runner_options
 @click.argument("base_url")
 @click.argument("algorithm")
 @click.argument("simulated_json")
 @click.argument("results_json")
-def exomiser(base_url, algorithm, simulated_json, results_json, bars_top_n, total_width):
+def exomiser(base_url, algorithm, simulated_json, results_json, **kwargs):
     """Benchmark the Exomiser REST Prioritizer."""
-    runner.ExomiserRunner(base_url, algorithm, bars_top_n=bars_top_n, total_width=total_width).run(
-        simulated_json, results_json
+    run_benchmark(
+        "ExomiserRunner",
+        base_url,
+        algorithm,
+        simulated_json=simulated_json,
+        results_json=results_json,
+        **kwargs,
+    )
+
+
+@benchmark.command("run-matrix")
+@cache_options
+@click.argument("config_json")
+@click.argument("simulated_json")
+@click.argument("results_dir")
+def run_matrix(
+    config_json,
+    simulated_json,
+    results_dir,
+    cache_path,
+    no_cache,
+    cache_invalidate,
+    cache_max_size,
+    resume,
+):
+    """Run all methods from CONFIG_JSON at the same time.
+
+    Writes the results of each method to RESULTS_DIR/<name>.jsonl; see
+    ``gene_ranking_shootout/matrix.py`` for the format of CONFIG_JSON.
+    """
+    from gene_ranking_shootout import matrix as matrix_
+    from gene_ranking_shootout import metrics as metrics_
+    from gene_ranking_shootout import models
+
+    config = matrix_.load_config(config_json)
+    logger.info("Loading cases ...")
+    cases = models.load_cases_json(simulated_json)
+    logger.info("... done loading {} cases", len(cases))
+    logger.info("Running {} methods ...", len(config.expanded()))
+    outcomes = matrix_.run_matrix(
+        config,
+        cases,
+        results_dir,
+        make_cache=lambda: make_cache(cache_path, no_cache, cache_max_size),
+        cache_invalidate=cache_invalidate,
+        resume=resume,
     )
+    printer = metrics_.BarPrinter(bars_top_n=10, total_width=40)
+    for outcome in outcomes:
+        if outcome.error is not None:
+            logger.error(
+                "{} failed after {:.1f}s: {}", outcome.name, outcome.seconds, outcome.error
+            )
+            continue
+        logger.info(
+            "{} done in {:.1f}s, results in {}", outcome.name, outcome.seconds, outcome.path
+        )
+        printer.print(models.iter_results(outcome.path))
+    if any(outcome.error is not None for outcome in outcomes):
+        sys.exit(1)
 
 
 @main.group()
@@ -115,16 +791,16 @@ def dataset():
 @dataset.command("list")
 def list_():
     """Listing of available data sets."""
-    # List all files ending in .json in the data directory
-    data_dir = pathlib.Path(__file__).parent.parent / "data"
-    for path in data_dir.glob("*.json"):
-        print(path.stem)
+    from gene_ranking_shootout import datasets as datasets_
+
+    for name in datasets_.list_datasets():
+        print(name)
 
 
 def load_dataset(dataset):
-    data_dir = pathlib.Path(__file__).parent.parent / "data"
-    path = data_dir / f"{dataset}.json"
-    return models.load_cases_json(path)
+    from gene_ranking_shootout import datasets as datasets_
+
+    return datasets_.load_dataset(dataset)
 
 
 @dataset.command()
@@ -132,19 +808,67 @@ def load_dataset(dataset):
 @click.option("--count", default=10)
 def head(dataset, count):
     """Display first entry in the given dataset."""
+    import cattrs
+
     cases = load_dataset(dataset)
     for case in cases[:count]:
         print(json.dumps(cattrs.unstructure(case)))
 
 
+@dataset.command()
+@click.argument("json_in")
+@click.argument("dataset_out")
+def compile(json_in, dataset_out):
+    """Compile JSON (Lines) file into a memory-mapped dataset directory.
+
+    The input may be gzip compressed and is compiled in chunks, so files of any size can be
+    compiled.
+
+    The bundled datasets are compiled automatically on first use.
+    """
+    from gene_ranking_shootout import datasets as datasets_
+    from gene_ranking_shootout import models
+
+    logger.info("Compiling {} to {}", json_in, dataset_out)
+    count = datasets_.write_dataset(models.iter_cases(json_in), dataset_out)
+    logger.info("Wrote {} cases", count)
+
+
 @dataset.command()
 @click.argument("out_json")
 @click.argument("datasets", nargs=-1)
 @click.option("--seed", default=42)
 @click.option("--case-count", default=10)
 @click.option("--candidate-genes-count", default=19)
-def simulate(out_json, datasets, case_count, candidate_genes_count, seed):
-    """Simulate cases based on the dataset file."""
+@click.option(
+    "--with-replacement",
+    is_flag=True,
+    help="Pick cases with replacement, e.g., for more cases than in the datasets.",
+)
+@click.option(
+    "--shard",
+    default=None,
+    callback=parse_shard,
+    help="Only simulate the I-th of N parts (I/N, 1-based), requires .jsonl output.",
+)
+@click.option("--workers", default=1, help="Number of processes to simulate with.")
+def simulate(
+    out_json, datasets, case_count, candidate_genes_count, seed, with_replacement, shard, workers
+):
+    """Simulate cases based on the dataset file.
+
+    Writes JSON Lines if OUT_JSON ends in ``.jsonl``, and a JSON array otherwise.  The output
+    only depends on the seed, not on ``--workers``, and concatenating the files of all shards
+    gives the file of a run without ``--shard``.
+    """
+    from gene_ranking_shootout import executor as executor_
+    from gene_ranking_shootout import genes as genes_
+    from gene_ranking_shootout import models
+    from gene_ranking_shootout import simulate as simulate_
+
+    if shard is not None and not out_json.endswith(".jsonl"):
+        raise click.UsageError("--shard requires an output file ending in .jsonl")
+    shard = shard or (1, 1)
     # Load dataset and all genes from ``gnomad_counts.tsv``.
     logger.info("Loading data")
     cases = []
@@ -158,71 +882,57 @@ def simulate(out_json, datasets, case_count, candidate_genes_count, seed):
             cases.append(case)
             seen_case_names.add(case.name)
     logger.info("... {} cases overall ({} duplicates)", len(cases), skipped)
-    gnomad_counts = models.load_gnomad_counts()
-    gnomad_counts_idx = np.array(range(len(gnomad_counts)))
-    gnomad_counts_values = np.array([gene.count for gene in gnomad_counts]).astype(np.float64)
-    gnomad_counts_sum = np.sum(gnomad_counts_values)
-    gnomad_counts_ps = np.divide(gnomad_counts_values, gnomad_counts_sum)
+    genes = genes_.GeneTable.load()
     logger.info("Simulating cases")
-    # Create random number generator.
-    rng = np.random.default_rng(seed)
-    # Pick cases
-    cases_idxs = np.array(range(len(cases)))
-    cases_idx = rng.choice(cases_idxs, size=case_count, replace=False)
-    selected_cases = [cases[idx] for idx in cases_idx]
-    # For each case, pick random candidate genes.
-    simulated = []
-    for case in selected_cases:
-        candidate_gene_idxs = rng.choice(
-            gnomad_counts_idx, size=candidate_genes_count + 1, replace=False, p=gnomad_counts_ps
-        ).tolist()
-        candidate_genes = [gnomad_counts[idx] for idx in candidate_gene_idxs]
-        if case.disease_gene_id in candidate_genes:
-            candidate_genes.remove(case.disease_gene_id)
-        else:
-            candidate_genes.pop()
-        rng.shuffle(candidate_genes)
-        simulated.append(
-            attrs.evolve(case, candidate_gene_ids=[gene.entrez_id for gene in candidate_genes])
-        )
-    # Write result to JSON file.
+    simulation = simulate_.Simulation(
+        cases,
+        genes,
+        case_count=case_count,
+        candidate_genes_count=candidate_genes_count,
+        seed=seed,
+        replace=with_replacement,
+    )
+    executor = executor_.Executor("process" if workers > 1 else "serial", workers)
+    # Write result to JSON file while simulating.
     with open(out_json, "wt") as f:
-        json.dump(cattrs.unstructure(simulated), f, indent=2)
-    logger.info("Wrote {} cases", len(simulated))
+        if out_json.endswith(".jsonl"):
+            simulation.write_jsonl(f, shard=shard, executor=executor)
+        else:
+            models.dump_cases(simulation.iter_cases(executor=executor), f)
+    start, stop = simulate_.shard_range(shard, case_count)
+    logger.info("Wrote {} cases", stop - start)
 
 
 @dataset.command()
+@click.option(
+    "--format",
+    "format_",
+    type=LazyChoice("gene_ranking_shootout.ingest", "FORMATS"),
+    default=None,
+    help="Output format [default: jsonl if JSON_OUT ends in .jsonl, else json].",
+)
+@click.option("--chunk-size", default=10_000, help="Number of cases per chunk of --format dataset.")
 @click.argument("tsv_in")
 @click.argument("json_out")
-def convert_tsv(tsv_in, json_out):
-    """Convert from TSV to JSON format."""
+def convert_tsv(tsv_in, json_out, format_, chunk_size):
+    """Convert from TSV to JSON format.
+
+    TSV_IN may be gzip compressed.  The cases are written as they are parsed, so files of any
+    size can be converted.  With ``--format dataset``, JSON_OUT is a compiled dataset directory
+    as written by ``dataset compile``.
+    """
+    from gene_ranking_shootout import ingest as ingest_
+
     logger.info("Converting from {} to {}", tsv_in, json_out)
-    with open(tsv_in, "rt") as inputf:
-        with open(json_out, "wt") as outputf:
-            cases = []
-            header = ("name", "disease_omim_id", "disease_gene_id", "hpo_terms")
-            reader = csv.reader(inputf, delimiter="\t")
-            for row in reader:
-                if not row[0].startswith("Patient"):
-                    logger.info("Skipping row {}; does not start with 'Patient:'", row)
-                    continue
-                elif len(row) < 3:
-                    logger.info("Skipping row {}; not enough columns", row)
-                    continue
-                if len(row) == 3:
-                    data = dict(zip(header[:1] + header[2:], row))
-                else:
-                    data = dict(zip(header, row))
-                cases.append(
-                    models.Case(
-                        name=str(data["name"]),
-                        disease_omim_id=str(data.get("disease_omim_id", "unknown")),
-                        disease_gene_id=str(data["disease_gene_id"]),
-                        hpo_terms=[str(term) for term in data["hpo_terms"].split(",")],
-                    )
-                )
-            logger.info("Writing {} cases", len(cases))
-            json.dump(cattrs.unstructure(cases), outputf, indent=2)
+    stats = ingest_.convert_tsv(tsv_in, json_out, format_=format_, chunk_size=chunk_size)
+    logger.info(
+        "Wrote {} cases from {} rows ({} skipped) in {:.1f}s, {:.0f} rows/s",
+        stats.cases,
+        stats.rows,
+        stats.skipped,
+        stats.seconds,
+        stats.rows_per_second,
+    )
 
 
 if __name__ == "__main__":
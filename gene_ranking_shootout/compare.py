@@ -0,0 +1,326 @@
+"""Comparison of the results of several methods on the same cases with paired tests.
+
+The results files are read once each and joined by the case name with a dict from name to row,
+giving a matrix of ranks with one row per case and one column per method.  Cases that are not
+in a results file, or have no rank there, are missing for that method.  The union of the cases
+of all files is used, so a method that fails on a case is compared as if it had ranked the
+disease gene below all genes ranked by any method.
+
+For each pair of methods, the following is computed on the differences of the ranks:
+
+- the sign test of the number of cases where either method ranks the disease gene better,
+- the Wilcoxon signed-rank test (zero differences are dropped, ties get average ranks),
+- paired bootstrap confidence intervals of the differences of the mean rank and of the MRR.
+
+The p-values use the normal approximation with continuity correction, which is accurate for the
+case counts of benchmarks.  The bootstrap resamples cases, i.e., rows of the rank matrix, with
+all pairs sharing the resamples.
+"""
+
+import math
+import os
+import pathlib
+import typing
+
+import attrs
+import numpy as np
+
+from gene_ranking_shootout import metrics as metrics_
+
+
+def read_rank_matrix(
+    paths: typing.Sequence[typing.Union[str, pathlib.Path]],
+) -> typing.Tuple[typing.List[str], np.ndarray]:
+    """Read the ranks from the results files and join them by case name.
+
+    :returns: the case names and the matrix of ranks with one row per case and one column per
+        file, ``0`` for missing.
+    """
+    index: typing.Dict[str, int] = {}
+    columns = []
+    for path in paths:
+        rows = []
+        ranks = []
+        for name, rank in metrics_.iter_ranks(path):
+            rows.append(index.setdefault(name, len(index)))
+            ranks.append(rank)
+        columns.append((np.array(rows, dtype=np.int64), np.array(ranks, dtype=np.int64)))
+    matrix = np.zeros((len(index), len(paths)), dtype=np.int64)
+    for j, (rows_j, ranks_j) in enumerate(columns):
+        matrix[rows_j, j] = ranks_j
+    return list(index), matrix
+
+
+def _normal_p(z: np.ndarray) -> np.ndarray:
+    """Two-sided p-values of standard normal ``z`` scores."""
+    return np.vectorize(math.erfc, otypes=[np.float64])(np.abs(z) / math.sqrt(2.0))
+
+
+def sign_test(diffs: np.ndarray) -> np.ndarray:
+    """Two-sided p-values of the sign test for each column of ``diffs``."""
+    positive = (diffs > 0).sum(axis=0)
+    n = (diffs != 0).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (np.abs(positive - n / 2.0) - 0.5).clip(min=0.0) / np.sqrt(n / 4.0)
+    return np.where(n > 0, _normal_p(np.nan_to_num(z)), 1.0)
+
+
+def wilcoxon_test(diffs: np.ndarray) -> np.ndarray:
+    """Two-sided p-values of the Wilcoxon signed-rank test for each column of ``diffs``.
+
+    The columns are ranked one by one with ``np.unique()``; ranking all columns at once needs
+    an ``argsort()`` of the whole array and is about twice as slow for 10^5 cases.
+    """
+    p_values = np.ones(diffs.shape[1])
+    for j in range(diffs.shape[1]):
+        d = diffs[:, j]
+        d = d[d != 0]
+        n = len(d)
+        if not n:
+            continue
+        # Average ranks of the absolute differences.
+        values, inverse, counts = np.unique(np.abs(d), return_inverse=True, return_counts=True)
+        ends = np.cumsum(counts)
+        ranks = (ends - (counts - 1) / 2.0)[inverse]
+        w_plus = ranks[d > 0].sum()
+        mean = n * (n + 1) / 4.0
+        var = n * (n + 1) * (2 * n + 1) / 24.0 - (counts**3 - counts).sum() / 48.0
+        if var > 0:
+            z = max(abs(w_plus - mean) - 0.5, 0.0) / math.sqrt(var)
+            p_values[j] = math.erfc(z / math.sqrt(2.0))
+    return p_values
+
+
+@attrs.frozen()
+class PairedComparison:
+    """Comparison of two methods on the same cases; differences are ``a`` minus ``b``."""
+
+    #: Name of the first method.
+    method_a: str
+    #: Name of the second method.
+    method_b: str
+    #: Number of cases where ``a`` ranks the disease gene better.
+    wins_a: int
+    #: Number of cases where ``b`` ranks the disease gene better.
+    wins_b: int
+    #: Number of cases with equal ranks.
+    ties: int
+    #: Mean of the rank differences (negative: ``a`` is better).
+    mean_rank_diff: float
+    #: Difference of the mean reciprocal ranks (positive: ``a`` is better).
+    mrr_diff: float
+    #: p-value of the sign test.
+    sign_p: float
+    #: p-value of the Wilcoxon signed-rank test.
+    wilcoxon_p: float
+    #: Bootstrap confidence interval of ``mean_rank_diff``.
+    mean_rank_diff_ci: typing.Optional[typing.Tuple[float, float]] = None
+    #: Bootstrap confidence interval of ``mrr_diff``.
+    mrr_diff_ci: typing.Optional[typing.Tuple[float, float]] = None
+
+
+def _bootstrap_means(
+    values: np.ndarray, bootstrap: int, rng: np.random.Generator, max_elements: int = 2**24
+) -> np.ndarray:
+    """Return the column means of ``bootstrap`` resamples of the rows of ``values``.
+
+    The resamples are drawn in chunks of at most ``max_elements`` row indices and turned into
+    counts per row, so the means of all columns are one matrix product per chunk.
+    """
+    n = len(values)
+    chunk = max(1, max_elements // max(n, 1))
+    means = []
+    for start in range(0, bootstrap, chunk):
+        size = min(chunk, bootstrap - start)
+        idx = rng.integers(n, size=(size, n)) + (np.arange(size) * n)[:, None]
+        counts = np.bincount(idx.ravel(), minlength=size * n).reshape(size, n)
+        means.append(counts @ values / n)
+    return np.concatenate(means)
+
+
+def compare_methods(
+    methods: typing.Sequence[str],
+    ranks: np.ndarray,
+    *,
+    bootstrap: int = 1000,
+    confidence: float = 0.95,
+    seed: int = 42,
+) -> typing.List[PairedComparison]:
+    """Compare each pair of methods.
+
+    :param methods: The names of the methods.
+    :param ranks: The rank matrix from ``read_rank_matrix()``, one column per method.
+    :param bootstrap: Number of bootstrap resamples, ``0`` for no confidence intervals.
+    :param confidence: Confidence level of the intervals.
+    :param seed: Seed for the bootstrap resamples.
+    """
+    pairs = [(a, b) for a in range(len(methods)) for b in range(a + 1, len(methods))]
+    if not pairs:
+        return []
+    first = np.array([a for a, _ in pairs])
+    second = np.array([b for _, b in pairs])
+    # Missing disease genes rank below all others for the rank tests.
+    penalized = np.where(ranks > 0, ranks, ranks.max(initial=0) + 1).astype(np.float64)
+    diffs = penalized[:, first] - penalized[:, second]
+    with np.errstate(divide="ignore"):
+        reciprocal = np.where(ranks > 0, 1.0 / ranks, 0.0)
+    rr_diffs = reciprocal[:, first] - reciprocal[:, second]
+    n = max(len(ranks), 1)
+    mean_rank_diff = diffs.sum(axis=0) / n
+    mrr_diff = rr_diffs.sum(axis=0) / n
+    sign_p = sign_test(diffs)
+    wilcoxon_p = wilcoxon_test(diffs)
+    cis: typing.List[typing.Optional[np.ndarray]] = [None, None]
+    if bootstrap and len(ranks):
+        rng = np.random.default_rng(seed)
+        means = _bootstrap_means(np.concatenate([diffs, rr_diffs], axis=1), bootstrap, rng)
+        alpha = (1.0 - confidence) / 2.0
+        bounds = np.quantile(means, [alpha, 1.0 - alpha], axis=0)
+        cis = [bounds[:, : len(pairs)], bounds[:, len(pairs) :]]
+
+    def ci(i: int, which: int) -> typing.Optional[typing.Tuple[float, float]]:
+        bounds = cis[which]
+        return None if bounds is None else (float(bounds[0, i]), float(bounds[1, i]))
+
+    return [
+        PairedComparison(
+            method_a=methods[a],
+            method_b=methods[b],
+            wins_a=int((diffs[:, i] < 0).sum()),
+            wins_b=int((diffs[:, i] > 0).sum()),
+            ties=int((diffs[:, i] == 0).sum()),
+            mean_rank_diff=float(mean_rank_diff[i]),
+            mrr_diff=float(mrr_diff[i]),
+            sign_p=float(sign_p[i]),
+            wilcoxon_p=float(wilcoxon_p[i]),
+            mean_rank_diff_ci=ci(i, 0),
+            mrr_diff_ci=ci(i, 1),
+        )
+        for i, (a, b) in enumerate(pairs)
+    ]
+
+
+@attrs.frozen()
+class Comparison:
+    """Metrics of several methods on the same cases and their pairwise comparisons."""
+
+    #: The names of the methods.
+    methods: typing.List[str]
+    #: The metrics of each method.
+    metrics: typing.List[metrics_.Metrics]
+    #: The comparisons of each pair of methods.
+    pairs: typing.List[PairedComparison]
+
+    @classmethod
+    def from_files(
+        cls,
+        paths: typing.Sequence[typing.Union[str, pathlib.Path]],
+        *,
+        max_k: int = 10,
+        bootstrap: int = 1000,
+        confidence: float = 0.95,
+        seed: int = 42,
+    ) -> "Comparison":
+        """Compare the methods of the results files, named by ``method_names()``."""
+        methods = method_names(paths)
+        _, ranks = read_rank_matrix(paths)
+        return cls(
+            methods=methods,
+            metrics=[
+                metrics_.Metrics.from_ranks(ranks[:, j], max_k=max_k, bootstrap=0)
+                for j in range(len(methods))
+            ],
+            pairs=compare_methods(
+                methods, ranks, bootstrap=bootstrap, confidence=confidence, seed=seed
+            ),
+        )
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        """Return JSON-serializable dict of the comparison."""
+        return {
+            "methods": {
+                method: metrics.to_json() for method, metrics in zip(self.methods, self.metrics)
+            },
+            "pairs": [attrs.asdict(pair) for pair in self.pairs],
+        }
+
+    def write_tsv(self, outf: typing.TextIO):
+        """Write the method by metric matrix and then, after a blank line, the pairs."""
+        names = ["count", "missing", *self.metrics[0].values()] if self.metrics else []
+        print("\t".join(["method", *names]), file=outf)
+        for method, metrics in zip(self.methods, self.metrics):
+            values = [metrics.count, metrics.missing, *metrics.values().values()]
+            print("\t".join([method, *map(str, values)]), file=outf)
+        print(file=outf)
+        fields = [field.name for field in attrs.fields(PairedComparison)]
+        print("\t".join(fields), file=outf)
+        for pair in self.pairs:
+            print("\t".join(str(getattr(pair, field)) for field in fields), file=outf)
+
+    def print(self, outf: typing.TextIO, *, top_k: typing.Sequence[int] = (1, 5, 10)):
+        """Print the metrics and the pairwise comparisons as text tables to ``outf``."""
+        width = max([8, *map(len, self.methods)]) + 2
+        top_k = [k for k in top_k if self.metrics and k <= len(self.metrics[0].top_k)]
+        header = "".join(f"{f'top_{k}':>8}" for k in top_k)
+        print(
+            f"{'method':<{width}}{'cases':>8}{'mssng':>7}{header}{'mrr':>8}{'mean':>8}"
+            f"{'median':>8}",
+            file=outf,
+        )
+        for method, m in zip(self.methods, self.metrics):
+            top = "".join(f"{m.top_k[k - 1]:>8.1%}" for k in top_k)
+            print(
+                f"{method:<{width}}{m.count:>8}{m.missing:>7}{top}{m.mrr:>8.3f}"
+                f"{m.mean_rank:>8.2f}{m.median_rank:>8.1f}",
+                file=outf,
+            )
+        if not self.pairs:
+            return
+        print(
+            f"\n{'method a':<{width}}{'method b':<{width}}{'wins a':>8}{'wins b':>8}"
+            f"{'ties':>8}{'rank diff':>24}{'mrr diff':>24}{'sign p':>10}{'wilcox p':>10}",
+            file=outf,
+        )
+        for p in self.pairs:
+            rank_diff = f"{p.mean_rank_diff:.2f}"
+            if p.mean_rank_diff_ci:
+                rank_diff += f" [{p.mean_rank_diff_ci[0]:.2f}, {p.mean_rank_diff_ci[1]:.2f}]"
+            mrr_diff = f"{p.mrr_diff:.3f}"
+            if p.mrr_diff_ci:
+                mrr_diff += f" [{p.mrr_diff_ci[0]:.3f}, {p.mrr_diff_ci[1]:.3f}]"
+            print(
+                f"{p.method_a:<{width}}{p.method_b:<{width}}{p.wins_a:>8}{p.wins_b:>8}"
+                f"{p.ties:>8}{rank_diff:>24}{mrr_diff:>24}{p.sign_p:>10.2g}{p.wilcoxon_p:>10.2g}",
+                file=outf,
+            )
+
+
+def method_name(path: typing.Union[str, pathlib.Path]) -> str:
+    """Return the method name for a results file, e.g., ``amelie`` for ``result-amelie.jsonl``."""
+    name = pathlib.Path(path).name.split(".")[0]
+    return name[len("result-") :] if name.startswith("result-") else name
+
+
+def method_names(paths: typing.Sequence[typing.Union[str, pathlib.Path]]) -> typing.List[str]:
+    """Return the method names for the results files by ``method_name()``.
+
+    Files whose names are equal, e.g., ``a/results.jsonl`` and ``b/results.jsonl``, are named by
+    the shortest suffix of their paths that tells them apart instead.
+
+    :raises ValueError: if a file is given more than once.
+    """
+    names = [method_name(path) for path in paths]
+    parts = [pathlib.Path(os.path.abspath(path)).parts for path in paths]
+    labels = list(names)
+    for i, name in enumerate(names):
+        others = [j for j, other in enumerate(names) if other == name and j != i]
+        if not others:
+            continue
+        for k in range(1, len(parts[i]) + 1):
+            suffix = parts[i][-k:]
+            if all(parts[j][-k:] != suffix for j in others):
+                labels[i] = "/".join(suffix)
+                break
+        else:
+            raise ValueError(f"Results file {paths[i]} is given more than once")
+    return labels
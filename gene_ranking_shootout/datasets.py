@@ -0,0 +1,382 @@
+"""Compiled, memory-mapped datasets of cases.
+
+A compiled dataset is a directory of ``.npy`` files.  The HPO terms and the candidate genes of
+all cases are stored as flat integer arrays together with offset arrays marking the start of each
+case's entries, the strings as UTF-8 bytes with offsets.  ``Dataset`` memory-maps these files and
+builds ``models.Case`` objects only for the cases that are accessed, so opening a dataset and
+reading a few of its cases takes next to no time regardless of the dataset size.
+
+The JSON datasets bundled with the package are compiled into the cache directory on first use.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import pathlib
+import re
+import shutil
+import typing
+
+from loguru import logger
+import numpy as np
+
+from gene_ranking_shootout import cache as cache_
+from gene_ranking_shootout import genes as genes_
+from gene_ranking_shootout import models
+
+#: Directory of the bundled datasets.
+DATA_DIR = pathlib.Path(__file__).parent / "data"
+
+#: Version of the compiled format, bump when changing ``Dataset.compile()``.
+FORMAT_VERSION = 1
+
+#: The arrays of a compiled dataset.
+ARRAYS = (
+    "names",
+    "names_offsets",
+    "disease_omim_ids",
+    "disease_omim_ids_offsets",
+    "disease_gene_ids",
+    "hpo_terms",
+    "hpo_terms_offsets",
+    "candidate_gene_ids",
+    "candidate_gene_ids_offsets",
+    "has_candidates",
+)
+
+T = typing.TypeVar("T")
+
+#: Number of cases decoded at once when iterating.
+ITER_BLOCK_SIZE = 1024
+
+#: Pattern of HPO term IDs, which are stored as integers.
+HPO_TERM_RE = re.compile(r"HP:(\d{7})")
+
+
+def parse_hpo_term(value: str) -> int:
+    """Return the integer of an HPO term ID such as ``"HP:0001263"``."""
+    match = HPO_TERM_RE.fullmatch(value)
+    if not match:
+        raise ValueError(f"Invalid HPO term {value!r}")
+    return int(match.group(1))
+
+
+def format_hpo_term(value: int) -> str:
+    """Return the integer HPO term ID ``value`` as string, e.g., ``"HP:0001263"``."""
+    return f"HP:{value:07d}"
+
+
+def _encode_strings(values: typing.List[str]) -> typing.Tuple[np.ndarray, np.ndarray]:
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _encode_lists(values: typing.List[typing.List[int]]) -> typing.Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in values], out=offsets[1:])
+    flat = np.fromiter((x for value in values for x in value), dtype=np.int64, count=offsets[-1])
+    return flat, offsets
+
+
+def decode_strings(values: np.ndarray, offsets: np.ndarray) -> typing.List[str]:
+    """Return the strings encoded in the UTF-8 bytes ``values`` at ``offsets``."""
+    raw = values.tobytes()
+    offsets = offsets.tolist()
+    return [raw[begin:end].decode() for begin, end in zip(offsets, offsets[1:])]
+
+
+class Dataset(typing.Sequence[models.Case]):
+    """Lazy sequence of the cases of a compiled dataset.
+
+    Supports ``len()``, indexing, iteration, and slicing, which returns a ``Dataset`` view
+    without copying.
+
+    :param arrays: The arrays from ``ARRAYS``, possibly memory-mapped.
+    :param rows: The rows of the arrays in this view, all by default.
+    """
+
+    def __init__(self, arrays: typing.Dict[str, np.ndarray], rows: typing.Optional[range] = None):
+        #: The arrays of the dataset.
+        self.arrays = arrays
+        #: The rows in this view.
+        self.rows = range(len(arrays["disease_gene_ids"])) if rows is None else rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    @typing.overload
+    def __getitem__(self, index: int) -> models.Case:
+        ...
+
+    @typing.overload
+    def __getitem__(self, index: slice) -> "Dataset":
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Dataset(self.arrays, self.rows[index])
+        return self._case(self.rows[index])
+
+    def __iter__(self) -> typing.Iterator[models.Case]:
+        if self.rows.step != 1:
+            for row in self.rows:
+                yield self._case(row)
+            return
+        # Decode contiguous rows in blocks, which is much faster than row by row.
+        for start in range(self.rows.start, self.rows.stop, ITER_BLOCK_SIZE):
+            yield from self._cases(start, min(start + ITER_BLOCK_SIZE, self.rows.stop))
+
+    def _case(self, row: int) -> models.Case:
+        return self._cases(row, row + 1)[0]
+
+    def _cases(self, start: int, stop: int) -> typing.List[models.Case]:
+        """Return the cases of the rows from ``start`` to ``stop``."""
+
+        def split(name: str, values: typing.Callable[[int, int], typing.Sequence]):
+            offsets = self.arrays[f"{name}_offsets"][start : stop + 1].tolist()
+            first = offsets[0]
+            flat = values(first, offsets[-1])
+            return [flat[begin - first : end - first] for begin, end in zip(offsets, offsets[1:])]
+
+        def strings(name: str) -> typing.List[str]:
+            raw = split(name, lambda begin, end: self.arrays[name][begin:end].tobytes())
+            return [value.decode() for value in raw]
+
+        def lists(name: str, fmt: typing.Callable[[int], str]) -> typing.List[typing.List[str]]:
+            return split(
+                name, lambda begin, end: list(map(fmt, self.arrays[name][begin:end].tolist()))
+            )
+
+        columns = zip(
+            strings("names"),
+            strings("disease_omim_ids"),
+            self.arrays["disease_gene_ids"][start:stop].tolist(),
+            lists("hpo_terms", format_hpo_term),
+            lists("candidate_gene_ids", genes_.format_entrez_id),
+            self.arrays["has_candidates"][start:stop].tolist(),
+        )
+        return [
+            models.Case(
+                name=name,
+                disease_omim_id=omim_id,
+                disease_gene_id=genes_.format_entrez_id(gene_id),
+                hpo_terms=terms,
+                candidate_gene_ids=candidates if has_candidates else None,
+            )
+            for name, omim_id, gene_id, terms, candidates, has_candidates in columns
+        ]
+
+    @classmethod
+    def compile(cls, cases: typing.Iterable[models.Case]) -> "Dataset":
+        """Compile ``cases`` into an in-memory dataset.
+
+        :raises ValueError: if an HPO term or gene ID cannot be encoded as integer.
+        """
+        cases = list(cases)
+        arrays: typing.Dict[str, np.ndarray] = {}
+        arrays["names"], arrays["names_offsets"] = _encode_strings([case.name for case in cases])
+        arrays["disease_omim_ids"], arrays["disease_omim_ids_offsets"] = _encode_strings(
+            [case.disease_omim_id for case in cases]
+        )
+        arrays["disease_gene_ids"] = np.array(
+            [genes_.parse_entrez_id(case.disease_gene_id) for case in cases], dtype=np.int64
+        )
+        arrays["hpo_terms"], arrays["hpo_terms_offsets"] = _encode_lists(
+            [[parse_hpo_term(term) for term in case.hpo_terms] for case in cases]
+        )
+        arrays["candidate_gene_ids"], arrays["candidate_gene_ids_offsets"] = _encode_lists(
+            [
+                [genes_.parse_entrez_id(gene_id) for gene_id in case.candidate_gene_ids or []]
+                for case in cases
+            ]
+        )
+        arrays["has_candidates"] = np.array(
+            [case.candidate_gene_ids is not None for case in cases], dtype=bool
+        )
+        return cls(arrays)
+
+    def save(self, path: typing.Union[str, pathlib.Path]):
+        """Write the dataset to the directory ``path``.
+
+        The directory is written next to ``path`` and then renamed, so readers never see a
+        partially written dataset.
+        """
+        if self.rows != range(len(self.arrays["disease_gene_ids"])):
+            Dataset.compile(self).save(path)
+            return
+        path = pathlib.Path(path)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.mkdir(parents=True)
+        try:
+            for name in ARRAYS:
+                np.save(tmp_path / f"{name}.npy", self.arrays[name])
+            with open(tmp_path / "meta.json", "wt") as outputf:
+                json.dump({"version": FORMAT_VERSION, "count": len(self)}, outputf)
+            os.rename(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    @classmethod
+    def open(cls, path: typing.Union[str, pathlib.Path]) -> "Dataset":
+        """Open the compiled dataset in directory ``path`` with memory-mapped arrays."""
+        path = pathlib.Path(path)
+        with open(path / "meta.json", "rt") as inputf:
+            meta = json.load(inputf)
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dataset format version {meta['version']} in {path}")
+        return cls({name: np.load(path / f"{name}.npy", mmap_mode="r") for name in ARRAYS})
+
+    @classmethod
+    def load(
+        cls,
+        path: typing.Union[str, pathlib.Path],
+        *,
+        cache_dir: typing.Optional[pathlib.Path] = None,
+    ) -> "Dataset":
+        """Load the dataset from ``path``, either a compiled dataset or a JSON (Lines) file.
+
+        JSON files are compiled into a directory in ``cache_dir`` on first use that is identified
+        by the path, size, and modification time of the JSON file.
+
+        :param path: Path to the compiled dataset or the JSON file.
+        :param cache_dir: Directory of the compiled datasets, defaults to a subdirectory of
+            ``cache.default_cache_dir()``.
+        """
+        path = pathlib.Path(path).resolve()
+        if path.is_dir():
+            return cls.open(path)
+        stat = path.stat()
+        digest = hashlib.sha256(
+            f"{FORMAT_VERSION}:{path}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+        ).hexdigest()[:16]
+        compiled = (cache_dir or cache_.default_cache_dir() / "datasets") / f"{path.stem}-{digest}"
+        if compiled.exists():
+            return cls.open(compiled)
+        try:
+            compiled.parent.mkdir(parents=True, exist_ok=True)
+            write_dataset(models.iter_cases(path), compiled)
+        except OSError as e:
+            if compiled.exists():  # compiled by a concurrent process
+                return cls.open(compiled)
+            logger.warning("Could not write compiled dataset {}: {}", compiled, e)
+            return cls.compile(models.iter_cases(path))
+        return cls.open(compiled)
+
+
+class DatasetWriter:
+    """Writes a compiled dataset chunk by chunk, keeping only one chunk in memory.
+
+    The arrays of each chunk are appended to raw files in a directory next to ``path``;
+    ``close()`` prepends the ``.npy`` headers, which need the final lengths, and renames the
+    directory to ``path``.  Use as context manager, which removes the directory on errors.
+
+    :param path: The directory to write the dataset to.
+    """
+
+    def __init__(self, path: typing.Union[str, pathlib.Path]):
+        #: The directory of the dataset.
+        self.path = pathlib.Path(path)
+        #: The number of cases written.
+        self.count = 0
+        self._tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        self._tmp_path.mkdir(parents=True)
+        empty = Dataset.compile([]).arrays
+        self._dtypes = {name: empty[name].dtype for name in ARRAYS}
+        self._lengths = {name: len(empty[name]) for name in ARRAYS}
+        self._files = {name: open(self._tmp_path / f"{name}.raw", "wb") for name in ARRAYS}
+        for name in ARRAYS:
+            self._files[name].write(empty[name].tobytes())
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, cases: typing.Iterable[models.Case]):
+        """Append ``cases`` to the dataset.
+
+        :raises ValueError: if an HPO term or gene ID cannot be encoded as integer.
+        """
+        arrays = Dataset.compile(cases).arrays
+        lengths = dict(self._lengths)
+        for name in ARRAYS:
+            array = arrays[name]
+            if name.endswith("_offsets"):
+                # Drop the leading 0 and continue from the values written before.
+                array = array[1:] + lengths[name[: -len("_offsets")]]
+            self._files[name].write(array.astype(self._dtypes[name], copy=False).tobytes())
+            self._lengths[name] += len(array)
+        self.count += len(arrays["disease_gene_ids"])
+
+    def close(self):
+        """Complete the dataset and move it to ``path``."""
+        try:
+            for name in ARRAYS:
+                self._files[name].close()
+                raw_path = self._tmp_path / f"{name}.raw"
+                with open(self._tmp_path / f"{name}.npy", "wb") as outputf:
+                    header = {
+                        "descr": np.lib.format.dtype_to_descr(self._dtypes[name]),
+                        "fortran_order": False,
+                        "shape": (self._lengths[name],),
+                    }
+                    np.lib.format.write_array_header_1_0(outputf, header)
+                    with open(raw_path, "rb") as inputf:
+                        shutil.copyfileobj(inputf, outputf)
+                raw_path.unlink()
+            with open(self._tmp_path / "meta.json", "wt") as outputf:
+                json.dump({"version": FORMAT_VERSION, "count": self.count}, outputf)
+            os.rename(self._tmp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        """Remove the partially written dataset."""
+        for outputf in self._files.values():
+            outputf.close()
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+
+def write_dataset(
+    cases: typing.Iterable[models.Case],
+    path: typing.Union[str, pathlib.Path],
+    *,
+    chunk_size: int = ITER_BLOCK_SIZE,
+) -> int:
+    """Compile ``cases`` into the dataset directory ``path`` chunk by chunk.
+
+    :returns: the number of cases.
+    """
+    with DatasetWriter(path) as writer:
+        for chunk in chunked(cases, chunk_size):
+            writer.write(chunk)
+    return writer.count
+
+
+def chunked(items: typing.Iterable[T], size: int) -> typing.Iterator[typing.List[T]]:
+    """Yield lists of ``size`` of ``items`` each, the last one possibly shorter."""
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def list_datasets() -> typing.List[str]:
+    """Return the names of the bundled datasets."""
+    return [path.stem for path in DATA_DIR.glob("*.json")]
+
+
+def load_dataset(name: str, **kwargs) -> Dataset:
+    """Load the bundled dataset ``name``; ``kwargs`` are passed to ``Dataset.load()``."""
+    return Dataset.load(DATA_DIR / f"{name}.json", **kwargs)
@@ -0,0 +1,135 @@
+"""Execution of many tasks with a configurable backend.
+
+The runners use this for running the ranking for many cases.  The following backends exist:
+
+``serial``
+    Run all tasks one after another in the current thread.
+``thread``
+    Run the tasks in a pool of threads, good for tasks that wait on I/O (HTTP, containers).
+``process``
+    Run the tasks in a pool of processes, good for tasks that need the CPU.  The function is
+    sent to each worker process only once via the pool initializer, the tasks are sent in
+    chunks.
+``async``
+    Schedule the tasks from an ``asyncio`` event loop that keeps up to ``workers`` of them in
+    flight, running the (blocking) function in a thread pool.
+"""
+
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import threading
+import typing
+
+#: The available backends.
+BACKENDS = ("serial", "thread", "process", "async")
+
+#: The function to call in a process pool worker, set by ``_init_process()``.
+_process_func: typing.Optional[typing.Callable] = None
+
+
+def _init_process(func: typing.Callable):
+    global _process_func
+    _process_func = func
+
+
+def _call_in_process(task: typing.Tuple[int, typing.Any]) -> typing.Tuple[int, typing.Any]:
+    i, item = task
+    assert _process_func is not None
+    return i, _process_func(item)
+
+
+class Executor:
+    """Apply a function to many items with the configured backend.
+
+    :param backend: One of ``BACKENDS``.
+    :param workers: The number of threads/processes or tasks in flight; ``0`` for the number
+        of CPUs.
+    :param chunksize: The number of tasks to send to a worker process at once; ``0`` to pick
+        a chunk size based on the number of tasks and workers.
+    """
+
+    def __init__(self, backend: str = "serial", workers: int = 1, chunksize: int = 0):
+        if backend not in BACKENDS:
+            raise ValueError(f"Invalid backend {backend}, must be one of {BACKENDS}")
+        #: The backend to use.
+        self.backend = backend
+        #: The number of workers, defaults to the number of CPUs.
+        self.workers = 1 if backend == "serial" else (workers or os.cpu_count() or 1)
+        #: The chunk size for the process backend.
+        self.chunksize = chunksize
+
+    def map(
+        self, func: typing.Callable, items: typing.Sequence, *, ordered: bool = True
+    ) -> typing.Iterator[typing.Tuple[int, typing.Any]]:
+        """Apply ``func`` to all ``items``.
+
+        :param func: The function to call; must be picklable for the ``process`` backend.
+        :param items: The items to call ``func`` for.
+        :param ordered: Whether to yield the results in the order of ``items`` rather than in
+            the order of completion.
+        :returns: iterator of pairs of index into ``items`` and the result of ``func``.
+        """
+        if self.backend == "serial":
+            yield from enumerate(map(func, items))
+        elif self.backend == "thread":
+            yield from self._map_thread(func, items, ordered)
+        elif self.backend == "process":
+            yield from self._map_process(func, items, ordered)
+        else:
+            yield from self._map_async(func, items, ordered)
+
+    def _map_thread(self, func, items, ordered):
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            if ordered:
+                # ``Executor.map()`` yields the results in the order of ``items``.
+                yield from enumerate(executor.map(func, items))
+            else:
+                futures = {executor.submit(func, item): i for i, item in enumerate(items)}
+                for future in concurrent.futures.as_completed(futures):
+                    yield futures[future], future.result()
+
+    def _map_process(self, func, items, ordered):
+        chunksize = self.chunksize or max(1, len(items) // (self.workers * 4))
+        with multiprocessing.Pool(self.workers, _init_process, (func,)) as pool:
+            imap = pool.imap if ordered else pool.imap_unordered
+            yield from imap(_call_in_process, enumerate(items), chunksize)
+
+    def _map_async(self, func, items, ordered):
+        # The event loop runs in a background thread and hands the results over via a queue so
+        # that they can be consumed while the remaining tasks are running.
+        results: "queue.Queue[typing.Tuple[int, typing.Any, typing.Optional[BaseException]]]"
+        results = queue.Queue()
+
+        async def run_all():
+            loop = asyncio.get_running_loop()
+            semaphore = asyncio.Semaphore(self.workers)
+            with concurrent.futures.ThreadPoolExecutor(self.workers) as pool:
+
+                async def run_one(i, item):
+                    async with semaphore:
+                        try:
+                            results.put((i, await loop.run_in_executor(pool, func, item), None))
+                        except BaseException as e:  # re-raised in the consuming thread
+                            results.put((i, None, e))
+
+                await asyncio.gather(*(run_one(i, item) for i, item in enumerate(items)))
+
+        thread = threading.Thread(target=asyncio.run, args=(run_all(),), daemon=True)
+        thread.start()
+        pending: typing.Dict[int, typing.Any] = {}
+        next_i = 0
+        for _ in range(len(items)):
+            i, value, error = results.get()
+            if error is not None:
+                raise error
+            if not ordered:
+                yield i, value
+                continue
+            pending[i] = value
+            while next_i in pending:
+                yield next_i, pending.pop(next_i)
+                next_i += 1
+        thread.join()
@@ -0,0 +1,169 @@
+"""Columnar table of the genes with their gnomAD rare variant counts.
+
+Parsing ``gnomad_counts.tsv`` takes a noticeable time, so the parsed table is stored as a
+binary ``.npy`` sidecar file in the cache directory.  Later loads memory-map this file, so they
+are almost instantaneous and all processes share the same pages.
+"""
+
+import csv
+import hashlib
+import os
+import pathlib
+import typing
+
+from loguru import logger
+import numpy as np
+
+from gene_ranking_shootout import cache as cache_
+
+#: Path to the gnomAD counts shipped with the package.
+GNOMAD_COUNTS_PATH = pathlib.Path(__file__).parent / "data" / "gnomad_counts.tsv"
+
+#: Version of the sidecar file layout, bump when changing ``GeneTable.from_tsv()``.
+SIDECAR_VERSION = 1
+
+
+def parse_entrez_id(value: typing.Union[str, int]) -> int:
+    """Return the integer of an Entrez gene ID such as ``"Entrez:1301"``."""
+    if isinstance(value, str):
+        return int(value[len("Entrez:") :] if value.startswith("Entrez:") else value)
+    return int(value)
+
+
+def format_entrez_id(value: int) -> str:
+    """Return the integer Entrez gene ID ``value`` as string, e.g., ``"Entrez:1301"``."""
+    return f"Entrez:{value}"
+
+
+class GeneTable:
+    """The genes with their identifiers and gnomAD rare variant counts.
+
+    The table is a NumPy structured array with one record per gene and the fields
+    ``entrez_id``, ``hgnc_id`` (both as integers), ``symbol``, and ``count``.  The fields
+    ``entrez_order`` and ``symbol_order`` hold the permutations sorting the table by Entrez ID
+    and symbol for the lookups with ``numpy.searchsorted()``.
+
+    :param records: The structured array, possibly memory-mapped.
+    """
+
+    def __init__(self, records: np.ndarray):
+        #: The structured array with the genes.
+        self.records = records
+        #: The integer Entrez gene IDs.
+        self.entrez_ids: np.ndarray = records["entrez_id"]
+        #: The integer HGNC IDs.
+        self.hgnc_ids: np.ndarray = records["hgnc_id"]
+        #: The gene symbols.
+        self.symbols: np.ndarray = records["symbol"]
+        #: The rare variant counts.
+        self.counts: np.ndarray = records["count"]
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def from_tsv(cls, path: typing.Union[str, pathlib.Path]) -> "GeneTable":
+        """Parse the table from a TSV file in the format of ``gnomad_counts.tsv``."""
+        with open(path, "rt") as inputf:
+            rows = list(csv.DictReader(inputf, delimiter="\t"))
+        symbols = np.array([row["gene_symbol"] for row in rows], dtype=str)
+        records = np.zeros(
+            len(rows),
+            dtype=[
+                ("entrez_id", np.int64),
+                ("hgnc_id", np.int64),
+                ("symbol", symbols.dtype),
+                ("count", np.int64),
+                ("entrez_order", np.int64),
+                ("symbol_order", np.int64),
+            ],
+        )
+        records["entrez_id"] = [parse_entrez_id(row["entrez_id"]) for row in rows]
+        records["hgnc_id"] = [int(row["hgnc_id"].split(":")[-1]) for row in rows]
+        records["symbol"] = symbols
+        records["count"] = [int(row["count"]) for row in rows]
+        records["entrez_order"] = np.argsort(records["entrez_id"], kind="stable")
+        records["symbol_order"] = np.argsort(symbols, kind="stable")
+        return cls(records)
+
+    @classmethod
+    def load(
+        cls,
+        path: typing.Union[str, pathlib.Path] = GNOMAD_COUNTS_PATH,
+        *,
+        cache_dir: typing.Optional[pathlib.Path] = None,
+    ) -> "GeneTable":
+        """Load the table from the TSV file at ``path`` via its memory-mapped sidecar file.
+
+        The sidecar file is written on the first load and identified by the path, size, and
+        modification time of the TSV file.  If it cannot be written, the TSV file is parsed on
+        each load.
+
+        :param path: Path to the TSV file.
+        :param cache_dir: Directory of the sidecar files, defaults to a subdirectory of
+            ``cache.default_cache_dir()``.
+        """
+        path = pathlib.Path(path).resolve()
+        stat = path.stat()
+        digest = hashlib.sha256(
+            f"{SIDECAR_VERSION}:{path}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+        ).hexdigest()[:16]
+        sidecar = (cache_dir or cache_.default_cache_dir() / "genes") / f"{path.stem}-{digest}.npy"
+        if sidecar.exists():
+            return cls(np.load(sidecar, mmap_mode="r"))
+        table = cls.from_tsv(path)
+        try:
+            sidecar.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = sidecar.with_name(f"{sidecar.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as outputf:
+                np.save(outputf, table.records)
+            os.replace(tmp_path, sidecar)
+        except OSError as e:
+            logger.warning("Could not write gene table cache {}: {}", sidecar, e)
+            return table
+        return cls(np.load(sidecar, mmap_mode="r"))
+
+    def entrez_index(self, entrez_ids: typing.Iterable[typing.Union[str, int]]) -> np.ndarray:
+        """Return the indices of the genes with ``entrez_ids``, ``-1`` for unknown genes."""
+        values = np.array([parse_entrez_id(value) for value in entrez_ids], dtype=np.int64)
+        return self._lookup(self.entrez_ids, self.records["entrez_order"], values)
+
+    def symbol_index(self, symbols: typing.Iterable[str]) -> np.ndarray:
+        """Return the indices of the genes with ``symbols``, ``-1`` for unknown genes."""
+        values = np.array(list(symbols), dtype=str)
+        return self._lookup(self.symbols, self.records["symbol_order"], values)
+
+    @staticmethod
+    def _lookup(column: np.ndarray, order: np.ndarray, values: np.ndarray) -> np.ndarray:
+        if not len(values):
+            return np.zeros(0, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(column, values, sorter=order), len(order) - 1)
+        idx = order[pos]
+        return np.where(column[idx] == values, idx, -1)
+
+    def to_symbols(self, entrez_ids: typing.Iterable[str]) -> typing.List[str]:
+        """Return the symbols of the genes with ``entrez_ids``.
+
+        :raises KeyError: if a gene is unknown.
+        """
+        entrez_ids = list(entrez_ids)
+        idx = self.entrez_index(entrez_ids)
+        if (idx < 0).any():
+            raise KeyError(entrez_ids[int(np.argmin(idx))])
+        return self.symbols[idx].tolist()
+
+    def to_entrez_ids(self, symbols: typing.Iterable[str]) -> typing.List[str]:
+        """Return the Entrez gene IDs (e.g., ``"Entrez:1301"``) of the genes with ``symbols``.
+
+        :raises KeyError: if a gene is unknown.
+        """
+        symbols = list(symbols)
+        idx = self.symbol_index(symbols)
+        if (idx < 0).any():
+            raise KeyError(symbols[int(np.argmin(idx))])
+        return [format_entrez_id(value) for value in self.entrez_ids[idx].tolist()]
+
+    def symbol_of(self, entrez_id: str) -> typing.Optional[str]:
+        """Return the symbol of the gene with ``entrez_id`` or ``None`` if unknown."""
+        (idx,) = self.entrez_index([entrez_id])
+        return None if idx < 0 else str(self.symbols[idx])
@@ -0,0 +1,155 @@
+"""Streaming conversion of case TSV files, e.g., of large external cohorts.
+
+The conversion is a pipeline of generators: the rows of the (possibly gzip compressed) TSV file
+are parsed and validated into ``models.Case`` objects one by one and written to the output as
+JSON array or JSON Lines case by case, or to a compiled dataset (see ``datasets.DatasetWriter``)
+in chunks of ``chunk_size`` cases.  So the memory use only depends on the chunk size, not on the
+size of the input.
+
+The TSV columns are described in the README.  Rows that are not cases or that do not validate
+are skipped, and the first ``MAX_LOGGED_SKIPS`` of them are logged.
+"""
+
+import csv
+import os
+import re
+import time
+import typing
+
+import attrs
+from loguru import logger
+
+from gene_ranking_shootout import datasets as datasets_
+from gene_ranking_shootout import genes as genes_
+from gene_ranking_shootout import models
+
+#: The output formats.
+FORMATS = ("json", "jsonl", "dataset")
+
+#: The number of skipped rows to log, the others are only counted.
+MAX_LOGGED_SKIPS = 10
+
+#: The columns of the TSV file; the OMIM ID is missing from rows with three columns.
+COLUMNS = ("name", "disease_omim_id", "disease_gene_id", "hpo_terms")
+
+#: Pattern of the comma-separated HPO terms column, validated in one go as the terms are many.
+HPO_TERMS_RE = re.compile(r"\s*(HP:\d{7}(?:\s*,\s*HP:\d{7})*)\s*")
+
+
+@attrs.define()
+class IngestStats:
+    """Counts and throughput of a conversion."""
+
+    #: The number of rows read.
+    rows: int = 0
+    #: The number of cases written.
+    cases: int = 0
+    #: The number of rows skipped.
+    skipped: int = 0
+    #: The seconds taken.
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def parse_row(row: typing.List[str]) -> models.Case:
+    """Parse the TSV ``row`` into a case.
+
+    :raises ValueError: if the row is not a valid case.
+    """
+    if not row or not row[0].startswith("Patient"):
+        raise ValueError("does not start with 'Patient:'")
+    if len(row) < 3:
+        raise ValueError("not enough columns")
+    if len(row) == 3:
+        data = dict(zip(COLUMNS[:1] + COLUMNS[2:], row))
+    else:
+        data = dict(zip(COLUMNS, row))
+    match = HPO_TERMS_RE.fullmatch(data["hpo_terms"])
+    if not match:
+        raise ValueError(f"invalid HPO terms {data['hpo_terms']!r}")
+    hpo_terms = [term.strip() for term in match.group(1).split(",")]
+    genes_.parse_entrez_id(data["disease_gene_id"])
+    return models.Case(
+        name=data["name"],
+        disease_omim_id=data.get("disease_omim_id", "unknown"),
+        disease_gene_id=data["disease_gene_id"],
+        hpo_terms=hpo_terms,
+    )
+
+
+def iter_tsv_cases(path: str, stats: IngestStats) -> typing.Iterator[models.Case]:
+    """Parse the cases from the TSV file ``path`` one by one, counting rows in ``stats``."""
+    with models.open_text(path) as inputf:
+        for row in csv.reader(inputf, delimiter="\t"):
+            stats.rows += 1
+            try:
+                case = parse_row(row)
+            except ValueError as e:
+                stats.skipped += 1
+                if stats.skipped <= MAX_LOGGED_SKIPS:
+                    logger.info("Skipping row {} {}; {}", stats.rows, row, e)
+                continue
+            yield case
+
+
+def write_cases(
+    cases: typing.Iterable[models.Case],
+    path: str,
+    format_: str,
+    *,
+    chunk_size: int = 10_000,
+) -> int:
+    """Write ``cases`` to ``path`` in ``format_`` (see ``FORMATS``).
+
+    The JSON formats are written case by case, the dataset in chunks of ``chunk_size`` cases.
+    The output is written next to ``path`` and renamed when complete.
+
+    :returns: the number of cases written.
+    """
+    if format_ == "dataset":
+        return datasets_.write_dataset(cases, path, chunk_size=chunk_size)
+    count = 0
+
+    def counted() -> typing.Iterator[models.Case]:
+        nonlocal count
+        for case in cases:
+            count += 1
+            yield case
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wt") as outputf:
+            models.dump_cases(counted(), outputf, jsonl=format_ == "jsonl")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+def convert_tsv(
+    path_in: str,
+    path_out: str,
+    *,
+    format_: typing.Optional[str] = None,
+    chunk_size: int = 10_000,
+) -> IngestStats:
+    """Convert the case TSV file ``path_in`` to ``path_out``.
+
+    :param format_: One of ``FORMATS``, by default JSON Lines if ``path_out`` ends in
+        ``.jsonl`` and a JSON array otherwise.
+    :param chunk_size: The number of cases per chunk of a compiled dataset.
+    """
+    if format_ is None:
+        format_ = "jsonl" if path_out.endswith(".jsonl") else "json"
+    stats = IngestStats()
+    start = time.perf_counter()
+    stats.cases = write_cases(
+        iter_tsv_cases(path_in, stats), path_out, format_, chunk_size=chunk_size
+    )
+    stats.seconds = time.perf_counter() - start
+    return stats
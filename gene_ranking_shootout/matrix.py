@@ -0,0 +1,176 @@
+"""Running several methods over the same cases at the same time.
+
+The methods are listed in a JSON configuration file, e.g.::
+
+    {
+      "methods": [
+        {
+          "name": "exomiser",
+          "runner": "exomiser",
+          "args": {"base_url": "http://localhost:8081", "concurrency": 4},
+          "expand": {"algorithm": ["phenix", "phive", "hiphive"]}
+        },
+        {"name": "cada", "runner": "cada", "args": {"workers": 2}}
+      ]
+    }
+
+``args`` are the keyword arguments of the runner class, including the options for running
+cases in parallel such as ``concurrency`` and ``batch_size``; these limit the concurrency of
+each method.  ``expand`` lists alternative values for arguments, the method is run for each
+combination of them with the values appended to its name, e.g., ``exomiser-phenix``.
+
+All methods run at the same time, each in its own thread driving the method's runner, so that
+the total time is that of the slowest method rather than the sum over all methods.  The cases
+are loaded once and shared.  The results are written to one directory with a JSON Lines file
+per method, each in the format of the results of the single-method ``benchmark`` commands.
+"""
+
+import itertools
+import json
+import pathlib
+import threading
+import time
+import typing
+
+import attrs
+import cattrs
+from loguru import logger
+
+from gene_ranking_shootout import cache as cache_
+from gene_ranking_shootout import models, runner
+
+#: The runner classes by the name used in the configuration.
+RUNNERS: typing.Dict[str, typing.Type[runner.BaseRunner]] = {
+    "amelie": runner.AmelieRunner,
+    "cada": runner.CadaRunner,
+    "exomiser": runner.ExomiserRunner,
+    "phen2gene": runner.Phen2GeneRunner,
+    "phenix": runner.PhenixRunner,
+    "varfish-phenix": runner.PhenixVarFishRunner,
+}
+
+
+@attrs.frozen()
+class MethodConfig:
+    """Configuration of one method in the matrix."""
+
+    #: The name of the method, used for the results file.
+    name: str
+    #: The runner, a key of ``RUNNERS``.
+    runner: str
+    #: Keyword arguments for the runner class.
+    args: typing.Dict[str, typing.Any] = attrs.field(factory=dict)
+    #: Alternative values of arguments to run the method with.
+    expand: typing.Dict[str, typing.List[typing.Any]] = attrs.field(factory=dict)
+
+
+@attrs.frozen()
+class MatrixConfig:
+    """Configuration of the methods to run."""
+
+    #: The methods to run.
+    methods: typing.List[MethodConfig]
+
+    def expanded(self) -> typing.List[MethodConfig]:
+        """Return the methods with each combination of the ``expand`` values as own method.
+
+        :raises ValueError: on unknown runners or duplicate names.
+        """
+        result = []
+        for method in self.methods:
+            if method.runner not in RUNNERS:
+                raise ValueError(
+                    f"Unknown runner {method.runner} of {method.name}, must be one of "
+                    f"{list(RUNNERS)}"
+                )
+            keys = list(method.expand)
+            for values in itertools.product(*(method.expand[key] for key in keys)):
+                result.append(
+                    MethodConfig(
+                        name="-".join([method.name, *map(str, values)]),
+                        runner=method.runner,
+                        args={**method.args, **dict(zip(keys, values))},
+                    )
+                )
+        names = [method.name for method in result]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate method names: {duplicates}")
+        return result
+
+
+def load_config(path: typing.Union[str, pathlib.Path]) -> MatrixConfig:
+    """Load ``MatrixConfig`` from JSON file."""
+    with open(path, "rt") as inputf:
+        return cattrs.structure(json.load(inputf), MatrixConfig)
+
+
+@attrs.define()
+class MethodOutcome:
+    """Outcome of running one method."""
+
+    #: The method's name.
+    name: str
+    #: Path to the results file.
+    path: pathlib.Path
+    #: Wall time in seconds.
+    seconds: float = 0.0
+    #: The error that stopped the method, if any.
+    error: typing.Optional[Exception] = None
+
+
+def run_matrix(
+    config: MatrixConfig,
+    cases: typing.List[models.Case],
+    results_dir: typing.Union[str, pathlib.Path],
+    *,
+    make_cache: typing.Callable[[], typing.Optional[cache_.RankingCache]] = lambda: None,
+    cache_invalidate: bool = False,
+    resume: bool = False,
+) -> typing.List[MethodOutcome]:
+    """Run all methods of ``config`` on ``cases`` at the same time.
+
+    :param config: The methods to run.
+    :param cases: The cases to run.
+    :param results_dir: Directory for the results files, ``<name>.jsonl`` per method.
+    :param make_cache: Factory for each method's connection to the ranking cache.
+    :param cache_invalidate: Remove the cached rankings of the methods before running.
+    :param resume: Only run the cases missing from the results files.
+    :returns: the outcome of each method.
+    """
+    results_dir = pathlib.Path(results_dir)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    methods = config.expanded()
+    runners = [
+        RUNNERS[method.runner](**method.args, cache=make_cache(), label=method.name)
+        for method in methods
+    ]
+    outcomes = [
+        MethodOutcome(name=method.name, path=results_dir / f"{method.name}.jsonl")
+        for method in methods
+    ]
+
+    def run_method(the_runner: runner.BaseRunner, outcome: MethodOutcome):
+        start = time.monotonic()
+        try:
+            if cache_invalidate:
+                the_runner.invalidate_cache()
+            the_runner.run_cases(cases, str(outcome.path), resume=resume)
+        except Exception as e:
+            logger.exception("Error running method {}", outcome.name)
+            outcome.error = e
+        finally:
+            the_runner.close()
+            outcome.seconds = time.monotonic() - start
+
+    threads = [
+        threading.Thread(target=run_method, args=(the_runner, outcome), name=outcome.name)
+        for the_runner, outcome in zip(runners, outcomes)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for the_runner in runners:
+        the_runner.log_stats()
+    return outcomes
@@ -0,0 +1,280 @@
+"""Accuracy metrics of the results of a method with bootstrap confidence intervals.
+
+The metrics only depend on the ranks of the disease genes, so the ranks are read into a NumPy
+array without building ``models.Result`` objects.  Missing results (rank ``0`` in the array)
+count as misses for the top-k accuracies and as reciprocal rank ``0``, but are left out of the
+mean and median rank.
+
+The confidence intervals are percentile bootstrap intervals.  As all metrics are functions of
+the histogram of the ranks, each resample is drawn as a multinomial sample of the histogram
+rather than as ``n`` random indices, so thousands of resamples of 10^5 cases take a fraction of
+a second.
+"""
+
+import json
+import math
+import sys
+import typing
+import warnings
+
+import attrs
+import numpy as np
+
+from gene_ranking_shootout import datasets as datasets_
+from gene_ranking_shootout import models
+from gene_ranking_shootout import results as results_
+
+#: The metrics besides the top-k accuracies.
+SCALAR_METRICS = ("mrr", "mean_rank", "median_rank")
+
+
+def ranks_of(results: typing.Iterable[models.Result]) -> np.ndarray:
+    """Return the ranks of ``results`` as array, ``0`` for missing ranks."""
+    return np.array([result.rank or 0 for result in results], dtype=np.int64)
+
+
+def iter_ranks(path) -> typing.Iterator[typing.Tuple[str, int]]:
+    """Yield case name and rank from a results file (JSON Lines, JSON, or compact ``.npz``),
+    ``0`` if missing.
+    """
+    if results_.is_compact(path):
+        with results_.CompactResults.open(path) as compact:
+            names = datasets_.decode_strings(
+                compact.arrays["names"], compact.arrays["names_offsets"]
+            )
+            ranks = compact.ranks.tolist()
+        yield from zip(names, ranks)
+        return
+    with open(path, "rt") as f:
+        first_line = f.readline()
+        f.seek(0)
+        if first_line.lstrip().startswith("["):
+            records = json.load(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in records:
+            yield record["case"]["name"], record.get("rank") or 0
+
+
+def read_ranks(path) -> np.ndarray:
+    """Read the ranks from a results file (JSON Lines, JSON, or compact ``.npz``), ``0`` for
+    missing ranks.
+    """
+    if results_.is_compact(path):
+        with results_.CompactResults.open(path) as compact:
+            return np.asarray(compact.ranks, dtype=np.int64)
+    return np.array([rank for _, rank in iter_ranks(path)], dtype=np.int64)
+
+
+class BarPrinter:
+    """Helper for printing bars."""
+
+    def __init__(self, *, bars_top_n=10, total_width=40, outf: typing.TextIO = sys.stdout):
+        #: The number of top genes to print bars for.
+        self.bars_top_n = bars_top_n
+        #: The total display width.
+        self.total_width = total_width
+        #: The output file.
+        self.outf = outf
+
+    def print(self, results: typing.Iterable[models.Result]):
+        self.print_ranks(ranks_of(results))
+
+    def print_ranks(self, ranks: np.ndarray):
+        """Print the bars for the ranks of the disease genes, ``0`` for missing."""
+        counts = np.bincount(ranks, minlength=self.bars_top_n + 1)
+        missing = int(counts[0])
+        above_bars_top_n = int(counts[self.bars_top_n + 1 :].sum())
+        tot_width = self.total_width - 14
+        max_value = len(ranks)
+
+        def gen_bar(value):
+            if max_value:
+                hash_count = int(tot_width / max_value * value)
+            else:
+                hash_count = 0
+            if value == 0:
+                return ""
+            elif hash_count == 0:
+                return "."
+            else:
+                return "#" * hash_count
+
+        for i in range(1, self.bars_top_n + 1):
+            value = int(counts[i])
+            bar = gen_bar(value)
+            print(f"  {i:3}: {value:>4}  {bar}", file=self.outf)
+        print(file=self.outf)
+        bar = gen_bar(above_bars_top_n)
+        print(f"{self.bars_top_n + 1}-..: {above_bars_top_n:>4}  {bar}", file=self.outf)
+        bar = gen_bar(missing)
+        print(f"mssng: {missing:>4}  {bar}", file=self.outf)
+
+
+def _summarize(values: np.ndarray, counts: np.ndarray, max_k: int) -> np.ndarray:
+    """Compute the metrics from histograms of the ranks.
+
+    :param values: The distinct ranks, ascending, ``0`` for missing.
+    :param counts: Counts of ``values``, one row per histogram.
+    :param max_k: The largest ``k`` for the top-k accuracies.
+    :returns: one row per histogram with the top-k accuracies for ``k`` from 1 to ``max_k``
+        followed by ``SCALAR_METRICS``.
+    """
+    counts = np.atleast_2d(counts).astype(np.float64)
+    n = counts.sum(axis=1)
+    found = values > 0
+    found_counts = counts[:, found]
+    found_values = values[found]
+    found_n = found_counts.sum(axis=1)
+    cumulative = np.cumsum(found_counts, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Number of cases with rank <= k for each k.
+        at_k = np.searchsorted(found_values, np.arange(1, max_k + 1), side="right")
+        padded = np.concatenate([np.zeros((len(counts), 1)), cumulative], axis=1)
+        top_k = padded[:, at_k] / n[:, None]
+        mrr = found_counts @ (1.0 / found_values) / n
+        mean_rank = found_counts @ found_values / found_n
+        # The median is the mean of the values at the 0-based positions ``(m - 1) // 2`` and
+        # ``m // 2`` of the ``m`` sorted found ranks; the value at position ``j`` is the first
+        # one whose cumulative count exceeds ``j``.
+        if len(found_values):
+            last = len(found_values) - 1
+            lower = (cumulative <= ((found_n - 1) // 2)[:, None]).sum(axis=1)
+            upper = (cumulative <= (found_n // 2)[:, None]).sum(axis=1)
+            median_rank = (
+                found_values[np.minimum(lower, last)] + found_values[np.minimum(upper, last)]
+            ) / 2.0
+            median_rank[found_n == 0] = np.nan
+        else:
+            median_rank = np.full(len(counts), np.nan)
+    return np.column_stack([top_k, mrr, mean_rank, median_rank])
+
+
+@attrs.frozen()
+class Metrics:
+    """Accuracy metrics of the results of one method."""
+
+    #: The number of cases.
+    count: int
+    #: The number of cases without result.
+    missing: int
+    #: Fraction of the cases with the disease gene at rank ``k`` or better, for ``k`` from 1.
+    top_k: typing.List[float]
+    #: The mean reciprocal rank.
+    mrr: float
+    #: The mean rank of the found disease genes.
+    mean_rank: float
+    #: The median rank of the found disease genes.
+    median_rank: float
+    #: The confidence level of the intervals.
+    confidence: float = 0.95
+    #: Lower and upper bounds of the confidence intervals, by metric name (``top_1`` etc.).
+    ci: typing.Dict[str, typing.Tuple[float, float]] = attrs.field(factory=dict)
+
+    @classmethod
+    def from_ranks(
+        cls,
+        ranks: np.ndarray,
+        *,
+        max_k: int = 10,
+        bootstrap: int = 2000,
+        confidence: float = 0.95,
+        seed: int = 42,
+    ) -> "Metrics":
+        """Compute the metrics of ``ranks``.
+
+        :param ranks: The ranks of the disease genes, ``0`` for missing.
+        :param max_k: The largest ``k`` for the top-k accuracies.
+        :param bootstrap: The number of bootstrap resamples, ``0`` for no confidence intervals.
+        :param confidence: The confidence level of the intervals.
+        :param seed: Seed of the random number generator for the resamples.
+        """
+        values, counts = np.unique(np.asarray(ranks, dtype=np.int64), return_counts=True)
+        n = int(counts.sum())
+        if not n:
+            values, counts = np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+        estimate = _summarize(values, counts, max_k)[0]
+        names = [f"top_{k}" for k in range(1, max_k + 1)] + list(SCALAR_METRICS)
+        ci = {}
+        if bootstrap and n:
+            rng = np.random.default_rng(seed)
+            resamples = rng.multinomial(n, counts / n, size=bootstrap)
+            alpha = (1.0 - confidence) / 2.0
+            with warnings.catch_warnings():
+                # Resamples without found cases have no mean and median rank.
+                warnings.simplefilter("ignore", RuntimeWarning)
+                bounds = np.nanquantile(
+                    _summarize(values, resamples, max_k), [alpha, 1.0 - alpha], axis=0
+                )
+            ci = {name: (float(bounds[0, i]), float(bounds[1, i])) for i, name in enumerate(names)}
+        return cls(
+            count=n,
+            missing=int(counts[values == 0].sum()),
+            top_k=[float(value) for value in estimate[:max_k]],
+            mrr=float(estimate[max_k]),
+            mean_rank=float(estimate[max_k + 1]),
+            median_rank=float(estimate[max_k + 2]),
+            confidence=confidence,
+            ci=ci,
+        )
+
+    def values(self) -> typing.Dict[str, float]:
+        """Return the metrics by name, ``top_1`` etc. for the top-k accuracies."""
+        result = {f"top_{k}": value for k, value in enumerate(self.top_k, 1)}
+        result.update(mrr=self.mrr, mean_rank=self.mean_rank, median_rank=self.median_rank)
+        return result
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        """Return JSON-serializable dict of the metrics; undefined values are ``None``."""
+
+        def clean(value: float) -> typing.Optional[float]:
+            return None if math.isnan(value) else value
+
+        return {
+            "count": self.count,
+            "missing": self.missing,
+            "confidence": self.confidence,
+            "metrics": {
+                name: {
+                    "value": clean(value),
+                    "ci": [clean(bound) for bound in self.ci[name]] if name in self.ci else None,
+                }
+                for name, value in self.values().items()
+            },
+        }
+
+    def write_tsv(
+        self, outf: typing.TextIO, *, header: bool = True, label: str = "", stratum: str = "all"
+    ):
+        """Write one row per metric with the value and the confidence interval to ``outf``.
+
+        :param label: Value of the first column ``method``, e.g., the results file.
+        :param stratum: Value of the column ``stratum``, e.g., ``hpo-terms=1``.
+        """
+        if header:
+            print("method\tstratum\tmetric\tvalue\tci_lower\tci_upper", file=outf)
+        rows = [("count", self.count), ("missing", self.missing), *self.values().items()]
+        for name, value in rows:
+            lower, upper = self.ci.get(name, ("", ""))
+            print(f"{label}\t{stratum}\t{name}\t{value}\t{lower}\t{upper}", file=outf)
+
+    def print(self, outf: typing.TextIO, *, top_k: typing.Sequence[int] = (1, 5, 10)):
+        """Print the main metrics with their confidence intervals as text to ``outf``."""
+
+        def fmt(name: str, value: float, percent: bool) -> str:
+            text = f"{value:.1%}" if percent else f"{value:.3f}"
+            if name in self.ci:
+                lower, upper = self.ci[name]
+                text += (
+                    f" [{lower:.1%}, {upper:.1%}]" if percent else f" [{lower:.3f}, {upper:.3f}]"
+                )
+            return f"{name:<12}{text}"
+
+        for k in top_k:
+            if k <= len(self.top_k):
+                print(fmt(f"top_{k}", self.top_k[k - 1], True), file=outf)
+        print(fmt("mrr", self.mrr, False), file=outf)
+        print(fmt("mean_rank", self.mean_rank, False), file=outf)
+        print(fmt("median_rank", self.median_rank, False), file=outf)
+        if self.ci:
+            print(f"({self.confidence:.0%} bootstrap confidence intervals)", file=outf)
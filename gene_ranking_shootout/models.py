@@ -1,11 +1,14 @@
 """Data models"""
 
 import csv
+import gzip
 import json
 import pathlib
+import textwrap
 import typing
 
 import attrs
+import cattrs
 
 
 @attrs.frozen()
@@ -26,9 +29,104 @@ class Case:
 
 
 def load_cases_json(path):
-    """Load ``Case`` objects from JSON file."""
-    with open(path, "rt") as f:
-        return [Case(**case) for case in json.load(f)]
+    """Load ``Case`` objects from JSON file (or JSON Lines file)."""
+    return list(iter_cases(path))
+
+
+def open_text(path) -> typing.TextIO:
+    """Open the text file ``path`` for reading, decompressing it if it is gzip compressed."""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt")
+    return open(path, "rt")
+
+
+def iter_json_array(f: typing.TextIO, *, block_size: int = 2**20) -> typing.Iterator[typing.Any]:
+    """Decode the elements of the JSON array in ``f`` one by one.
+
+    Only the current element and a block of ``block_size`` characters are kept in memory.
+
+    :raises ValueError: if ``f`` does not contain a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(block_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Not a JSON array")
+    pos = 1
+    expect_value, after_comma = True, False
+    while True:
+        # Skip whitespace and the separator before the next element.
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer):
+                break
+            buffer, pos = f.read(block_size), 0
+            if not buffer:
+                raise ValueError("Unexpected end of JSON array")
+        if buffer[pos] == "]" and not after_comma:
+            return
+        if not expect_value:
+            if buffer[pos] != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON array, got {buffer[pos]!r}")
+            pos += 1
+            expect_value = after_comma = True
+            continue
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                more = f.read(block_size)
+                if not more:
+                    raise
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            if end == len(buffer) or buffer[end] not in " \t\r\n,]":
+                # A number at the end of the buffer may continue in the next block.
+                more = f.read(block_size)
+                if more:
+                    buffer, pos = buffer[pos:] + more, 0
+                    continue
+            break
+        yield value
+        pos = end
+        expect_value = after_comma = False
+
+
+def iter_cases(path) -> typing.Iterator[Case]:
+    """Load ``Case`` objects one by one from JSON Lines file, or from JSON file.
+
+    Both may be gzip compressed, and both are read incrementally.
+    """
+    with open_text(path) as f:
+        first_line = f.readline()
+        f.seek(0)
+        if first_line.lstrip().startswith("["):
+            for case in iter_json_array(f):
+                yield Case(**case)
+        else:
+            for line in f:
+                if line.strip():
+                    yield Case(**json.loads(line))
+
+
+def dump_cases(cases: typing.Iterable[Case], f: typing.TextIO, *, jsonl: bool = False):
+    """Write ``cases`` to ``f`` one by one, as JSON array or as JSON Lines if ``jsonl``.
+
+    The JSON array output is formatted like ``json.dump(..., indent=2)``.
+    """
+    if jsonl:
+        for case in cases:
+            f.write(json.dumps(cattrs.unstructure(case)))
+            f.write("\n")
+        return
+    sep = "[\n"
+    for case in cases:
+        f.write(sep)
+        f.write(textwrap.indent(json.dumps(cattrs.unstructure(case), indent=2), "  "))
+        sep = ",\n"
+    f.write("[]" if sep == "[\n" else "\n]")
 
 
 @attrs.frozen()
@@ -67,3 +165,38 @@ class Result:
     rank: int
     #: The resulting ranked genes as Entrez IDs.
     result_entrez_ids: typing.List[str]
+    #: Seconds spent in the phases of running the case (see ``perf.PHASES``) and in total, and
+    #: the Unix time when the case was done (``"end"``).
+    timings: typing.Optional[typing.Dict[str, float]] = None
+
+
+def iter_results(path) -> typing.Iterator[Result]:
+    """Load ``Result`` objects one by one from JSON Lines file.
+
+    Files with one JSON array of all results, as written by previous versions, are also
+    accepted but have to be loaded completely.  Files in the compact format of
+    ``results.CompactResults`` (``.npz``) are decoded block by block.
+    """
+    if str(path).endswith(".npz"):
+        # Imported here as the results module builds on this one.
+        from gene_ranking_shootout import results as results_
+
+        with results_.CompactResults.open(path) as compact:
+            yield from compact
+        return
+    with open(path, "rt") as f:
+        first_line = f.readline()
+        f.seek(0)
+        if first_line.lstrip().startswith("["):
+            for record in json.load(f):
+                yield cattrs.structure(record, Result)
+        else:
+            for line in f:
+                if line.strip():
+                    yield cattrs.structure(json.loads(line), Result)
+
+
+def dump_result_jsonl(result: Result, f: typing.TextIO):
+    """Write ``result`` as one line of JSON Lines to ``f``."""
+    f.write(json.dumps(cattrs.unstructure(result)))
+    f.write("\n")
@@ -0,0 +1,332 @@
+"""Live metrics of a running benchmark for monitoring long runs.
+
+``LiveMetrics`` is updated by the runner with each finished case and reads the counts of the
+runner's ranking cache and HTTP transport when rendered, so a stalled backend or a regressing
+method shows while the run is still going:
+
+- the cases done and failed, and the throughput since the start,
+- the seconds since the last finished case,
+- the HTTP requests in flight, retried, timed out, and failed,
+- a histogram of the case latencies,
+- the hit rate of the ranking cache,
+- the running top-1 and top-10 accuracy, counting failed cases as misses.
+
+The metrics are exported either by ``MetricsServer`` on ``127.0.0.1`` in the Prometheus text
+format (``/metrics``) and as JSON (``/metrics.json``), or by ``SnapshotWriter`` as a file that
+is replaced every few seconds: in the Prometheus text format if its name ends in ``.prom``,
+e.g., for the textfile collector of the node exporter, and as JSON otherwise.
+
+With the ``process`` backend, the HTTP requests are sent by the worker processes, whose counts
+are added as their cases finish (see ``runner.BaseRunner._map()``).  The number of requests in
+flight is not known then and left out: ``null`` in the JSON, no sample in the Prometheus format.
+"""
+
+import bisect
+import contextlib
+import http.server
+import json
+import os
+import threading
+import time
+import typing
+
+from gene_ranking_shootout import cache as cache_
+from gene_ranking_shootout import models
+from gene_ranking_shootout import transport as transport_
+
+#: Upper bounds in seconds of the buckets of the latency histogram.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+#: The top-k accuracies reported.
+TOP_K = (1, 10)
+
+#: Prefix of the names of the Prometheus metrics.
+PREFIX = "gene_ranking_shootout"
+
+
+class LiveMetrics:
+    """Counts of the cases of a run, updated as the cases finish.
+
+    :param label: Name of the method, added as ``runner`` label to the Prometheus metrics.
+    :param cache: The ranking cache of the runner, if any.
+    :param transport: The HTTP transport of the runner, if any.
+    :param count_in_flight: Whether ``transport`` sends the requests itself and thus knows the
+        requests in flight.
+    """
+
+    def __init__(
+        self,
+        *,
+        label: str = "",
+        cache: typing.Optional[cache_.RankingCache] = None,
+        transport: typing.Optional[transport_.Transport] = None,
+        count_in_flight: bool = True,
+    ):
+        #: Name of the method.
+        self.label = label
+        #: The ranking cache of the runner.
+        self.cache = cache
+        #: The HTTP transport of the runner.
+        self.transport = transport
+        #: Whether ``transport`` sees the requests in flight, not so with worker processes.
+        self.count_in_flight = count_in_flight
+        #: The Unix time of the start of the run.
+        self.started = time.time()
+        #: The Unix time when the last case finished, if any.
+        self.last_finished: typing.Optional[float] = None
+        #: The number of cases to run, growing as cases are added.
+        self.cases_total = 0
+        #: The number of cases with result.
+        self.cases_done = 0
+        #: The number of cases without result.
+        self.cases_failed = 0
+        #: The number of cases whose disease gene ranks in the top ``k`` for ``k`` in ``TOP_K``.
+        self.top_k_hits = {k: 0 for k in TOP_K}
+        #: The number of latencies in each of the ``LATENCY_BUCKETS`` and above them.
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        #: The sum of the latencies in seconds.
+        self.latency_sum = 0.0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add_cases(self, count: int):
+        """Add ``count`` cases to run."""
+        with self._lock:
+            self.cases_total += count
+
+    def record(self, result: typing.Optional[models.Result]):
+        """Record a finished case with ``result``, ``None`` if it failed."""
+        with self._lock:
+            self.last_finished = time.time()
+            if result is None:
+                self.cases_failed += 1
+                return
+            self.cases_done += 1
+            for k in TOP_K:
+                if 0 < result.rank <= k:
+                    self.top_k_hits[k] += 1
+            latency = (result.timings or {}).get("total")
+            if latency is not None:
+                self.latency_counts[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+                self.latency_sum += latency
+
+    def snapshot(self) -> typing.Dict[str, typing.Any]:
+        """Return the current metrics as JSON-serializable dict."""
+        now = time.time()
+        with self._lock:
+            finished = self.cases_done + self.cases_failed
+            elapsed = now - self.started
+            data: typing.Dict[str, typing.Any] = {
+                "runner": self.label,
+                "time": now,
+                "started": self.started,
+                "cases_total": self.cases_total,
+                "cases_done": self.cases_done,
+                "cases_failed": self.cases_failed,
+                "throughput": finished / elapsed if elapsed > 0 else 0.0,
+                "seconds_since_last_case": (
+                    now - self.last_finished if self.last_finished is not None else None
+                ),
+                "accuracy": {
+                    f"top_{k}": hits / finished if finished else 0.0
+                    for k, hits in self.top_k_hits.items()
+                },
+                "latency": {
+                    "buckets": list(LATENCY_BUCKETS),
+                    "counts": list(self.latency_counts),
+                    "sum": self.latency_sum,
+                },
+            }
+        if self.cache is not None:
+            stats = self.cache.stats
+            data["cache"] = {
+                "hits": stats.hits,
+                "misses": stats.misses,
+                "hit_rate": stats.hit_rate,
+            }
+        if self.transport is not None:
+            data["http"] = {
+                key: getattr(self.transport.stats, key)
+                for key in ("requests", "in_flight", "retries", "timeouts", "failures")
+            }
+            if not self.count_in_flight:
+                data["http"]["in_flight"] = None
+        return data
+
+    def render_prometheus(self) -> str:
+        """Return the current metrics in the Prometheus text exposition format."""
+        data = self.snapshot()
+        escaped = data["runner"].replace("\\", "\\\\").replace('"', '\\"')
+        label = f'runner="{escaped}"'
+        lines: typing.List[str] = []
+
+        def add(name: str, kind: str, help_: str, value: float):
+            lines.append(f"# HELP {PREFIX}_{name} {help_}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            lines.append(f"{PREFIX}_{name}{{{label}}} {value}")
+
+        add("cases", "gauge", "Number of cases to run.", data["cases_total"])
+        add("cases_done_total", "counter", "Number of cases with result.", data["cases_done"])
+        add(
+            "cases_failed_total", "counter", "Number of cases without result.", data["cases_failed"]
+        )
+        add("throughput", "gauge", "Finished cases per second since the start.", data["throughput"])
+        add("start_time_seconds", "gauge", "Unix time of the start of the run.", data["started"])
+        if data["seconds_since_last_case"] is not None:
+            add(
+                "seconds_since_last_case",
+                "gauge",
+                "Seconds since the last case finished.",
+                data["seconds_since_last_case"],
+            )
+        for k in TOP_K:
+            add(
+                f"top_{k}_accuracy",
+                "gauge",
+                f"Fraction of the finished cases with the disease gene in the top {k}.",
+                data["accuracy"][f"top_{k}"],
+            )
+
+        name = f"{PREFIX}_case_latency_seconds"
+        lines.append(f"# HELP {name} Seconds for running a case.")
+        lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        latency = data["latency"]
+        for bound, count in zip([*LATENCY_BUCKETS, "+Inf"], latency["counts"]):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{label}}} {latency['sum']}")
+        lines.append(f"{name}_count{{{label}}} {cumulative}")
+
+        if "cache" in data:
+            cache = data["cache"]
+            add("cache_hits_total", "counter", "Ranking cache hits.", cache["hits"])
+            add("cache_misses_total", "counter", "Ranking cache misses.", cache["misses"])
+            add("cache_hit_rate", "gauge", "Ranking cache hit rate.", cache["hit_rate"])
+        if "http" in data:
+            http = data["http"]
+            add("http_requests_total", "counter", "HTTP requests sent.", http["requests"])
+            if http["in_flight"] is not None:
+                add(
+                    "http_requests_in_flight",
+                    "gauge",
+                    "HTTP requests in flight.",
+                    http["in_flight"],
+                )
+            add("http_retries_total", "counter", "Retried HTTP request attempts.", http["retries"])
+            add("http_timeouts_total", "counter", "Timed out HTTP attempts.", http["timeouts"])
+            add("http_failures_total", "counter", "HTTP requests failed.", http["failures"])
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """Serves ``/metrics`` in the Prometheus text format and ``/metrics.json``."""
+
+    server: "MetricsServer"
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = self.server.metrics.render_prometheus().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body = json.dumps(self.server.metrics.snapshot()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    """Local HTTP server with ``MetricsHandler``.
+
+    :param metrics: The metrics to serve.
+    :param port: The port to listen on, ``0`` for a free one.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, metrics: LiveMetrics, port: int = 0):
+        super().__init__(("127.0.0.1", port), MetricsHandler)
+        #: The metrics to serve.
+        self.metrics = metrics
+
+    @property
+    def url(self) -> str:
+        """URL of the Prometheus metrics."""
+        return f"http://127.0.0.1:{self.server_port}/metrics"
+
+    @contextlib.contextmanager
+    def running(self) -> typing.Iterator["MetricsServer"]:
+        """Serve requests in a background thread within the ``with`` block."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            self.shutdown()
+            self.server_close()
+
+
+class SnapshotWriter:
+    """Writes the metrics to a file every ``interval`` seconds, see module documentation.
+
+    :param metrics: The metrics to write.
+    :param path: The file to replace with each snapshot.
+    :param interval: Seconds between two snapshots.
+    """
+
+    def __init__(self, metrics: LiveMetrics, path: str, interval: float = 10.0):
+        #: The metrics to write.
+        self.metrics = metrics
+        #: The file to replace with each snapshot.
+        self.path = path
+        #: Seconds between two snapshots.
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def write(self):
+        """Write a snapshot of the metrics now."""
+        if self.path.endswith(".prom"):
+            text = self.metrics.render_prometheus()
+        else:
+            text = json.dumps(self.metrics.snapshot(), indent=2) + "\n"
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wt") as outputf:
+            outputf.write(text)
+        os.replace(tmp_path, self.path)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    @contextlib.contextmanager
+    def running(self) -> typing.Iterator["SnapshotWriter"]:
+        """Write snapshots in a background thread within the ``with`` block and a last one at
+        its end.
+        """
+        self.write()
+        self._stop.clear()
+        thread = threading.Thread(target=self._loop, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            self._stop.set()
+            thread.join()
+            self.write()
@@ -0,0 +1,402 @@
+"""Offline benchmark of the overhead of the benchmark harness itself.
+
+The runners are run against local stand-ins for the ranking methods that answer with the test
+fixtures in ``tests/data`` after an artificial latency:
+
+- ``StandInServer`` serves fake AMELIE, Exomiser, and VarFish APIs over HTTP.
+- ``tests/data/podman/podman`` is a fake ``podman`` executable that is put first on ``PATH``
+  and runs the fake CADA and Phen2Gene tools from the fixture directories instead of
+  containers.
+
+Each scenario is run for each combination of case count and concurrency in a fresh process,
+and the throughput in cases per second and the peak memory (resident set size) of that process
+are recorded.  The worker processes of the container runners are not counted for the memory.
+The measurements can be written to a JSON Lines file and compared with those of an earlier
+version of the code, so that changes to ``BaseRunner`` and the runners can be checked for
+performance regressions without network access, containers, or the real tools.
+"""
+
+import concurrent.futures
+import contextlib
+import csv
+import http.server
+import json
+import multiprocessing
+import os
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+import typing
+import urllib.parse
+
+import attrs
+import cattrs
+from loguru import logger
+
+from gene_ranking_shootout import genes as genes_
+from gene_ranking_shootout import matrix, models
+
+#: Directory with the fixtures of the tests in a checkout of the repository.
+FIXTURES_DIR = pathlib.Path(__file__).parent.parent / "tests" / "data"
+
+
+def check_fixtures_dir(fixtures_dir: typing.Union[str, pathlib.Path]) -> pathlib.Path:
+    """Return ``fixtures_dir`` as path if it has the fixtures of the stand-ins.
+
+    The fixtures are not installed with the package, ``FIXTURES_DIR`` only exists in a checkout
+    of the repository.
+
+    :raises ValueError: if the fixtures are missing.
+    """
+    fixtures_dir = pathlib.Path(fixtures_dir)
+    if not (fixtures_dir / "podman" / "podman").is_file():
+        raise ValueError(
+            f"No test fixtures in {fixtures_dir}; they are not installed with the package, use "
+            "the tests/data directory of a checkout of the repository"
+        )
+    return fixtures_dir
+
+
+@attrs.frozen()
+class Scenario:
+    """A runner configuration to measure."""
+
+    #: The runner, a key of ``matrix.RUNNERS``.
+    runner: str
+    #: The fixture directory whose genes and HPO terms the cases are built from.
+    fixture: str
+    #: Whether container runners use persistent workers rather than one container per case.
+    workers: bool = False
+
+
+#: The scenarios by name.
+SCENARIOS: typing.Dict[str, Scenario] = {
+    "amelie": Scenario(runner="amelie", fixture="amelie"),
+    "exomiser": Scenario(runner="exomiser", fixture="cada"),
+    "varfish-phenix": Scenario(runner="varfish-phenix", fixture="cada"),
+    "cada": Scenario(runner="cada", fixture="cada"),
+    "cada-workers": Scenario(runner="cada", fixture="cada", workers=True),
+    "phen2gene": Scenario(runner="phen2gene", fixture="phen2gene"),
+    "phen2gene-workers": Scenario(runner="phen2gene", fixture="phen2gene", workers=True),
+}
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Answers the requests of the AMELIE, Exomiser, and VarFish runners.
+
+    - ``POST /amelie/...`` returns the entries of the fixture response for the given genes,
+    - ``POST /exomiser/...`` ranks the given genes by descending Entrez ID,
+    - ``GET /varfish/...`` returns the given gene symbols in the given order.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server: "StandInServer"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/amelie/"):
+            symbols = set(urllib.parse.parse_qs(body.decode())["genes"][0].split(","))
+            self.respond(
+                [entry for entry in self.server.amelie_response if entry[0] in symbols],
+                genes=len(symbols),
+            )
+        elif self.path.startswith("/exomiser/"):
+            gene_ids = sorted(json.loads(body)["genes"], key=int, reverse=True)
+            self.respond(
+                {"results": [{"geneId": gene_id} for gene_id in gene_ids]}, genes=len(gene_ids)
+            )
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path.startswith("/varfish/"):
+            symbols = urllib.parse.parse_qs(url.query)["gene_symbols"][0].split(",")
+            self.respond(
+                {"result": [{"gene_symbol": symbol} for symbol in symbols]}, genes=len(symbols)
+            )
+        else:
+            self.send_error(404)
+
+    def respond(self, data: typing.Any, *, genes: int = 0):
+        time.sleep(self.server.latency + self.server.gene_latency * genes)
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    """Local HTTP server with ``StandInHandler`` on a free port.
+
+    :param fixtures_dir: Directory with the test fixtures.
+    :param latency: Seconds to wait before answering each request.
+    :param gene_latency: Seconds to wait additionally for each gene of the request.
+    """
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, fixtures_dir: pathlib.Path, latency: float = 0.0, gene_latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        #: Seconds to wait before answering each request.
+        self.latency = latency
+        #: Seconds to wait additionally for each gene of the request.
+        self.gene_latency = gene_latency
+        with open(fixtures_dir / "amelie" / "response.json", "rt") as inputf:
+            #: The fixture response of AMELIE.
+            self.amelie_response = json.load(inputf)
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server."""
+        return f"http://127.0.0.1:{self.server_port}"
+
+    @contextlib.contextmanager
+    def running(self) -> typing.Iterator["StandInServer"]:
+        """Serve requests in a background thread within the ``with`` block."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            self.shutdown()
+            self.server_close()
+
+
+def load_fixture_query(
+    fixtures_dir: pathlib.Path, fixture: str, genes: genes_.GeneTable
+) -> typing.Tuple[typing.List[str], typing.List[str]]:
+    """Return the Entrez IDs of the genes in the output of the fixture and its HPO terms."""
+    path = fixtures_dir / fixture
+    if fixture == "amelie":
+        with open(path / "response.json", "rt") as inputf:
+            gene_ids = genes.to_entrez_ids([entry[0] for entry in json.load(inputf)])
+        with open(path / "query.json", "rt") as inputf:
+            hpo_terms = json.load(inputf)["phenotypes"].split(",")
+    elif fixture == "cada":
+        with open(path / "result.txt", "rt") as inputf:
+            gene_ids = [row["gene_id"] for row in csv.DictReader(inputf, delimiter="\t")]
+        hpo_terms = (path / "query.txt").read_text().split()
+    elif fixture == "phen2gene":
+        with open(path / "output_file.associated_gene_list", "rt") as inputf:
+            symbols = [row["Gene"] for row in csv.DictReader(inputf, delimiter="\t")]
+        gene_ids = genes.to_entrez_ids(symbols)
+        hpo_terms = (path / "terms.txt").read_text().split()
+    else:
+        raise ValueError(f"Unknown fixture {fixture}")
+    return gene_ids, hpo_terms
+
+
+def make_cases(
+    gene_ids: typing.List[str],
+    hpo_terms: typing.List[str],
+    count: int,
+    candidate_genes_count: int = 19,
+) -> typing.List[models.Case]:
+    """Build ``count`` cases from the genes and HPO terms of a fixture.
+
+    The disease gene and candidate genes rotate through ``gene_ids``.  Each case gets one more
+    HPO term of its own so that no two cases are deduplicated into one query.
+    """
+    cases = []
+    for i in range(count):
+        genes = [gene_ids[(i + j) % len(gene_ids)] for j in range(candidate_genes_count + 1)]
+        cases.append(
+            models.Case(
+                name=f"Patient:{i + 1}",
+                disease_omim_id="unknown",
+                disease_gene_id=genes[0],
+                hpo_terms=[*hpo_terms, f"HP:{9000000 + i:07d}"],
+                candidate_gene_ids=genes[1:],
+            )
+        )
+    return cases
+
+
+def runner_args(scenario: Scenario, url: str, concurrency: int) -> typing.Dict[str, typing.Any]:
+    """Return the keyword arguments of the runner class for ``scenario``."""
+    args: typing.Dict[str, typing.Any] = {"concurrency": concurrency if concurrency > 1 else 0}
+    if scenario.runner == "amelie":
+        args["api_url"] = f"{url}/amelie/api/gene_list_api/"
+    elif scenario.runner == "exomiser":
+        args.update(base_url=url, algorithm="phenix")
+    elif scenario.runner == "varfish-phenix":
+        args["base_url"] = f"{url}/varfish/hpo/sim/term-gene"
+    elif scenario.workers:
+        args["workers"] = concurrency
+    return args
+
+
+@attrs.frozen()
+class Measurement:
+    """Measurement of running one scenario."""
+
+    #: The name of the scenario.
+    scenario: str
+    #: The number of cases.
+    cases: int
+    #: The number of cases in flight at the same time.
+    concurrency: int
+    #: The number of results written.
+    results: int
+    #: Seconds for running the cases, without loading the gene data.
+    seconds: float
+    #: Peak resident set size of the process running the cases in MB.
+    peak_rss_mb: float
+
+    @property
+    def throughput(self) -> float:
+        """Cases per second."""
+        return self.cases / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def key(self) -> typing.Tuple[str, int, int]:
+        """The scenario, case count, and concurrency, for comparing measurements."""
+        return self.scenario, self.cases, self.concurrency
+
+
+def peak_rss_mb() -> float:
+    """Return the peak resident set size of the current process in MB."""
+    import resource  # not available on Windows
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+
+def _measure(
+    runner: str, args: typing.Dict[str, typing.Any], cases: typing.List[models.Case]
+) -> typing.Tuple[int, float, float]:
+    """Run ``cases`` with a runner; called in a fresh process for each measurement.
+
+    :returns: the number of results, the seconds for running the cases, and the peak memory.
+    """
+    logger.disable("gene_ranking_shootout")
+    the_runner = matrix.RUNNERS[runner](**args)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path_results = os.path.join(tmpdir, "results.jsonl")
+        start = time.perf_counter()
+        try:
+            the_runner.run_cases(cases, path_results)
+        finally:
+            the_runner.close()
+        seconds = time.perf_counter() - start
+        results = sum(1 for _ in models.iter_results(path_results))
+    return results, seconds, peak_rss_mb()
+
+
+@contextlib.contextmanager
+def _environ(**values: str) -> typing.Iterator[None]:
+    """Set environment variables, inherited by the processes started, within ``with`` block."""
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+
+def run_suite(
+    scenarios: typing.Iterable[str],
+    case_counts: typing.Iterable[int],
+    concurrencies: typing.Iterable[int],
+    *,
+    latency: float = 0.01,
+    startup: float = 0.0,
+    fixtures_dir: typing.Union[str, pathlib.Path] = FIXTURES_DIR,
+) -> typing.Iterator[Measurement]:
+    """Measure each scenario for each combination of case count and concurrency.
+
+    :param scenarios: Names of the scenarios, keys of ``SCENARIOS``.
+    :param case_counts: The numbers of cases to run.
+    :param concurrencies: The numbers of cases in flight, ``1`` for running them serially.
+    :param latency: Seconds that the stand-in servers and tools take for each query.
+    :param startup: Seconds that the fake podman takes for starting a container.
+    :param fixtures_dir: Directory with the test fixtures.
+    :returns: iterator of the measurements as they are done.
+    :raises ValueError: if the fixtures are missing, see ``check_fixtures_dir()``.
+    """
+    fixtures_dir = check_fixtures_dir(fixtures_dir)
+    genes = genes_.GeneTable.load()
+    podman_dir = fixtures_dir / "podman"
+    context = multiprocessing.get_context("spawn")
+    with StandInServer(fixtures_dir, latency).running() as server, _environ(
+        PATH=f"{podman_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        FAKE_TOOL_LATENCY=str(latency),
+        FAKE_PODMAN_STARTUP=str(startup),
+        TQDM_DISABLE="1",
+    ):
+        for name in scenarios:
+            scenario = SCENARIOS[name]
+            gene_ids, hpo_terms = load_fixture_query(fixtures_dir, scenario.fixture, genes)
+            for case_count in case_counts:
+                cases = make_cases(gene_ids, hpo_terms, case_count)
+                for concurrency in concurrencies:
+                    args = runner_args(scenario, server.url, concurrency)
+                    with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+                        results, seconds, rss = pool.submit(
+                            _measure, scenario.runner, args, cases
+                        ).result()
+                    yield Measurement(
+                        scenario=name,
+                        cases=case_count,
+                        concurrency=concurrency,
+                        results=results,
+                        seconds=seconds,
+                        peak_rss_mb=rss,
+                    )
+
+
+def dump_measurement_jsonl(measurement: Measurement, f: typing.TextIO):
+    """Write ``measurement`` as one line of JSON Lines to ``f``."""
+    f.write(json.dumps(cattrs.unstructure(measurement)))
+    f.write("\n")
+
+
+def load_measurements(path: typing.Union[str, pathlib.Path]) -> typing.List[Measurement]:
+    """Load ``Measurement`` objects from JSON Lines file."""
+    with open(path, "rt") as inputf:
+        return [cattrs.structure(json.loads(line), Measurement) for line in inputf if line.strip()]
+
+
+def print_header(outf: typing.TextIO, *, baseline: bool = False):
+    """Print the header of the table of measurements to ``outf``."""
+    print(
+        f"{'scenario':<20}{'cases':>8}{'conc':>6}{'results':>9}{'seconds':>10}{'cases/s':>10}"
+        f"{'RSS MB':>9}" + (f"{'vs base':>9}" if baseline else ""),
+        file=outf,
+    )
+
+
+def print_measurement(
+    measurement: Measurement,
+    outf: typing.TextIO,
+    *,
+    baseline: typing.Optional[typing.Dict[typing.Tuple[str, int, int], Measurement]] = None,
+):
+    """Print ``measurement`` as row of the table to ``outf``.
+
+    With ``baseline``, the throughput relative to the baseline measurement of the same
+    scenario, case count, and concurrency is shown as well.
+    """
+    m = measurement
+    row = (
+        f"{m.scenario:<20}{m.cases:>8}{m.concurrency:>6}{m.results:>9}{m.seconds:>10.2f}"
+        f"{m.throughput:>10.1f}{m.peak_rss_mb:>9.1f}"
+    )
+    if baseline is not None:
+        base = baseline.get(m.key)
+        row += f"{m.throughput / base.throughput:>8.2f}x" if base and base.throughput else " " * 9
+    print(row, file=outf)
@@ -0,0 +1,224 @@
+"""Timing of the phases of running the cases and performance reports.
+
+The runners mark the phases of running a case with ``phase()``:
+
+``prepare``
+    Building the query, e.g., translating gene IDs to symbols.
+``invoke``
+    Waiting for the method, e.g., the HTTP request or the container.
+``parse``
+    Reading the method's output and translating the genes back.
+``rank``
+    Determining the rank of the disease gene.
+
+Answering a case from the ranking cache is recorded as ``cache`` phase and restricting the
+result of a deduplicated query to one of its cases as ``split`` phase.
+
+The times are recorded by the ``Recorder`` that is active in the current thread, if any, and
+stored with each result.  Nested phases are not counted for the outer phase.  Without an active
+recorder, ``phase()`` does nearly nothing.
+"""
+
+import contextlib
+import threading
+import time
+import typing
+
+import attrs
+import numpy as np
+
+from gene_ranking_shootout import models
+
+#: The phases of running a case.
+PHASES = ("prepare", "invoke", "parse", "rank")
+
+#: The percentiles shown in the reports.
+PERCENTILES = (50, 95, 99)
+
+_local = threading.local()
+
+
+class Recorder:
+    """Records the durations of the phases of running one case.
+
+    Use as context manager, possibly multiple times, around the code running the case.
+
+    :param timings: Timings to continue from, e.g., of the query that the case is part of.
+    """
+
+    def __init__(self, timings: typing.Optional[typing.Dict[str, float]] = None):
+        #: Seconds spent in each phase, in total (``"total"``), and the Unix time when the case
+        #: was done (``"end"``).
+        self.timings: typing.Dict[str, float] = dict(timings or {})
+        self._nested: typing.List[float] = []
+        self._start = 0.0
+
+    def __enter__(self) -> "Recorder":
+        if not hasattr(_local, "recorders"):
+            _local.recorders = []
+        _local.recorders.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.recorders.pop()
+        self.add("total", time.perf_counter() - self._start)
+        self.timings["end"] = time.time()
+
+    def add(self, name: str, seconds: float):
+        """Add ``seconds`` to the phase ``name``."""
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def attach(self, result: typing.Optional[models.Result]) -> typing.Optional[models.Result]:
+        """Return ``result`` with the recorded timings."""
+        if result is None:
+            return None
+        return attrs.evolve(result, timings=dict(self.timings))
+
+
+def current() -> typing.Optional[Recorder]:
+    """Return the active recorder of the current thread, if any."""
+    recorders = getattr(_local, "recorders", None)
+    return recorders[-1] if recorders else None
+
+
+@contextlib.contextmanager
+def phase(name: str):
+    """Record the time spent in the ``with`` block for the phase ``name``."""
+    recorder = current()
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    recorder._nested.append(0.0)
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = recorder._nested.pop()
+        recorder.add(name, elapsed - nested)
+        if recorder._nested:
+            recorder._nested[-1] += elapsed
+
+
+@attrs.frozen()
+class PhaseStats:
+    """Latency statistics of one phase in seconds."""
+
+    #: The number of cases with the phase.
+    count: int
+    #: The mean duration.
+    mean: float
+    #: The percentiles from ``PERCENTILES``.
+    percentiles: typing.Tuple[float, ...]
+    #: The sum of the durations.
+    total: float
+
+
+@attrs.frozen()
+class PerfSummary:
+    """Performance summary of the results of a run."""
+
+    #: The number of results.
+    count: int
+    #: The number of results with timings.
+    timed: int
+    #: Seconds from the start of the first to the end of the last case.
+    wall_time: float
+    #: Statistics per phase, plus ``"total"``.
+    phases: typing.Dict[str, PhaseStats]
+    #: Pairs of name and total seconds of the slowest cases.
+    slowest: typing.List[typing.Tuple[str, float]]
+    #: Histogram of the total durations: upper bounds of the buckets in seconds and counts.
+    histogram: typing.List[typing.Tuple[float, int]]
+
+    @property
+    def throughput(self) -> float:
+        """Cases per second."""
+        return self.timed / self.wall_time if self.wall_time > 0 else 0.0
+
+    @classmethod
+    def from_results(
+        cls, results: typing.Iterable[models.Result], *, slowest: int = 10
+    ) -> "PerfSummary":
+        """Summarize the timings of ``results``."""
+        count = 0
+        names: typing.List[str] = []
+        timings: typing.List[typing.Dict[str, float]] = []
+        for result in results:
+            count += 1
+            if result.timings:
+                names.append(result.case.name)
+                timings.append(result.timings)
+        phases = {}
+        for name in (*PHASES, *sorted({key for t in timings for key in t} - set(PHASES))):
+            if name == "end":
+                continue
+            values = np.array([t[name] for t in timings if name in t])
+            if len(values):
+                phases[name] = PhaseStats(
+                    count=len(values),
+                    mean=float(values.mean()),
+                    percentiles=tuple(np.percentile(values, PERCENTILES).tolist()),
+                    total=float(values.sum()),
+                )
+        totals = np.array([t.get("total", 0.0) for t in timings])
+        ends = np.array([t.get("end", 0.0) for t in timings])
+        wall_time = float(ends.max() - (ends - totals).min()) if len(timings) else 0.0
+        order = np.argsort(-totals, kind="stable")[:slowest]
+        # Buckets doubling from 1ms.
+        bounds = 0.001 * 2.0 ** np.arange(0, 25)
+        counts = np.bincount(np.searchsorted(bounds, totals), minlength=len(bounds) + 1)
+        nonzero = np.flatnonzero(counts)
+        histogram = []
+        if len(nonzero):
+            for i in range(nonzero[0], nonzero[-1] + 1):
+                bound = float(bounds[i]) if i < len(bounds) else float("inf")
+                histogram.append((bound, int(counts[i])))
+        return cls(
+            count=count,
+            timed=len(timings),
+            wall_time=wall_time,
+            phases=phases,
+            slowest=[(names[i], float(totals[i])) for i in order],
+            histogram=histogram,
+        )
+
+    def print(self, outf: typing.TextIO, *, total_width: int = 80):
+        """Print the summary as text to ``outf``."""
+        print(f"cases: {self.count} ({self.timed} with timings)", file=outf)
+        print(
+            f"wall time: {self.wall_time:.2f}s, throughput: {self.throughput:.2f} cases/s",
+            file=outf,
+        )
+        if not self.phases:
+            return
+        total = self.phases.get("total")
+        header = "".join(f"{f'p{p}':>10}" for p in PERCENTILES)
+        print(f"\n{'phase':<10}{'count':>8}{'mean':>10}{header}{'share':>8}", file=outf)
+        for name, stats in self.phases.items():
+            share = stats.total / total.total if total and total.total else 0.0
+            values = "".join(f"{format_seconds(value):>10}" for value in stats.percentiles)
+            print(
+                f"{name:<10}{stats.count:>8}{format_seconds(stats.mean):>10}{values}"
+                f"{share:>8.1%}",
+                file=outf,
+            )
+        print("\nlatency histogram (total):", file=outf)
+        max_count = max(count for _, count in self.histogram)
+        width = max(1, total_width - 22)
+        for bound, count in self.histogram:
+            bar = "#" * int(width * count / max_count) or ("." if count else "")
+            print(f"  <={format_seconds(bound):>9} {count:>7}  {bar}", file=outf)
+        print("\nslowest cases:", file=outf)
+        for name, seconds in self.slowest:
+            print(f"  {format_seconds(seconds):>9}  {name}", file=outf)
+
+
+def format_seconds(value: float) -> str:
+    """Format duration in seconds with a suitable unit."""
+    if value == float("inf"):
+        return "inf"
+    if value < 1.0:
+        return f"{value * 1000:.1f}ms"
+    return f"{value:.2f}s"
@@ -0,0 +1,350 @@
+"""In-process implementation of the Phenix gene ranking on NumPy arrays.
+
+The genes are scored by the phenotypic similarity of their HPO annotations to the HPO terms of
+the case, as by VarFish's ``hpo sim term-gene`` endpoint used by ``PhenixVarFishRunner``:
+
+- The information content of a term is ``-log(p)`` with ``p`` the fraction of the annotated
+  genes that are annotated with the term or one of its descendants.
+- The similarity of two terms is the information content of their most informative common
+  ancestor (Resnik).
+- The score of a gene is the mean over the query terms of the best similarity of the query
+  term to any of the gene's terms.
+
+The best similarity of a query term ``q`` to the terms of a gene ``g`` is the largest
+information content of a common ancestor, i.e., of an ancestor of ``q`` that is also an
+ancestor of a term of ``g``.  So it only takes the ancestors of ``q`` and, for each term, the
+genes annotated with it or a descendant.  ``PhenixModel`` precomputes the information content
+and the latter as term x gene bit matrix, about 10 MB for the full HPO.  A dense best-match
+matrix (query term x gene) would take a hundredfold, so it is never built.
+
+``PhenixModel.rank()`` instead scores a whole batch of cases with a handful of array operations:
+for all pairs of query term and candidate gene of all cases at once, the bits of the query
+term's ancestors (about 20 in the HPO) are looked up for the gene, the best matches are taken
+with ``numpy.maximum.reduceat()``, summed per case and gene with ``numpy.bincount()``, and
+sorted with one ``numpy.lexsort()``.  Ties are ranked in the order of the candidates, with the disease gene
+last, like the results of ``PhenixVarFishRunner``.
+
+The ontology is read from ``hp.obo`` and the gene annotations from ``genes_to_phenotype.txt``
+of the HPO releases.
+"""
+
+import hashlib
+import os
+import pathlib
+import typing
+
+import attrs
+from loguru import logger
+import numpy as np
+
+from gene_ranking_shootout import cache as cache_
+from gene_ranking_shootout import genes as genes_
+
+#: File name of the ontology in the HPO directory.
+OBO_NAME = "hp.obo"
+
+#: File name of the gene annotations in the HPO directory.
+ANNOTATIONS_NAME = "genes_to_phenotype.txt"
+
+#: Version of the sidecar file layout, bump when changing ``PhenixModel.compile()``.
+SIDECAR_VERSION = 1
+
+
+@attrs.frozen()
+class Ontology:
+    """The terms of the ontology with their parents (``is_a``)."""
+
+    #: The term IDs, e.g., ``"HP:0001263"``.
+    term_ids: typing.List[str]
+    #: The index of each term ID and of each alternative ID of a term.
+    index: typing.Dict[str, int]
+    #: The indices of the parents of each term.
+    parents: typing.List[typing.List[int]]
+    #: The ``data-version`` of the OBO file, if any.
+    version: typing.Optional[str] = None
+
+    @classmethod
+    def from_obo(cls, path: typing.Union[str, pathlib.Path]) -> "Ontology":
+        """Read the ``[Term]`` stanzas of the OBO file ``path``, skipping obsolete terms."""
+        version = None
+        stanzas: typing.List[typing.Dict[str, typing.List[str]]] = []
+        stanza: typing.Optional[typing.Dict[str, typing.List[str]]] = None
+        with open(path, "rt") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    stanza = {} if line == "[Term]" else None
+                    if stanza is not None:
+                        stanzas.append(stanza)
+                elif ": " in line:
+                    key, value = line.split(": ", 1)
+                    if stanza is not None:
+                        # Drop trailing comments like ``HP:0000118 ! Phenotypic abnormality``.
+                        stanza.setdefault(key, []).append(value.split(" !")[0].strip())
+                    elif key == "data-version" and not stanzas:
+                        version = value
+        stanzas = [s for s in stanzas if s.get("is_obsolete") != ["true"] and "id" in s]
+        term_ids = [s["id"][0] for s in stanzas]
+        index = {term_id: i for i, term_id in enumerate(term_ids)}
+        for i, s in enumerate(stanzas):
+            for alt_id in s.get("alt_id", []):
+                index.setdefault(alt_id, i)
+        parents = [
+            [index[parent] for parent in s.get("is_a", []) if parent in index] for s in stanzas
+        ]
+        return cls(term_ids=term_ids, index=index, parents=parents, version=version)
+
+    def ancestors(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Return the ancestors of each term, including the term, as CSR offsets and indices."""
+        closure: typing.List[typing.Optional[typing.FrozenSet[int]]] = [None] * len(self.term_ids)
+        for start in range(len(self.term_ids)):
+            # Depth-first, computing the ancestors of the parents before those of the term.
+            stack = [start]
+            while stack:
+                i = stack[-1]
+                if closure[i] is not None:
+                    stack.pop()
+                    continue
+                todo = [p for p in self.parents[i] if closure[p] is None]
+                if todo:
+                    stack.extend(todo)
+                    continue
+                stack.pop()
+                closure[i] = frozenset([i]).union(*(closure[p] for p in self.parents[i]))
+        offsets = np.zeros(len(closure) + 1, dtype=np.int64)
+        np.cumsum([len(c) for c in closure], out=offsets[1:])
+        indices = np.fromiter(
+            (i for c in closure for i in sorted(c)), dtype=np.int32, count=offsets[-1]
+        )
+        return offsets, indices
+
+
+def sidecar_key(hpo_dir: typing.Union[str, pathlib.Path]) -> str:
+    """Return the path, size, and modification time of the files in ``hpo_dir`` as string."""
+    parts = [str(SIDECAR_VERSION)]
+    for name in (OBO_NAME, ANNOTATIONS_NAME):
+        path = (pathlib.Path(hpo_dir) / name).resolve()
+        stat = path.stat()
+        parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+    return ":".join(parts)
+
+
+def read_annotations(
+    path: typing.Union[str, pathlib.Path],
+) -> typing.Iterator[typing.Tuple[int, str]]:
+    """Yield the Entrez ID and HPO term of each line of ``genes_to_phenotype.txt``.
+
+    Reads the current format (header ``ncbi_gene_id gene_symbol hpo_id ...``) and the legacy
+    one (header comment, then Entrez ID, symbol, and term ID).
+    """
+    with open(path, "rt") as f:
+        for line in f:
+            if line.startswith("#") or line.startswith("ncbi_gene_id"):
+                continue
+            row = line.rstrip("\n").split("\t")
+            if len(row) >= 3:
+                yield genes_.parse_entrez_id(row[0]), row[2]
+
+
+class PhenixModel:
+    """The HPO data for scoring genes as arrays, see the module documentation.
+
+    :param arrays: The arrays as computed by ``compile()``.
+    """
+
+    def __init__(self, arrays: typing.Mapping[str, np.ndarray]):
+        #: The arrays of the model.
+        self.arrays = arrays
+        #: The term IDs, e.g., ``"HP:0001263"``.
+        self.term_ids: typing.List[str] = arrays["term_ids"].tolist()
+        #: The index of each term ID and of each alternative ID of a term.
+        self.index = {term_id: i for i, term_id in enumerate(self.term_ids)}
+        for alt_id, term in zip(arrays["alt_ids"].tolist(), arrays["alt_id_terms"].tolist()):
+            self.index.setdefault(alt_id, term)
+        #: The ancestors of each term, including the term (CSR offsets and term indices).
+        self.ancestor_offsets = arrays["ancestor_offsets"]
+        self.ancestor_indices = arrays["ancestor_indices"]
+        #: The Entrez IDs of the annotated genes, sorted.
+        self.gene_ids = arrays["gene_ids"]
+        #: Whether the genes are annotated with each term or a descendant, the term x gene
+        #: matrix with the bits of each row packed by ``numpy.packbits()``.
+        self.term_genes = arrays["term_genes"]
+        #: The information content of each term.
+        self.information_content = arrays["information_content"]
+
+    @property
+    def version(self) -> str:
+        """The ``data-version`` of the ontology, empty if unknown."""
+        return str(self.arrays["version"])
+
+    @classmethod
+    def compile(
+        cls, ontology: Ontology, annotations: typing.Iterable[typing.Tuple[int, str]]
+    ) -> "PhenixModel":
+        """Precompute the arrays for ``ontology`` and the pairs of Entrez ID and HPO term ID
+        of the gene ``annotations``.
+        """
+        n_terms = len(ontology.term_ids)
+        ancestor_offsets, ancestor_indices = ontology.ancestors()
+
+        pairs = np.array(
+            [
+                (gene_id, ontology.index[term])
+                for gene_id, term in annotations
+                if term in ontology.index
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        # The pairs are listed once per disease of the gene.
+        pairs = np.unique(pairs, axis=0)
+        gene_ids, gene_index = np.unique(pairs[:, 0], return_inverse=True)
+        gene_index = gene_index.reshape(-1)
+        n_genes = max(len(gene_ids), 1)
+
+        # Propagate the annotations to the ancestors: one (term, gene) pair for each ancestor
+        # of each annotated term, deduplicated.
+        counts = np.diff(ancestor_offsets)[pairs[:, 1]]
+        starts = np.repeat(ancestor_offsets[pairs[:, 1]], counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        terms = ancestor_indices[starts + within].astype(np.int64)
+        keys = np.unique(terms * n_genes + np.repeat(gene_index, counts))
+        term_of_key, gene_of_key = np.divmod(keys, n_genes)
+        term_genes = np.zeros((n_terms, (n_genes + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(
+            term_genes,
+            (term_of_key, gene_of_key >> 3),
+            (128 >> (gene_of_key & 7)).astype(np.uint8),
+        )
+
+        # Terms without genes never are a common ancestor, their information content is unused.
+        term_counts = np.bincount(term_of_key, minlength=n_terms)
+        information_content = np.where(
+            term_counts > 0, np.log(n_genes / np.maximum(term_counts, 1)), 0.0
+        )
+
+        alt_ids = [
+            (term_id, i) for term_id, i in ontology.index.items() if ontology.term_ids[i] != term_id
+        ]
+        return cls(
+            {
+                "version": np.array(ontology.version or ""),
+                "term_ids": np.array(ontology.term_ids, dtype=str),
+                "alt_ids": np.array([alt_id for alt_id, _ in alt_ids], dtype=str),
+                "alt_id_terms": np.array([i for _, i in alt_ids], dtype=np.int64),
+                "ancestor_offsets": ancestor_offsets,
+                "ancestor_indices": ancestor_indices,
+                "gene_ids": gene_ids,
+                "term_genes": term_genes,
+                "information_content": information_content,
+            }
+        )
+
+    @classmethod
+    def from_dir(cls, hpo_dir: typing.Union[str, pathlib.Path]) -> "PhenixModel":
+        """Compile the model from ``hp.obo`` and ``genes_to_phenotype.txt`` in ``hpo_dir``."""
+        hpo_dir = pathlib.Path(hpo_dir)
+        ontology = Ontology.from_obo(hpo_dir / OBO_NAME)
+        return cls.compile(ontology, read_annotations(hpo_dir / ANNOTATIONS_NAME))
+
+    @classmethod
+    def load(
+        cls,
+        hpo_dir: typing.Union[str, pathlib.Path],
+        *,
+        cache_dir: typing.Optional[pathlib.Path] = None,
+    ) -> "PhenixModel":
+        """Load the model for the files in ``hpo_dir`` via its sidecar file.
+
+        The sidecar file is written on the first load and identified by the path, size, and
+        modification time of the files.  If it cannot be written, the model is compiled on each
+        load.
+
+        :param hpo_dir: The directory with ``hp.obo`` and ``genes_to_phenotype.txt``.
+        :param cache_dir: Directory of the sidecar files, defaults to a subdirectory of
+            ``cache.default_cache_dir()``.
+        """
+        digest = hashlib.sha256(sidecar_key(hpo_dir).encode()).hexdigest()[:16]
+        sidecar = (cache_dir or cache_.default_cache_dir() / "phenix") / f"hpo-{digest}.npz"
+        if sidecar.exists():
+            return cls(dict(np.load(sidecar)))
+        model = cls.from_dir(hpo_dir)
+        try:
+            sidecar.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = sidecar.with_name(f"{sidecar.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as outputf:
+                np.savez(outputf, **model.arrays)
+            os.replace(tmp_path, sidecar)
+        except OSError as e:
+            logger.warning("Could not write HPO data cache {}: {}", sidecar, e)
+        return model
+
+    def term_indices(self, hpo_terms: typing.Iterable[str]) -> typing.List[int]:
+        """Return the indices of the known terms of ``hpo_terms``, deduplicated."""
+        index = self.index
+        return list(dict.fromkeys(index[term] for term in hpo_terms if term in index))
+
+    def rank(
+        self,
+        queries: typing.Sequence[typing.Tuple[typing.Sequence[str], typing.Sequence[str]]],
+    ) -> typing.List[typing.Tuple[typing.List[str], np.ndarray]]:
+        """Rank the genes of a batch of queries.
+
+        :param queries: Pairs of HPO terms and Entrez IDs (``"Entrez:NNN"``) of the genes to
+            rank, in the order used for breaking ties.
+        :returns: for each query, the gene IDs sorted by descending score and the scores.
+        """
+        terms = [self.term_indices(hpo_terms) for hpo_terms, _ in queries]
+        gene_ids = [list(dict.fromkeys(ids)) for _, ids in queries]
+        n_terms = np.array([len(t) for t in terms], dtype=np.int64)
+        n_genes = np.array([len(g) for g in gene_ids], dtype=np.int64)
+        if not len(queries) or not n_genes.sum():
+            return [(ids, np.zeros(len(ids))) for ids in gene_ids]
+
+        # The positions of the queries' terms and genes in the model, unknown genes get the
+        # first column and are masked out.
+        flat_terms = np.array([term for t in terms for term in t], dtype=np.int64)
+        flat_gene_ids = np.array(
+            [genes_.parse_entrez_id(gene_id) for ids in gene_ids for gene_id in ids],
+            dtype=np.int64,
+        )
+        gene_cols = np.searchsorted(self.gene_ids, flat_gene_ids)
+        known = gene_cols < len(self.gene_ids)
+        known[known] = self.gene_ids[gene_cols[known]] == flat_gene_ids[known]
+        gene_cols = np.where(known, gene_cols, 0)
+
+        # All pairs of term and gene of each query: pair ``k`` of query ``i`` is the term
+        # ``k // n_genes[i]`` and the gene ``k % n_genes[i]`` of the query.
+        term_starts = np.cumsum(n_terms) - n_terms
+        gene_starts = np.cumsum(n_genes) - n_genes
+        n_pairs = n_terms * n_genes
+        query_of_pair = np.repeat(np.arange(len(queries)), n_pairs)
+        k = np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)
+        slot = gene_starts[query_of_pair] + k % n_genes[query_of_pair]
+        pair_terms = flat_terms[term_starts[query_of_pair] + k // n_genes[query_of_pair]]
+        values = np.zeros(len(slot))
+        if len(slot):
+            # The best match of each pair is the largest information content of the ancestors
+            # of the term whose bit is set for the gene.
+            offsets = self.ancestor_offsets[pair_terms]
+            counts = self.ancestor_offsets[pair_terms + 1] - offsets
+            pair_starts = np.cumsum(counts) - counts
+            within = np.arange(counts.sum()) - np.repeat(pair_starts, counts)
+            ancestors = self.ancestor_indices[np.repeat(offsets, counts) + within]
+            cols = np.repeat(gene_cols[slot], counts)
+            bits = (self.term_genes[ancestors, cols >> 3] >> (7 - (cols & 7))) & 1
+            best = np.maximum.reduceat(self.information_content[ancestors] * bits, pair_starts)
+            values = best * known[slot]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scores = np.bincount(slot, weights=values, minlength=len(flat_gene_ids))
+            scores = np.nan_to_num(scores / np.repeat(n_terms, n_genes))
+
+        # Sort by query, then by descending score, then by the position of the gene.
+        query_of_slot = np.repeat(np.arange(len(queries)), n_genes)
+        order = np.lexsort((np.arange(len(scores)), -scores, query_of_slot))
+        result = []
+        for i, ids in enumerate(gene_ids):
+            positions = order[gene_starts[i] : gene_starts[i] + n_genes[i]] - gene_starts[i]
+            result.append(
+                ([ids[p] for p in positions.tolist()], scores[positions + gene_starts[i]])
+            )
+        return result
@@ -0,0 +1,243 @@
+"""Compact, columnar storage of benchmark results.
+
+The benchmark commands write their results as JSON Lines, one line per case, which makes them
+resumable but large: each line repeats the full ranked list of ``"Entrez:NNN"`` strings.  The
+compact format stores all results of a run in one compressed ``.npz`` file of flat arrays:
+
+- the cases in the arrays of a compiled ``datasets.Dataset``,
+- the ranks as integer array (``0`` for missing),
+- the ranked genes of all results as one flat array of integer Entrez IDs with an offset array
+  marking the start of each result's genes,
+- the timings as a float matrix with one column per phase (``NaN`` where a result has no
+  timing of the phase) and the phase names.
+
+Converting JSON results to the compact format and back is lossless, unless ``keep_top_k`` is
+used to drop the genes ranked below the top ``k`` when only the metrics are needed.  Reading
+only the ranks, e.g., for ``benchmark summarize``, decompresses just the rank array.
+"""
+
+import collections.abc
+import os
+import pathlib
+import typing
+
+import numpy as np
+
+from gene_ranking_shootout import datasets as datasets_
+from gene_ranking_shootout import genes as genes_
+from gene_ranking_shootout import models
+
+#: File name suffix of the compact format.
+SUFFIX = ".npz"
+
+#: Version of the format, bump when changing ``CompactResults.compile()``.
+FORMAT_VERSION = 1
+
+#: The arrays of the results besides those of the cases (``datasets.ARRAYS``).
+ARRAYS = ("version", "ranks", "result_gene_ids", "result_gene_ids_offsets", "timings", "phases")
+
+
+def is_compact(path: typing.Union[str, pathlib.Path]) -> bool:
+    """Return whether ``path`` is a results file in the compact format."""
+    return str(path).endswith(SUFFIX)
+
+
+def truncate(result: models.Result, keep_top_k: int) -> models.Result:
+    """Return ``result`` with only its top ``keep_top_k`` genes, all if ``keep_top_k`` is 0."""
+    if not keep_top_k or len(result.result_entrez_ids) <= keep_top_k:
+        return result
+    return models.Result(
+        case=result.case,
+        rank=result.rank,
+        result_entrez_ids=result.result_entrez_ids[:keep_top_k],
+        timings=result.timings,
+    )
+
+
+class _LazyArrays(collections.abc.Mapping):
+    """The arrays of an ``.npz`` file, each decompressed on first access only."""
+
+    def __init__(self, npz: typing.Any):
+        self._npz = npz
+        self._arrays: typing.Dict[str, np.ndarray] = {}
+
+    def close(self):
+        """Close the file; the arrays read so far stay available."""
+        self._npz.close()
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            self._arrays[name] = self._npz[name]
+        return self._arrays[name]
+
+    def __iter__(self):
+        return iter(self._npz)
+
+    def __len__(self):
+        return len(self._npz)
+
+
+class CompactResults(typing.Sequence[models.Result]):
+    """The results of a run in compact form.
+
+    Supports ``len()``, indexing, and iteration, building ``models.Result`` objects only for
+    the results accessed.  Use the results from ``open()`` as context manager to close the
+    file.
+
+    :param arrays: The arrays from ``ARRAYS`` and ``datasets.ARRAYS``.
+    """
+
+    def __init__(self, arrays: typing.Mapping[str, np.ndarray]):
+        #: The arrays of the results.
+        self.arrays = arrays
+        #: The cases of the results.
+        self.cases = datasets_.Dataset(arrays)  # type: ignore[arg-type]
+
+    def __len__(self):
+        return len(self.cases)
+
+    def __enter__(self) -> "CompactResults":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the file the results were opened from, if any."""
+        if isinstance(self.arrays, _LazyArrays):
+            self.arrays.close()
+
+    @property
+    def ranks(self) -> np.ndarray:
+        """The ranks of the disease genes, ``0`` for missing."""
+        return self.arrays["ranks"]
+
+    @typing.overload
+    def __getitem__(self, index: int) -> models.Result:
+        ...
+
+    @typing.overload
+    def __getitem__(self, index: slice) -> typing.List[models.Result]:
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return self._results(index, index + 1)[0]
+
+    def __iter__(self) -> typing.Iterator[models.Result]:
+        for start in range(0, len(self), datasets_.ITER_BLOCK_SIZE):
+            yield from self._results(start, min(start + datasets_.ITER_BLOCK_SIZE, len(self)))
+
+    def _results(self, start: int, stop: int) -> typing.List[models.Result]:
+        """Return the results from ``start`` to ``stop``."""
+        offsets = self.arrays["result_gene_ids_offsets"][start : stop + 1].tolist()
+        gene_ids = self.arrays["result_gene_ids"][offsets[0] : offsets[-1]].tolist()
+        phases = self.arrays["phases"].tolist()
+        timings = self.arrays["timings"][start:stop].tolist()
+        results = []
+        for i, case in enumerate(self.cases[start:stop]):
+            begin, end = offsets[i] - offsets[0], offsets[i + 1] - offsets[0]
+            row = {phase: value for phase, value in zip(phases, timings[i]) if value == value}
+            results.append(
+                models.Result(
+                    case=case,
+                    rank=int(self.ranks[start + i]),
+                    result_entrez_ids=list(map(genes_.format_entrez_id, gene_ids[begin:end])),
+                    timings=row or None,
+                )
+            )
+        return results
+
+    @classmethod
+    def compile(
+        cls, results: typing.Iterable[models.Result], *, keep_top_k: int = 0
+    ) -> "CompactResults":
+        """Compile ``results`` into the compact form.
+
+        :param keep_top_k: Only keep the top ``keep_top_k`` ranked genes of each result.
+        :raises ValueError: if an HPO term or gene ID cannot be encoded as integer.
+        """
+        cases = []
+        ranks = []
+        gene_ids: typing.List[typing.List[int]] = []
+        timings = []
+        for result in results:
+            result = truncate(result, keep_top_k)
+            cases.append(result.case)
+            ranks.append(result.rank or 0)
+            gene_ids.append(
+                [genes_.parse_entrez_id(gene_id) for gene_id in result.result_entrez_ids]
+            )
+            timings.append(result.timings or {})
+        # In the order first seen, which keeps the order of the timings when converting back.
+        phases = list(dict.fromkeys(phase for row in timings for phase in row))
+        arrays = dict(datasets_.Dataset.compile(cases).arrays)
+        arrays["version"] = np.array(FORMAT_VERSION)
+        arrays["ranks"] = np.array(ranks, dtype=np.int64)
+        arrays["result_gene_ids"], arrays["result_gene_ids_offsets"] = datasets_._encode_lists(
+            gene_ids
+        )
+        arrays["timings"] = np.array(
+            [[row.get(phase, np.nan) for phase in phases] for row in timings], dtype=np.float64
+        ).reshape(len(timings), len(phases))
+        arrays["phases"] = np.array(phases, dtype=str)
+        return cls(arrays)
+
+    def save(self, path: typing.Union[str, pathlib.Path]):
+        """Write the results to the compressed file ``path``.
+
+        The file is written next to ``path`` and then renamed, so readers never see a partially
+        written file.
+        """
+        path = pathlib.Path(path)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "wb") as outputf:
+                np.savez_compressed(
+                    outputf, **{name: self.arrays[name] for name in (*datasets_.ARRAYS, *ARRAYS)}
+                )
+            os.rename(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def open(cls, path: typing.Union[str, pathlib.Path]) -> "CompactResults":
+        """Open the compact results file ``path``; the arrays are read on first access."""
+        arrays = _LazyArrays(np.load(path))
+        try:
+            version = int(arrays["version"])
+        except BaseException:
+            arrays.close()
+            raise
+        if version != FORMAT_VERSION:
+            arrays.close()
+            raise ValueError(f"Unsupported results format version {version} in {path}")
+        return cls(arrays)
+
+
+def convert(
+    path_in: typing.Union[str, pathlib.Path],
+    path_out: typing.Union[str, pathlib.Path],
+    *,
+    keep_top_k: int = 0,
+) -> int:
+    """Convert the results file ``path_in`` to ``path_out``, compact if it ends in ``.npz``.
+
+    :param keep_top_k: Only keep the top ``keep_top_k`` ranked genes of each result.
+    :returns: the number of results.
+    """
+    results = models.iter_results(path_in)
+    if is_compact(path_out):
+        compact = CompactResults.compile(results, keep_top_k=keep_top_k)
+        compact.save(path_out)
+        return len(compact)
+    count = 0
+    with open(path_out, "wt") as outputf:
+        for result in results:
+            models.dump_result_jsonl(truncate(result, keep_top_k), outputf)
+            count += 1
+    return count
@@ -1,112 +1,585 @@
 """Code for running the benchmark."""
 
-from collections import Counter
+import contextlib
 import csv
+import functools
+import io
 import json
-import multiprocessing
+import os
+import pathlib
 import subprocess
 import sys
 import tempfile
+import time
 import typing
 
-import cattrs
+import attrs
 from loguru import logger
 import requests
 import tqdm
 
+from gene_ranking_shootout import cache as cache_
+from gene_ranking_shootout import executor as executor_
+from gene_ranking_shootout import genes as genes_
+from gene_ranking_shootout import metrics as metrics_
 from gene_ranking_shootout import models
+from gene_ranking_shootout import monitor as monitor_
+from gene_ranking_shootout import perf as perf_
+from gene_ranking_shootout import phenix as phenix_
+from gene_ranking_shootout import results as results_
+from gene_ranking_shootout import shards as shards_
+from gene_ranking_shootout import transport as transport_
+from gene_ranking_shootout import workers as workers_
 
+#: Path to the worker shim that is mounted into the containers.
+WORKER_SHIM_PATH = pathlib.Path(__file__).parent / "worker_shim.py"
+#: Mount point of the tool module of the worker shim in the containers.
+WORKER_MODULE_MOUNT = "/worker_tool.py"
 
-class BarPrinter:
-    """Helper for printing bars."""
+#: URL of the public AMELIE API.
+AMELIE_API_URL = "https://amelie.stanford.edu/api/gene_list_api/"
 
-    def __init__(self, *, bars_top_n=10, total_width=40, outf: typing.TextIO = sys.stdout):
-        #: The number of top genes to print bars for.
-        self.bars_top_n = bars_top_n
-        #: The total display width.
-        self.total_width = total_width
-        #: The output file.
-        self.outf = outf
 
-    def print(self, results: typing.List[models.Result]):
-        ranks = [result.rank for result in results]
-        above_bars_top_n = len(
-            [rank for rank in ranks if rank is not None and rank > self.bars_top_n]
-        )
-        missing = len([rank for rank in ranks if rank is None])
-        counter = Counter(ranks)
-        tot_width = self.total_width - 14
-        max_value = len(results)
-
-        def gen_bar(value):
-            if max_value:
-                hash_count = int(tot_width / max_value * value)
-            else:
-                hash_count = 0
-            if value == 0:
-                return ""
-            elif hash_count == 0:
-                return "."
-            else:
-                return "#" * hash_count
-
-        for i in range(1, self.bars_top_n + 1):
-            value = counter.get(i, 0)
-            bar = gen_bar(value)
-            print(f"  {i:3}: {value:>4}  {bar}", file=self.outf)
-        print(file=self.outf)
-        bar = gen_bar(above_bars_top_n)
-        print(f"{self.bars_top_n + 1}-..: {above_bars_top_n:>4}  {bar}", file=self.outf)
-        bar = gen_bar(missing)
-        print(f"mssng: {missing:>4}  {bar}", file=self.outf)
+#: Kept here for backwards compatibility, moved to ``metrics`` so that ``benchmark summarize``
+#: does not have to import the runners.
+BarPrinter = metrics_.BarPrinter
+
+
+def make_session(*, pool_size: int = 1) -> requests.Session:
+    """Create a ``requests.Session`` with a keep-alive pool of ``pool_size`` connections.
+
+    :param pool_size: Maximal number of connections to keep per host; should be at least the
+        number of concurrent requests.
+    :returns: The configured session.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def read_done_case_names(path_results_jsonl: str) -> typing.Set[str]:
+    """Return the names of the cases in a JSON Lines results file for resuming a run.
+
+    A trailing incomplete line, e.g., from a crash while writing, is removed from the file.
+    """
+    done = set()
+    with open(path_results_jsonl, "r+b") as f:
+        offset = 0
+        for line in f:
+            try:
+                done.add(json.loads(line)["case"]["name"])
+            except (json.JSONDecodeError, KeyError, TypeError):
+                if line.lstrip().startswith(b"[") or f.read().strip():
+                    raise ValueError(
+                        f"Cannot resume {path_results_jsonl}, not in JSON Lines format"
+                    )
+                logger.warning("Removing incomplete last line from {}", path_results_jsonl)
+                f.truncate(offset)
+                break
+            offset += len(line)
+    return done
 
 
 class BaseRunner:
     """Base class for the runners."""
 
-    def __init__(self, *, total_width=80, bars_top_n=10, threads=0):
+    #: Whether ``run_ranking_batch()`` runs multiple cases with fewer tool invocations.
+    supports_batches = False
+
+    def __init__(
+        self,
+        *,
+        total_width=80,
+        bars_top_n=10,
+        threads=0,
+        concurrency=0,
+        backend: typing.Optional[str] = None,
+        chunksize=0,
+        ordered=True,
+        batch_size=1,
+        cache: typing.Optional[cache_.RankingCache] = None,
+        label: typing.Optional[str] = None,
+        timeout: float = 60.0,
+        retries: int = 3,
+        deadline: typing.Optional[float] = None,
+        adaptive_concurrency: bool = False,
+        keep_top_k: int = 0,
+        metrics_port: typing.Optional[int] = None,
+        metrics_file: typing.Optional[str] = None,
+        metrics_interval: float = 10.0,
+    ):
+        if batch_size > 1 and not self.supports_batches:
+            raise ValueError(f"{self.__class__.__name__} does not support batches")
         #: The total display width.
         self.total_width = total_width
         #: The number of top genes to print bars for.
         self.bars_top_n = bars_top_n
-        #: The number of threads to use.
+        #: The number of processes to use (implies the ``process`` backend if none is given).
         self.threads = threads
+        #: The number of cases to have in flight at the same time.
+        self.concurrency = concurrency or threads
+        if backend is None:
+            backend = "process" if threads else ("thread" if concurrency else "serial")
+        #: The executor for running the cases.
+        self.executor = executor_.Executor(backend, self.concurrency, chunksize)
+        #: Whether to write the results in the order of the cases rather than as they finish.
+        self.ordered = ordered
+        #: The number of cases to pass to ``run_ranking_batch()`` at once.
+        self.batch_size = batch_size
+        #: HTTP session with keep-alive connection pool shared by all requests of the runner.
+        self.session = make_session(pool_size=self.executor.workers)
+        #: Transport for the HTTP requests with timeouts and retries.
+        self.transport = transport_.Transport(
+            self.session,
+            timeout=timeout,
+            retries=retries,
+            deadline=deadline,
+            limiter=(
+                transport_.AimdLimiter(self.executor.workers) if adaptive_concurrency else None
+            ),
+        )
+        #: Cache of rankings, if any.
+        self.cache = cache
+        #: Name of the method shown with the progress bar, if any.
+        self.label = label
+        #: Only write the top ``keep_top_k`` genes of each result, all for ``0``.
+        self.keep_top_k = keep_top_k
+        #: Live metrics of the cases run, see ``monitor``.
+        self.metrics = monitor_.LiveMetrics(
+            label=label or self.__class__.__name__,
+            cache=cache,
+            transport=self.transport,
+            count_in_flight=self.executor.backend != "process",
+        )
+        #: Serve the metrics on this local port during ``run()``, if any (``0`` for a free one).
+        self.metrics_port = metrics_port
+        #: Write the metrics to this file every ``metrics_interval`` seconds, if any.
+        self.metrics_file = metrics_file
+        #: Seconds between two writes of ``metrics_file``.
+        self.metrics_interval = metrics_interval
+
+    @functools.cached_property
+    def genes(self) -> genes_.GeneTable:
+        """The genes with their symbols and Entrez IDs.
+
+        Only loaded by the runners that map between symbols and Entrez IDs, on first use.
+        Concurrent first uses may load the table twice, which is harmless as it is memory-mapped.
+        """
+        logger.info("Loading gene data ...")
+        genes = genes_.GeneTable.load()
+        logger.info("... done loading gene data")
+        return genes
+
+    def __getstate__(self):
+        # Worker processes memory-map the gene data rather than receiving it pickled.
+        state = dict(self.__dict__)
+        state.pop("genes", None)
+        return state
+
+    def run(
+        self,
+        path_simulated_json: str,
+        path_results_json: str,
+        *,
+        resume: bool = False,
+        shard: typing.Optional[typing.Tuple[int, int]] = None,
+    ):
+        """Run the benchmark.
+
+        The results are appended to ``path_results_json`` in JSON Lines format as soon as each
+        case is done.  If ``path_results_json`` ends in ``.npz``, they are appended to
+        ``<path_results_json>.partial.jsonl`` instead, which is converted to the compact format
+        of ``results.CompactResults`` when all cases are done.
+
+        :param path_simulated_json: Path to the cases to run.
+        :param path_results_json: Path to the results file.
+        :param resume: Keep the results already in ``path_results_json`` and only run the
+            cases that are missing there.
+        :param shard: Only run the cases of shard ``(index, count)``, see
+            ``shards.select_shard()``.
+        """
+        cases = self.load_cases(path_simulated_json)
+        if shard is not None:
+            cases = shards_.select_shard(cases, *shard)
+            logger.info("Running shard {}/{} with {} cases", *shard, len(cases))
 
-        logger.info("Loading data ...")
-        #: The gnomAD counts.
-        self.gnomad_data = models.load_gnomad_counts()
-        #: Mapping from Entrez gene ID to gene symbol.
-        self.entrez_to_symbol = {gene.entrez_id: gene.gene_symbol for gene in self.gnomad_data}
-        #: Mapping from gene symbol to Entrez gene ID.
-        self.symbol_to_entrez = {gene.gene_symbol: gene.entrez_id for gene in self.gnomad_data}
-        logger.info("... done loading data")
-
-    def run(self, path_simulated_json: str, path_results_json: str):
-        """Run the benchmark."""
+        compact = results_.is_compact(path_results_json)
+        path_run = f"{path_results_json}.partial.jsonl" if compact else path_results_json
+
+        logger.info("Running benchmark ...")
+        try:
+            with self.exporting_metrics():
+                self.run_cases(cases, path_run, resume=resume)
+        finally:
+            self.close()
+        logger.info("... done running benchmark")
+        self.log_stats()
+        if compact:
+            logger.info("Writing results in compact format to {}", path_results_json)
+            results_.convert(path_run, path_results_json)
+            os.remove(path_run)
+
+        logger.info("Displaying results overview ...")
+        self.print_bars(models.iter_results(path_results_json))
+        logger.info("All done. Have a nice day!")
+
+    def run_queue(
+        self,
+        path_simulated_json: str,
+        queue_dir: str,
+        path_results_json: str,
+        *,
+        chunk_size: int = 100,
+        requeue_after: typing.Optional[float] = None,
+    ):
+        """Run chunks of the cases claimed from a work queue shared with other workers.
+
+        The worker that finds all chunks done merges their results into ``path_results_json``.
+
+        :param path_simulated_json: Path to the cases to run.
+        :param queue_dir: The work queue directory, created if necessary.
+        :param path_results_json: Path to the merged results file.
+        :param chunk_size: Number of cases per chunk, must be the same for all workers.
+        :param requeue_after: When no chunks are left, requeue the chunks claimed longer than
+            this many seconds ago, e.g., by crashed workers.
+        """
+        cases = self.load_cases(path_simulated_json)
+        queue = shards_.WorkQueue.create(queue_dir, cases, chunk_size=chunk_size)
+
+        logger.info("Running chunks from work queue {} ...", queue_dir)
+        count = 0
+        try:
+            with self.exporting_metrics():
+                while True:
+                    name = queue.claim()
+                    if name is None and requeue_after is not None:
+                        requeued = queue.requeue_stale(requeue_after)
+                        if requeued:
+                            logger.warning("Requeued stale chunks {}", ", ".join(requeued))
+                            continue
+                    if name is None:
+                        break
+                    tmp_path = f"{queue.results_path(name)}.{queue.owner}.tmp"
+                    self.run_cases(queue.chunk_cases(cases, name), tmp_path)
+                    queue.complete(name, tmp_path)
+                    count += 1
+        finally:
+            self.close()
+        logger.info("... done running {} chunks", count)
+        self.log_stats()
+
+        status = queue.status()
+        if not status.complete:
+            logger.info(
+                "{} chunks are still claimed by other workers, the last one merges the results",
+                status.claimed,
+            )
+            return
+        report = shards_.merge_results(
+            queue.result_paths(), path_results_json, cases=cases, allow_missing=True
+        )
+        if report.missing:
+            logger.warning("{} cases have no result", len(report.missing))
+        logger.info("Merged {} results into {}", report.results, path_results_json)
+
+        logger.info("Displaying results overview ...")
+        self.print_bars(models.iter_results(path_results_json))
+        logger.info("All done. Have a nice day!")
+
+    def load_cases(self, path_simulated_json: str) -> typing.List[models.Case]:
+        """Load the cases to run from ``path_simulated_json``."""
         logger.info("Loading cases ...")
         cases = models.load_cases_json(path_simulated_json)
         logger.info("... done loading {} cases", len(cases))
+        return cases
 
-        logger.info("Running benchmark ...")
-        if self.threads:
-            with multiprocessing.Pool(self.threads) as pool:
-                results = [x for x in tqdm.tqdm(pool.imap(self._run, cases), total=len(cases)) if x]
+    def run_cases(
+        self, cases: typing.List[models.Case], path_results_json: str, *, resume: bool = False
+    ):
+        """Run the ranking for ``cases`` and write the results to ``path_results_json``.
+
+        :param cases: The cases to run.
+        :param path_results_json: Path to the results file.
+        :param resume: Keep the results already in ``path_results_json`` and only run the
+            cases that are missing there.
+        """
+        if resume and os.path.exists(path_results_json):
+            done = read_done_case_names(path_results_json)
+            cases = [case for case in cases if case.name not in done]
+            logger.info("Resuming, skipping {} cases that are done already", len(done))
         else:
-            results = []
-            for case in tqdm.tqdm(cases):
-                result = self.run_ranking(case)
+            resume = False
+
+        self.metrics.add_cases(len(cases))
+        with open(path_results_json, "at" if resume else "wt") as outf:
+            for _, result in self._run_cases_cached(cases):
+                self.metrics.record(result)
                 if result is not None:
-                    results.append(result)
-        logger.info("... done running benchmark")
+                    models.dump_result_jsonl(results_.truncate(result, self.keep_top_k), outf)
+                    outf.flush()
 
-        logger.info("Writing results ...")
-        with open(path_results_json, "wt") as outf:
-            json.dump(cattrs.unstructure(results), outf, indent=2)
-        logger.info("... done writing results")
+    @contextlib.contextmanager
+    def exporting_metrics(self) -> typing.Iterator[None]:
+        """Export ``metrics`` within the ``with`` block as configured by ``metrics_port`` and
+        ``metrics_file``.
+        """
+        with contextlib.ExitStack() as stack:
+            if self.metrics_port is not None:
+                server = stack.enter_context(
+                    monitor_.MetricsServer(self.metrics, self.metrics_port).running()
+                )
+                logger.info("Serving live metrics at {}", server.url)
+            if self.metrics_file:
+                stack.enter_context(
+                    monitor_.SnapshotWriter(
+                        self.metrics, self.metrics_file, self.metrics_interval
+                    ).running()
+                )
+                logger.info(
+                    "Writing live metrics to {} every {}s", self.metrics_file, self.metrics_interval
+                )
+            yield
+
+    def log_stats(self):
+        """Log the hit and miss counts of the ranking cache and the HTTP request counts."""
+        label = f" ({self.label})" if self.label else ""
+        if self.cache:
+            stats = self.cache.stats
+            logger.info(
+                "Ranking cache{}: {} hits, {} misses ({:.1%} hit rate)",
+                label,
+                stats.hits,
+                stats.misses,
+                stats.hit_rate,
+            )
+        transport_stats = self.transport.stats
+        if transport_stats.requests:
+            logger.info(
+                "HTTP requests{}: {} requests, {} retries, {} timeouts, {} failed",
+                label,
+                transport_stats.requests,
+                transport_stats.retries,
+                transport_stats.timeouts,
+                transport_stats.failures,
+            )
+
+    def close(self):
+        """Release resources held by the runner, e.g., worker processes."""
+        if self.cache:
+            self.cache.close()
+
+    def cache_identity(self) -> typing.Dict[str, typing.Any]:
+        """Return the parameters that identify the runner's method for the ranking cache.
+
+        Sub classes add all parameters that influence the ranking.
+        """
+        return {"runner": self.__class__.__name__}
 
-        logger.info("Displaying results overview ...")
-        self.print_bars(results)
-        logger.info("All done. Have a nice day!")
+    def query_key(self, case: models.Case) -> typing.Any:
+        """Return the normalized query for ``case``; cases with equal keys have equal rankings.
+
+        The key leaves out which gene is the disease gene and the order of the genes.  Sub
+        classes whose method breaks ties by the order of the genes it is given, which puts the
+        disease gene last, override this.
+        """
+        gene_ids = set(case.candidate_gene_ids or [])
+        gene_ids.add(case.disease_gene_id)
+        return {"hpo_terms": sorted(set(case.hpo_terms)), "gene_ids": sorted(gene_ids)}
+
+    def dedup_key(self, case: models.Case) -> typing.Any:
+        """Return the part of ``case`` that the method actually uses as its input.
+
+        Cases with equal keys are run as one query with ``merge_cases()`` and their results
+        are derived with ``split_result()``.  Sub classes whose method ignores part of the
+        case, e.g., the candidate genes, override this.
+        """
+        return self.query_key(case)
+
+    def merge_cases(self, cases: typing.List[models.Case]) -> models.Case:
+        """Return the case to run for ``cases`` with equal ``dedup_key()``.
+
+        The case has the candidate genes and disease genes of all ``cases``.
+        """
+        first = cases[0]
+        gene_ids = list(first.candidate_gene_ids or [])
+        seen = set(gene_ids) | {first.disease_gene_id}
+        for case in cases[1:]:
+            for gene_id in [*(case.candidate_gene_ids or []), case.disease_gene_id]:
+                if gene_id not in seen:
+                    seen.add(gene_id)
+                    gene_ids.append(gene_id)
+        if len(seen) == len(first.candidate_gene_ids or []) + 1:
+            return first
+        return attrs.evolve(first, candidate_gene_ids=gene_ids)
+
+    def split_result(
+        self, result: models.Result, case: models.Case
+    ) -> typing.Optional[models.Result]:
+        """Derive the result for ``case`` from the ``result`` of its merged case.
+
+        Restricts the ranking to the genes of ``case``, which is correct for all methods that
+        rank the genes independently of the other candidates.
+        """
+        if result.case == case:
+            return result
+        gene_ids = set(case.candidate_gene_ids or [])
+        gene_ids.add(case.disease_gene_id)
+        return self.make_result(
+            case, [gene_id for gene_id in result.result_entrez_ids if gene_id in gene_ids]
+        )
+
+    def invalidate_cache(self):
+        """Remove all cached rankings of this runner."""
+        if self.cache:
+            self.cache.invalidate(cache_.hash_json(self.cache_identity()))
+
+    def _run_cases_cached(
+        self, cases: typing.List[models.Case]
+    ) -> typing.Iterator[typing.Tuple[int, typing.Optional[models.Result]]]:
+        """Run the ranking for all cases, answering from the cache where possible.
+
+        :returns: iterator of pairs of index into ``cases`` and result, in the order of
+            ``cases`` if ``self.ordered``.
+        """
+        if not self.cache:
+            yield from self._run_cases_dedup(cases)
+            return
+        cache = self.cache
+
+        runner_hash = cache_.hash_json(self.cache_identity())
+        keys = [cache.make_key(runner_hash, self.query_key(case)) for case in cases]
+        misses = [i for i, key in enumerate(keys) if not cache.contains(key)]
+        is_miss = set(misses)
+        miss_results = self._run_cases_dedup([cases[i] for i in misses])
+
+        def from_cache(i: int) -> typing.Optional[models.Result]:
+            with perf_.Recorder() as recorder:
+                with perf_.phase("cache"):
+                    ranking = cache.get(keys[i])
+                if ranking is None:  # evicted in the meantime
+                    return self._run(cases[i])
+                result = self.make_result(cases[i], ranking)
+            return recorder.attach(result)
+
+        def store(j: int, result: typing.Optional[models.Result]):
+            i = misses[j]
+            cache.stats.misses += 1
+            if result is not None:
+                cache.put(keys[i], runner_hash, result.result_entrez_ids)
+            return i, result
+
+        if self.ordered:
+            for i in range(len(cases)):
+                if i in is_miss:
+                    yield store(*next(miss_results))
+                else:
+                    yield i, from_cache(i)
+        else:
+            for i in range(len(cases)):
+                if i not in is_miss:
+                    yield i, from_cache(i)
+            for j, result in miss_results:
+                yield store(j, result)
+
+    def _run_cases_dedup(
+        self, cases: typing.List[models.Case]
+    ) -> typing.Iterator[typing.Tuple[int, typing.Optional[models.Result]]]:
+        """Run the ranking for all cases, running cases with equal ``dedup_key()`` only once.
+
+        :returns: iterator of pairs of index into ``cases`` and result, in the order of
+            ``cases`` if ``self.ordered``.
+        """
+        groups: typing.Dict[str, typing.List[int]] = {}
+        for i, case in enumerate(cases):
+            groups.setdefault(cache_.hash_json(self.dedup_key(case)), []).append(i)
+        if len(groups) == len(cases):
+            yield from self._run_cases(cases)
+            return
+        logger.info("Running {} distinct queries for {} cases", len(groups), len(cases))
+        members = list(groups.values())
+        query_results = self._run_cases(
+            [self.merge_cases([cases[i] for i in group]) for group in members]
+        )
+
+        def split(g: int, result: typing.Optional[models.Result]):
+            for i in members[g]:
+                if result is not None:
+                    with perf_.Recorder(result.timings) as recorder, perf_.phase("split"):
+                        split_result = self.split_result(result, cases[i])
+                    yield i, recorder.attach(split_result)
+                elif len(members[g]) > 1:
+                    # The merged case may fail only because of one of its cases.
+                    yield i, self._run(cases[i])
+                else:
+                    yield i, None
+
+        if not self.ordered:
+            for g, result in query_results:
+                yield from split(g, result)
+            return
+        # The groups are ordered by their first case, so the results of the cases can be
+        # yielded in order as soon as the query results come in.
+        pending: typing.Dict[int, typing.Optional[models.Result]] = {}
+        for i in range(len(cases)):
+            while i not in pending:
+                pending.update(split(*next(query_results)))
+            yield i, pending.pop(i)
+
+    def _run_cases(
+        self, cases: typing.List[models.Case]
+    ) -> typing.Iterator[typing.Tuple[int, typing.Optional[models.Result]]]:
+        """Run the ranking for all cases with the configured executor and batching.
+
+        :returns: iterator of pairs of index into ``cases`` and result, in the order of
+            ``cases`` if ``self.ordered``.
+        """
+        if self.batch_size > 1:
+            batches = [
+                cases[i : i + self.batch_size] for i in range(0, len(cases), self.batch_size)
+            ]
+            for b, batch_results in self._map(self._run_batch, batches):
+                for k, result in enumerate(batch_results):
+                    yield b * self.batch_size + k, result
+        elif self.executor.backend == "serial":
+            yield from self._map(self.run_ranking_timed, cases)
+        else:
+            yield from self._map(self._run, cases)
+
+    def _map(
+        self, func: typing.Callable, items: typing.List
+    ) -> typing.Iterator[typing.Tuple[int, typing.Any]]:
+        """Apply ``func`` to ``items`` with the executor, displaying a progress bar.
+
+        :param func: A method of the runner.
+        """
+        if self.executor.backend == "process":
+            mapped = self._map_counting_requests(func, items)
+        else:
+            mapped = self.executor.map(func, items, ordered=self.ordered)
+        yield from tqdm.tqdm(mapped, total=len(items), desc=self.label)
+
+    def _map_counting_requests(
+        self, func: typing.Callable, items: typing.List
+    ) -> typing.Iterator[typing.Tuple[int, typing.Any]]:
+        """Apply ``func`` with the process backend, adding the HTTP request counts of the worker
+        processes to ``self.transport``.
+        """
+        # The method is passed by name so that the runner is only sent once to each worker.
+        counting = functools.partial(self._call_counting_requests, func.__name__)
+        for i, (value, stats) in self.executor.map(counting, items, ordered=self.ordered):
+            self.transport.add_stats(stats)
+            yield i, value
+
+    def _call_counting_requests(
+        self, name: str, item: typing.Any
+    ) -> typing.Tuple[typing.Any, transport_.TransportStats]:
+        """Call method ``name`` with ``item`` and return its value and HTTP request counts."""
+        before = attrs.asdict(self.transport.stats)
+        value = getattr(self, name)(item)
+        after = attrs.asdict(self.transport.stats)
+        return value, transport_.TransportStats(**{key: after[key] - before[key] for key in after})
 
     def _run(self, case: models.Case) -> typing.Optional[models.Result]:
         """Run the ranking for the given case.
@@ -115,11 +588,40 @@ class BaseRunner:
         :returns: result for the case or ``None`` if no result was found.
         """
         try:
-            return self.run_ranking(case)
+            return self.run_ranking_timed(case)
         except Exception:
             logger.exception("Error running case {}", case.name)
             return None
 
+    def _run_batch(
+        self, cases: typing.List[models.Case]
+    ) -> typing.List[typing.Optional[models.Result]]:
+        """Run the ranking for a batch of cases, falling back to single cases on errors."""
+        try:
+            return self.run_ranking_batch(cases)
+        except Exception:
+            logger.exception("Error running batch, falling back to single cases")
+            return [self._run(case) for case in cases]
+
+    def run_ranking_batch(
+        self, cases: typing.List[models.Case]
+    ) -> typing.List[typing.Optional[models.Result]]:
+        """Run the ranking for a batch of cases.
+
+        Runners with ``supports_batches`` override this to process all cases with fewer tool
+        invocations.  An error for one case must only lead to ``None`` for this case.
+
+        :param cases: The cases to run the ranking for.
+        :returns: results in the order of ``cases``, ``None`` where no result was found.
+        """
+        return [self._run(case) for case in cases]
+
+    def run_ranking_timed(self, case: models.Case) -> typing.Optional[models.Result]:
+        """Run ``run_ranking()`` and store the time spent in its phases with the result."""
+        with perf_.Recorder() as recorder:
+            result = self.run_ranking(case)
+        return recorder.attach(result)
+
     def run_ranking(self, case: models.Case) -> typing.Optional[models.Result]:
         """Run the ranking for the given case.
 
@@ -129,6 +631,23 @@ class BaseRunner:
         _ = case
         raise NotImplementedError()
 
+    def make_result(
+        self, case: models.Case, result_entrez_ids: typing.List[str]
+    ) -> typing.Optional[models.Result]:
+        """Create result for ``case`` from the ranked Entrez IDs.
+
+        :returns: the result or ``None`` if the disease gene is not in ``result_entrez_ids``.
+        """
+        # Determine rank for case.
+        try:
+            with perf_.phase("rank"):
+                rank = result_entrez_ids.index(case.disease_gene_id) + 1
+        except ValueError:
+            logger.error("Disease gene {} not found in results?", case.disease_gene_id)
+            return None
+
+        return models.Result(case=case, rank=rank, result_entrez_ids=result_entrez_ids)
+
     def print_bars(self, results: typing.List[models.Result], outf: typing.TextIO = sys.stdout):
         """Print the bars for the results.
 
@@ -146,108 +665,325 @@ class PhenixVarFishRunner(BaseRunner):
         #: Base URL of Varfish server.
         self.base_url = base_url
 
+    def cache_identity(self) -> typing.Dict[str, typing.Any]:
+        return dict(super().cache_identity(), base_url=self.base_url)
+
     def run_ranking(self, case: models.Case) -> typing.Optional[models.Result]:
-        url_terms = ",".join(case.hpo_terms)
-        url_gene_symbols = ",".join(
-            [self.entrez_to_symbol[gene_id] for gene_id in case.candidate_gene_ids or []]
-        )
-        disease_gene_symbol = self.entrez_to_symbol.get(case.disease_gene_id)
+        with perf_.phase("prepare"):
+            url_terms = ",".join(case.hpo_terms)
+            url_gene_symbols = ",".join(self.genes.to_symbols(case.candidate_gene_ids or []))
+            disease_gene_symbol = self.genes.symbol_of(case.disease_gene_id)
         if not disease_gene_symbol:
             logger.warning("Disease gene {} not found in gnomAD data", case.disease_gene_id)
             return None
 
         url = f"{self.base_url}?terms={url_terms}&gene_symbols={url_gene_symbols},{disease_gene_symbol}"
         # logger.debug("Running query: {}", url)
-        result_container = requests.get(url).json()
-        # Translate the gene symbols from the result to entrez ids
-        result_entrez_ids = []
-        for result_entry in result_container["result"]:
-            result_entrez_ids.append(self.symbol_to_entrez[result_entry["gene_symbol"]])
-        # Determine rank for case.
-        try:
-            rank = result_entrez_ids.index(case.disease_gene_id) + 1
-        except ValueError:
-            logger.error("Disease gene {} not found in results?", case.disease_gene_id)
-            return None
+        with perf_.phase("invoke"):
+            response = self.transport.get(url)
+        with perf_.phase("parse"):
+            result_container = response.json()
+            # Translate the gene symbols from the result to entrez ids
+            result_entrez_ids = self.genes.to_entrez_ids(
+                [result_entry["gene_symbol"] for result_entry in result_container["result"]]
+            )
+        return self.make_result(case, result_entrez_ids)
+
+
+class PhenixRunner(BaseRunner):
+    """Run benchmark for phenix in-process with the HPO files in ``hpo_dir``.
+
+    See ``phenix.py`` for the scoring, which is the same as that of ``PhenixVarFishRunner``.
+    Cases are scored in batches of ``batch_size`` with array operations.
+    """
 
-        return models.Result(case=case, rank=rank, result_entrez_ids=result_entrez_ids)
+    supports_batches = True
 
+    def __init__(self, hpo_dir: str, *args, batch_size: int = 1024, **kwargs):
+        super().__init__(*args, batch_size=batch_size, **kwargs)
+        #: Directory with ``hp.obo`` and ``genes_to_phenotype.txt``.
+        self.hpo_dir = hpo_dir
 
-class Phen2GeneRunner(BaseRunner):
-    """Run benchmark for phen2gene.
+    @functools.cached_property
+    def model(self) -> phenix_.PhenixModel:
+        """The ontology and annotations with the precomputed matrices, loaded on first use."""
+        logger.info("Loading HPO data from {} ...", self.hpo_dir)
+        model = phenix_.PhenixModel.load(self.hpo_dir)
+        logger.info(
+            "... done loading {} terms and {} genes", len(model.term_ids), len(model.gene_ids)
+        )
+        return model
+
+    def __getstate__(self):
+        # Worker processes load the HPO data rather than receiving it pickled.
+        state = super().__getstate__()
+        state.pop("model", None)
+        return state
+
+    def cache_identity(self) -> typing.Dict[str, typing.Any]:
+        return dict(super().cache_identity(), hpo_files=phenix_.sidecar_key(self.hpo_dir))
+
+    def query_key(self, case: models.Case) -> typing.Any:
+        # Genes with equal scores keep the order of the query, see ``run_ranking_batch()``.
+        return {
+            "hpo_terms": sorted(set(case.hpo_terms)),
+            "candidate_gene_ids": list(case.candidate_gene_ids or []),
+            "disease_gene_id": case.disease_gene_id,
+        }
 
-    The benchmark will be run using podman, thus podman must be available
-    on the system.
+    def run_ranking(self, case: models.Case) -> typing.Optional[models.Result]:
+        return self.run_ranking_batch([case])[0]
+
+    def run_ranking_batch(
+        self, cases: typing.List[models.Case]
+    ) -> typing.List[typing.Optional[models.Result]]:
+        model = self.model
+        start = time.perf_counter()
+        # The disease gene goes last so that it is ranked below candidates with equal scores.
+        rankings = model.rank(
+            [
+                (case.hpo_terms, [*(case.candidate_gene_ids or []), case.disease_gene_id])
+                for case in cases
+            ]
+        )
+        # The cases share the time of scoring the batch.
+        invoke_time = (time.perf_counter() - start) / max(1, len(cases))
+        results = []
+        for case, (gene_ids, _) in zip(cases, rankings):
+            with perf_.Recorder({"invoke": invoke_time}) as recorder:
+                result = self.make_result(case, gene_ids)
+            recorder.timings["total"] += invoke_time
+            results.append(recorder.attach(result))
+        return results
+
+
+class ContainerRunner(BaseRunner):
+    """Base class for runners that run a command line tool in a container using podman.
+
+    By default, one container is started per case.  When ``workers`` is given, that many
+    long-running containers are started instead and the cases are sent to them with the
+    protocol from ``worker_shim.py``.  With ``batch_size``, one container is started for each
+    batch of cases, again using the worker protocol.  The workers run ``tool_script`` for each
+    case or, if set, load ``worker_module`` once and call it for each case.  The command for
+    starting a worker can be replaced with ``worker_cmd``, e.g., to run the tool without a
+    container.
+
+    Sub classes implement ``build_call()`` and ``parse_output()``.
     """
 
-    def __init__(self, *args, **kwargs):
+    supports_batches = True
+
+    #: The name of the image to use via podman.
+    image_name: str = ""
+    #: Path of the tool's main script within the image.
+    tool_script: str = ""
+    #: Mount point of the working directory in the one-container-per-case mode.
+    mount_point: str = "/data"
+    #: Tool module for the worker shim that keeps the tool loaded, if any.
+    worker_module: typing.Optional[pathlib.Path] = None
+    #: Arguments of the ``load()`` function of ``worker_module``.
+    worker_module_args: typing.List[str] = []
+
+    def __init__(
+        self,
+        *args,
+        workers: int = 0,
+        worker_cmd: typing.Optional[typing.List[str]] = None,
+        **kwargs,
+    ):
+        if workers and not kwargs.get("concurrency"):
+            kwargs["concurrency"] = workers
         super().__init__(*args, **kwargs)
-        #: The name ofthe image to use via podman.
-        self.image_name = "docker.io/genomicslab/phen2gene"
+        #: The number of persistent workers, ``0`` for one container per case.
+        self.workers = workers
+        #: The command for starting a worker.
+        self.worker_cmd = worker_cmd or self.default_worker_cmd()
+        #: The pool of persistent workers, if any.
+        self.worker_pool: typing.Optional[workers_.WorkerPool] = None
+        if workers:
+            self.worker_pool = workers_.WorkerPool(self.worker_cmd, workers)
+
+    def default_worker_cmd(self) -> typing.List[str]:
+        """Return command for starting a worker container."""
+        volumes = ["-v", f"{WORKER_SHIM_PATH}:/worker_shim.py:ro"]
+        tool = [self.tool_script]
+        if self.worker_module:
+            volumes += ["-v", f"{self.worker_module}:{WORKER_MODULE_MOUNT}:ro"]
+            tool = ["--module", WORKER_MODULE_MOUNT, *self.worker_module_args]
+        return [
+            "podman",
+            "run",
+            "-i",
+            "--rm",
+            *volumes,
+            "--entrypoint",
+            "python3",
+            self.image_name,
+            "/worker_shim.py",
+            *tool,
+        ]
+
+    def close(self):
+        super().close()
+        if self.worker_pool:
+            self.worker_pool.close()
+
+    def cache_identity(self) -> typing.Dict[str, typing.Any]:
+        return dict(super().cache_identity(), image_name=self.image_name)
+
+    def build_call(self, case: models.Case) -> workers_.ToolCall:
+        """Return the tool call for running ``case``."""
+        raise NotImplementedError()
+
+    def parse_output(self, case: models.Case, output: str) -> typing.Optional[models.Result]:
+        """Create result for ``case`` from the content of the tool's output file."""
+        raise NotImplementedError()
 
     def run_ranking(self, case: models.Case) -> typing.Optional[models.Result]:
-        # Prepare list of all gene symbols.
-        gene_symbols = [self.entrez_to_symbol[gene_id] for gene_id in case.candidate_gene_ids or []]
-        gene_symbols.append(self.entrez_to_symbol[case.disease_gene_id])
+        with perf_.phase("prepare"):
+            call = self.build_call(case)
+        with perf_.phase("invoke"):
+            output = self.invoke(call)
+        if output is None:
+            return None
+        with perf_.phase("parse"):
+            return self.parse_output(case, output)
+
+    def run_ranking_batch(
+        self, cases: typing.List[models.Case]
+    ) -> typing.List[typing.Optional[models.Result]]:
+        if self.worker_pool:
+            # The workers are running already, nothing to gain from batching.
+            return [self._run(case) for case in cases]
+
+        recorders = [perf_.Recorder() for _ in cases]
+        calls = {}
+        for i, case in enumerate(cases):
+            try:
+                with recorders[i], perf_.phase("prepare"):
+                    calls[i] = self.build_call(case)
+            except Exception:
+                logger.exception("Error preparing case {}", case.name)
+        start = time.perf_counter()
+        responses = workers_.run_batch(
+            self.worker_cmd, [call.to_message() for call in calls.values()]
+        )
+        # The cases share the time of the tool invocation.
+        invoke_time = (time.perf_counter() - start) / max(1, len(calls))
+        for i in calls:
+            recorders[i].add("invoke", invoke_time)
+            recorders[i].add("total", invoke_time)
+
+        results: typing.List[typing.Optional[models.Result]] = [None] * len(cases)
+        for (i, call), response in zip(calls.items(), responses):
+            case = cases[i]
+            if response is None:
+                # The worker crashed before answering, retry the case on its own.
+                logger.warning("No response for case {} in batch, retrying", case.name)
+                response = workers_.run_batch(self.worker_cmd, [call.to_message()])[0]
+                if response is None:
+                    logger.error("Error running {} for case {}", self.__class__.__name__, case.name)
+                    continue
+            output = self._check_response(call, response)
+            if output is not None:
+                try:
+                    with recorders[i], perf_.phase("parse"):
+                        results[i] = self.parse_output(case, output)
+                except Exception:
+                    logger.exception("Error parsing output for case {}", case.name)
+        return [recorder.attach(result) for recorder, result in zip(recorders, results)]
+
+    def _check_response(
+        self, call: workers_.ToolCall, response: typing.Dict[str, typing.Any]
+    ) -> typing.Optional[str]:
+        """Return output file content from worker ``response``, or ``None`` on errors."""
+        if "error" in response:
+            logger.error("Error running {}: {}", self.__class__.__name__, response["error"])
+            return None
+        return response["outputs"][call.output]
 
-        # Resulting entrez ids are collected here.
-        result_entrez_ids = []
+    def invoke(self, call: workers_.ToolCall) -> typing.Optional[str]:
+        """Run the tool once.
+
+        :param call: The arguments, input files, and output file name.
+        :returns: The content of the output file or ``None`` if running the tool failed.
+        """
+        if self.worker_pool:
+            try:
+                response = self.worker_pool.request(call.to_message())
+            except workers_.WorkerError as e:
+                logger.error("Error running {}: {}", self.__class__.__name__, e)
+                return None
+            return self._check_response(call, response)
 
-        # Run phen2gene with temporary directory.
         with tempfile.TemporaryDirectory() as tmpdir:
-            # Write terms and genes to files.
-            with open(f"{tmpdir}/terms.txt", "wt") as outf:
-                outf.write("\n".join(case.hpo_terms))
-            with open(f"{tmpdir}/genes.txt", "wt") as outf:
-                outf.write("\n".join(gene_symbols))
-            # Run phen2gene using podman.
+            for name, content in call.files.items():
+                with open(f"{tmpdir}/{name}", "wt") as outf:
+                    outf.write(content)
             cmd = [
                 "podman",
                 "run",
                 "--rm",
                 "-v",
-                f"{tmpdir}:/code/out",
+                f"{tmpdir}:{self.mount_point}",
                 "-t",
                 self.image_name,
-                "-f",
-                "/code/out/terms.txt",
-                "-l",
-                "/code/out/genes.txt",
-            ]
+            ] + [arg.replace("{workdir}", self.mount_point) for arg in call.args]
             try:
                 subprocess.check_output(cmd, stderr=subprocess.STDOUT)
             except subprocess.CalledProcessError:
-                logger.error("Error running phen2gene")
+                logger.error("Error running {}", self.__class__.__name__)
                 return None
+            with open(f"{tmpdir}/{call.output}", "rt") as inputf:
+                return inputf.read()
 
-            # Read the output file.
-            with open(f"{tmpdir}/output_file.associated_gene_list") as inputf:
-                reader = csv.DictReader(inputf, delimiter="\t")
-                # Translate the gene symbols from the result to entrez ids.
-                for row in reader:
-                    result_entrez_ids.append(self.symbol_to_entrez[row["Gene"]])
 
-        # Determine rank for case.
-        try:
-            rank = result_entrez_ids.index(case.disease_gene_id) + 1
-        except ValueError:
-            logger.error("Disease gene {} not found in results?", case.disease_gene_id)
-            return None
+class Phen2GeneRunner(ContainerRunner):
+    """Run benchmark for phen2gene.
 
-        return models.Result(case=case, rank=rank, result_entrez_ids=result_entrez_ids)
+    The benchmark will be run using podman, thus podman must be available
+    on the system.
+    """
+
+    image_name = "docker.io/genomicslab/phen2gene"
+    tool_script = "/code/phen2gene.py"
+    mount_point = "/code/out"
+
+    def build_call(self, case: models.Case) -> workers_.ToolCall:
+        # Prepare list of all gene symbols.
+        gene_symbols = self.genes.to_symbols(
+            [*(case.candidate_gene_ids or []), case.disease_gene_id]
+        )
+        # Run phen2gene with terms and genes written to files.
+        return workers_.ToolCall(
+            args=["-f", "{workdir}/terms.txt", "-l", "{workdir}/genes.txt", "-out", "{workdir}"],
+            output="output_file.associated_gene_list",
+            files={"terms.txt": "\n".join(case.hpo_terms), "genes.txt": "\n".join(gene_symbols)},
+        )
+
+    def parse_output(self, case: models.Case, output: str) -> typing.Optional[models.Result]:
+        # Translate the gene symbols from the result to entrez ids.
+        reader = csv.DictReader(io.StringIO(output), delimiter="\t")
+        result_entrez_ids = self.genes.to_entrez_ids([row["Gene"] for row in reader])
+
+        return self.make_result(case, result_entrez_ids)
 
 
 class AmelieRunner(BaseRunner):
     """Run benchmark with AMELIE web service."""
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, api_url: str = AMELIE_API_URL, **kwargs):
         super().__init__(*args, **kwargs)
         #: URL of the AMELIE API.
-        self.api_url = "https://amelie.stanford.edu/api/gene_list_api/"
+        self.api_url = api_url
+
+    def cache_identity(self) -> typing.Dict[str, typing.Any]:
+        return dict(super().cache_identity(), api_url=self.api_url)
 
     def run_ranking(self, case: models.Case) -> typing.Optional[models.Result]:
-        gene_symbols = [self.entrez_to_symbol[gene_id] for gene_id in case.candidate_gene_ids or []]
-        disease_gene_symbol = self.entrez_to_symbol.get(case.disease_gene_id)
+        with perf_.phase("prepare"):
+            gene_symbols = self.genes.to_symbols(case.candidate_gene_ids or [])
+            disease_gene_symbol = self.genes.symbol_of(case.disease_gene_id)
         if not disease_gene_symbol:
             logger.warning("Disease gene {} not found in gnomAD data", case.disease_gene_id)
             return None
@@ -260,88 +996,58 @@ class AmelieRunner(BaseRunner):
             "genes": ",".join(gene_symbols),
         }
 
-        response = requests.post(self.api_url, data=payload)
+        with perf_.phase("invoke"):
+            response = self.transport.post(self.api_url, data=payload)
 
         # Translate the gene symbols from the result to entrez ids.
-        result_entrez_ids = []
-        try:
-            response_json = response.json()
-        except json.JSONDecodeError:
-            logger.error("Error decoding JSON response: {}", response.text)
-            return None
-        for row in response_json:
-            result_entrez_ids.append(self.symbol_to_entrez[row[0]])
-
-        # Determine rank for case.
-        try:
-            rank = result_entrez_ids.index(case.disease_gene_id) + 1
-        except ValueError:
-            logger.error("Disease gene {} not found in results?", case.disease_gene_id)
-            return None
+        with perf_.phase("parse"):
+            try:
+                response_json = response.json()
+            except json.JSONDecodeError:
+                logger.error("Error decoding JSON response: {}", response.text)
+                return None
+            result_entrez_ids = self.genes.to_entrez_ids([row[0] for row in response_json])
 
-        return models.Result(case=case, rank=rank, result_entrez_ids=result_entrez_ids)
+        return self.make_result(case, result_entrez_ids)
 
 
-class CadaRunner(BaseRunner):
+class CadaRunner(ContainerRunner):
     """Run benchmark for CADA.
 
     The benchmark will be run using podman, thus podman must be available
     on the system.  Further, the custom built container image is assumed.
-    See the README for details.
+    See the README for details.  The persistent workers load CADA's model once and keep it, see
+    ``cada_worker.py``.
     """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        #: The name ofthe image to use via podman.
-        self.image_name = "localhost/cada-for-shootout:latest"
+    image_name = "localhost/cada-for-shootout:latest"
+    tool_script = "/usr/local/bin/CADA"
+    mount_point = "/data"
+    worker_module = pathlib.Path(__file__).parent / "cada_worker.py"
+    worker_module_args = ["/app"]
 
-    def run_ranking(self, case: models.Case) -> typing.Optional[models.Result]:
-        result_entrez_ids = []
+    def dedup_key(self, case: models.Case) -> typing.Any:
+        # CADA ranks all genes by the HPO terms only, the candidate genes are filtered later.
+        return sorted(set(case.hpo_terms))
 
-        # Run CADA with temporary directory.
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Run phen2gene using podman.
-            cmd = [
-                "podman",
-                "run",
-                "--rm",
-                "-v",
-                f"{tmpdir}:/data",
-                "-t",
-                self.image_name,
-                "--hpo_terms",
-                ",".join(case.hpo_terms),
-                "--out_dir",
-                "/data",
-            ]
-            try:
-                subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-            except subprocess.CalledProcessError:
-                logger.error("Error running CADA")
-                return None
-
-            # Get the gene IDs to consider at all.
-            candidate_gene_ids = set(case.candidate_gene_ids or [])
+    def build_call(self, case: models.Case) -> workers_.ToolCall:
+        return workers_.ToolCall(
+            args=["--hpo_terms", ",".join(case.hpo_terms), "--out_dir", "{workdir}"],
+            output="result.txt",
+        )
 
-            # Read the output file.
-            with open(f"{tmpdir}/result.txt", "rt") as inputf:
-                reader = csv.DictReader(inputf, delimiter="\t")
-                # Translate the gene symbols from the result to entrez ids.
-                for row in reader:
-                    if (
-                        row["gene_id"] == case.disease_gene_id
-                        or row["gene_id"] in candidate_gene_ids
-                    ):
-                        result_entrez_ids.append(row["gene_id"])
+    def parse_output(self, case: models.Case, output: str) -> typing.Optional[models.Result]:
+        # Get the gene IDs to consider at all.
+        candidate_gene_ids = set(case.candidate_gene_ids or [])
 
-        # Determine rank for case.
-        try:
-            rank = result_entrez_ids.index(case.disease_gene_id) + 1
-        except ValueError:
-            logger.error("Disease gene {} not found in results?", case.disease_gene_id)
-            return None
+        # Read the output, limited to the candidate genes.
+        result_entrez_ids = []
+        reader = csv.DictReader(io.StringIO(output), delimiter="\t")
+        for row in reader:
+            if row["gene_id"] == case.disease_gene_id or row["gene_id"] in candidate_gene_ids:
+                result_entrez_ids.append(row["gene_id"])
 
-        return models.Result(case=case, rank=rank, result_entrez_ids=result_entrez_ids)
+        return self.make_result(case, result_entrez_ids)
 
 
 class ExomiserRunner(BaseRunner):
@@ -368,32 +1074,31 @@ class ExomiserRunner(BaseRunner):
         #: Algorithm to use.
         self.algorithm = algorithm
 
-    def run_ranking(self, case: models.Case) -> typing.Optional[models.Result]:
-        gene_ids = [gene_id.replace("Entrez:", "") for gene_id in case.candidate_gene_ids or []]
-        gene_ids.append(case.disease_gene_id.replace("Entrez:", ""))
+    def cache_identity(self) -> typing.Dict[str, typing.Any]:
+        return dict(super().cache_identity(), base_url=self.base_url, algorithm=self.algorithm)
 
-        prio_algorithm, prio_params = self.algo_params[self.algorithm]
-        payload = {
-            "prioritiser": prio_algorithm,
-            "prioritiserParams": ",".join(prio_params),
-            "phenotypes": case.hpo_terms,
-            "genes": gene_ids,
-        }
+    def run_ranking(self, case: models.Case) -> typing.Optional[models.Result]:
+        with perf_.phase("prepare"):
+            gene_ids = [gene_id.replace("Entrez:", "") for gene_id in case.candidate_gene_ids or []]
+            gene_ids.append(case.disease_gene_id.replace("Entrez:", ""))
+
+            prio_algorithm, prio_params = self.algo_params[self.algorithm]
+            payload = {
+                "prioritiser": prio_algorithm,
+                "prioritiserParams": ",".join(prio_params),
+                "phenotypes": case.hpo_terms,
+                "genes": gene_ids,
+            }
 
         url = f"{self.base_url}/exomiser/api/prioritise/"
-        response = requests.post(url, json=payload)
+        with perf_.phase("invoke"):
+            response = self.transport.post(url, json=payload)
 
         # Translate the gene symbols from the result to entrez ids.
-        result_entrez_ids = []
-        for entry in response.json()["results"]:
-            gene_id = entry["geneId"]
-            result_entrez_ids.append(f"Entrez:{gene_id}")
+        with perf_.phase("parse"):
+            result_entrez_ids = []
+            for entry in response.json()["results"]:
+                gene_id = entry["geneId"]
+                result_entrez_ids.append(f"Entrez:{gene_id}")
 
-        # Determine rank for case.
-        try:
-            rank = result_entrez_ids.index(case.disease_gene_id) + 1
-        except ValueError:
-            logger.error("Disease gene {} not found in results?", case.disease_gene_id)
-            return None
-
-        return models.Result(case=case, rank=rank, result_entrez_ids=result_entrez_ids)
+        return self.make_result(case, result_entrez_ids)
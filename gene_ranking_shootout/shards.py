@@ -0,0 +1,279 @@
+"""Running the cases of a benchmark on several hosts.
+
+There are two ways of splitting the cases, both followed by ``merge_results()``:
+
+- A static shard ``i/n`` runs every ``n``-th case starting with the ``i``-th one, with
+  ``1 <= i <= n`` as for ``simulate.parse_shard()``, e.g., as the tasks of a cluster array job.  Each shard writes its own results file and
+  may be resumed like a complete run.
+- A ``WorkQueue`` directory on a shared file system splits the cases into chunks that the
+  workers claim one at a time until none is left, so faster hosts run more chunks.
+
+The state of a chunk of the work queue is the directory its marker file is in: ``todo``,
+``claimed``, or ``done``.  Workers claim a chunk by renaming its marker from ``todo`` to
+``claimed``, which succeeds for exactly one of them, also on NFS.  The results of each chunk
+are written to their own file in ``results``, renamed into place when complete, so a chunk run
+twice, e.g., after its claim was requeued, never duplicates results.  Claims of crashed workers
+are requeued by ``WorkQueue.requeue_stale()``.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import socket
+import time
+import typing
+
+import attrs
+
+from gene_ranking_shootout import models
+from gene_ranking_shootout import results as results_
+
+#: Version of the work queue layout, bump when changing it.
+QUEUE_VERSION = 1
+
+
+def select_shard(
+    cases: typing.Sequence[models.Case], index: int, count: int
+) -> typing.List[models.Case]:
+    """Return the cases of shard ``index`` of ``count``: every ``count``-th case from the
+    ``index``-th one, counting from ``1``.
+
+    Taking every ``count``-th case rather than a contiguous block balances the shards also when
+    the cases are sorted, e.g., by dataset or number of HPO terms.
+    """
+    return list(cases[index - 1 :: count])
+
+
+def cases_digest(cases: typing.Iterable[models.Case]) -> str:
+    """Return a digest of the names of ``cases`` in order, identifying the cases of a queue."""
+    digest = hashlib.sha256()
+    for case in cases:
+        digest.update(case.name.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@attrs.frozen()
+class QueueStatus:
+    """The number of chunks in each state."""
+
+    todo: int
+    claimed: int
+    done: int
+
+    @property
+    def complete(self) -> bool:
+        return not self.todo and not self.claimed
+
+
+class WorkQueue:
+    """A directory of chunks of cases to be claimed by the workers, see module documentation.
+
+    :param path: The queue directory, created by ``create()``.
+    """
+
+    def __init__(self, path: typing.Union[str, pathlib.Path]):
+        #: The queue directory.
+        self.path = pathlib.Path(path)
+        with open(self.path / "queue.json", "rt") as inputf:
+            #: The parameters of the queue as written by ``create()``.
+            self.meta: typing.Dict[str, typing.Any] = json.load(inputf)
+        if self.meta.get("version") != QUEUE_VERSION:
+            raise ValueError(f"Unsupported work queue version {self.meta.get('version')}")
+        #: The name of the host and the ID of the process, recorded with the claims.
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    @classmethod
+    def create(
+        cls,
+        path: typing.Union[str, pathlib.Path],
+        cases: typing.Sequence[models.Case],
+        *,
+        chunk_size: int = 100,
+    ) -> "WorkQueue":
+        """Create the queue for ``cases`` at ``path`` or open the existing one.
+
+        Several workers may do this at the same time: the queue is built next to ``path`` and
+        renamed into place, and the workers that lose the race open the winner's queue.
+
+        :raises ValueError: if the existing queue is for other cases or another chunk size.
+        """
+        path = pathlib.Path(path)
+        digest = cases_digest(cases)
+        if not (path / "queue.json").exists():
+            tmp_path = path.with_name(f"{path.name}.{socket.gethostname()}.{os.getpid()}.tmp")
+            n_chunks = (len(cases) + chunk_size - 1) // chunk_size
+            for state in ("todo", "claimed", "done", "results"):
+                (tmp_path / state).mkdir(parents=True, exist_ok=True)
+            for chunk in range(n_chunks):
+                (tmp_path / "todo" / cls.chunk_name(chunk)).touch()
+            meta = {
+                "version": QUEUE_VERSION,
+                "cases": len(cases),
+                "cases_digest": digest,
+                "chunk_size": chunk_size,
+                "chunks": n_chunks,
+            }
+            with open(tmp_path / "queue.json", "wt") as outputf:
+                json.dump(meta, outputf, indent=2)
+            try:
+                # Replaces an empty directory at ``path`` but fails for a complete queue.
+                os.rename(tmp_path, path)
+            except OSError:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                if not (path / "queue.json").exists():
+                    raise
+        queue = cls(path)
+        if queue.meta["cases_digest"] != digest or queue.meta["chunk_size"] != chunk_size:
+            raise ValueError(
+                f"Work queue {path} was created for other cases or another chunk size "
+                f"({queue.meta['cases']} cases, chunk size {queue.meta['chunk_size']})"
+            )
+        return queue
+
+    @staticmethod
+    def chunk_name(chunk: int) -> str:
+        return f"{chunk:06d}"
+
+    def chunk_cases(
+        self, cases: typing.Sequence[models.Case], name: str
+    ) -> typing.List[models.Case]:
+        """Return the cases of chunk ``name``."""
+        start = int(name) * self.meta["chunk_size"]
+        return list(cases[start : start + self.meta["chunk_size"]])
+
+    def results_path(self, name: str) -> pathlib.Path:
+        """Return the path of the results of chunk ``name``."""
+        return self.path / "results" / f"{name}.jsonl"
+
+    def _names(self, state: str) -> typing.List[str]:
+        return sorted(name for name in os.listdir(self.path / state) if not name.startswith("."))
+
+    def status(self) -> QueueStatus:
+        """Return the number of chunks in each state."""
+        return QueueStatus(*(len(self._names(state)) for state in ("todo", "claimed", "done")))
+
+    def claim(self) -> typing.Optional[str]:
+        """Claim the next chunk to run, return its name or ``None`` if there is none left."""
+        for name in self._names("todo"):
+            claimed = self.path / "claimed" / name
+            try:
+                os.rename(self.path / "todo" / name, claimed)
+            except FileNotFoundError:
+                continue  # claimed by another worker
+            # The modification time of the claim is the start of the chunk.
+            with open(claimed, "wt") as outputf:
+                print(self.owner, file=outputf)
+            return name
+        return None
+
+    def complete(self, name: str, path_results_json: typing.Union[str, pathlib.Path]):
+        """Mark chunk ``name`` as done with the results in ``path_results_json``.
+
+        The results file is moved into the queue, replacing the results of an earlier run of
+        the chunk, if any.
+        """
+        os.replace(path_results_json, self.results_path(name))
+        for state in ("claimed", "todo"):
+            try:
+                os.rename(self.path / state / name, self.path / "done" / name)
+                return
+            except FileNotFoundError:
+                continue  # requeued, or completed by another worker
+
+    def requeue_stale(self, older_than: float) -> typing.List[str]:
+        """Move the claims older than ``older_than`` seconds back to ``todo``.
+
+        :returns: the names of the requeued chunks.
+        """
+        now = time.time()
+        requeued = []
+        for name in self._names("claimed"):
+            claimed = self.path / "claimed" / name
+            try:
+                if now - claimed.stat().st_mtime < older_than:
+                    continue
+                os.rename(claimed, self.path / "todo" / name)
+            except FileNotFoundError:
+                continue  # completed or requeued by another worker
+            requeued.append(name)
+        return requeued
+
+    def result_paths(self) -> typing.List[pathlib.Path]:
+        """Return the paths of the results of the chunks that are done."""
+        return [self.results_path(name) for name in self._names("done")]
+
+
+@attrs.frozen()
+class MergeReport:
+    """Summary of ``merge_results()``."""
+
+    #: The number of results written.
+    results: int
+    #: The names of the cases without result, in the order of the cases.
+    missing: typing.List[str] = attrs.field(factory=list)
+
+
+def merge_results(
+    paths_in: typing.Iterable[typing.Union[str, pathlib.Path]],
+    path_out: typing.Union[str, pathlib.Path],
+    *,
+    cases: typing.Optional[typing.Sequence[models.Case]] = None,
+    allow_missing: bool = False,
+) -> MergeReport:
+    """Merge the partial results files ``paths_in`` into ``path_out``.
+
+    The results are written in the order of ``cases`` if given and in the order of the input
+    files otherwise; in the compact format if ``path_out`` ends in ``.npz``.
+
+    :param cases: The cases of the complete run, for checking that there is a result for each
+        case and no result for other cases.
+    :param allow_missing: Write the results also if there are cases without result, e.g.,
+        because the method failed on them.
+    :raises ValueError: if a case has several results, a result is for a case not in ``cases``,
+        or a case has no result and ``allow_missing`` is not set.
+    """
+    by_name: typing.Dict[str, models.Result] = {}
+    for path in paths_in:
+        for result in models.iter_results(path):
+            if result.case.name in by_name:
+                raise ValueError(f"Duplicate result for case {result.case.name} in {path}")
+            by_name[result.case.name] = result
+
+    missing = []
+    if cases is not None:
+        names = {case.name for case in cases}
+        unknown = [name for name in by_name if name not in names]
+        if unknown:
+            raise ValueError(
+                f"{len(unknown)} results are for cases not in the run, e.g., {unknown[0]}"
+            )
+        missing = [case.name for case in cases if case.name not in by_name]
+        if missing and not allow_missing:
+            raise ValueError(
+                f"{len(missing)} cases have no result, e.g., {missing[0]}; "
+                "resume the run to retry them or allow missing results"
+            )
+        merged = [by_name[case.name] for case in cases if case.name in by_name]
+    else:
+        merged = list(by_name.values())
+
+    path_out = pathlib.Path(path_out)
+    # The process IDs of hosts sharing the directory may collide, the host names do not.
+    tmp_path = path_out.with_name(
+        f"{path_out.name}.{socket.gethostname()}.{os.getpid()}.tmp{path_out.suffix}"
+    )
+    try:
+        if results_.is_compact(path_out):
+            results_.CompactResults.compile(merged).save(tmp_path)
+        else:
+            with open(tmp_path, "wt") as outputf:
+                for result in merged:
+                    models.dump_result_jsonl(result, outputf)
+        os.replace(tmp_path, path_out)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return MergeReport(results=len(merged), missing=missing)
@@ -0,0 +1,309 @@
+"""Simulation of cases with random candidate genes.
+
+The candidate genes of a case are drawn without replacement with probabilities proportional to
+the gnomAD rare variant counts.  Instead of calling ``Generator.choice()`` once per case, which
+is linear in the number of genes, the draws for many cases are done at once: each row draws
+genes *with* replacement in constant time per draw from a precomputed alias table and keeps the
+first occurrence of each gene, drawing more for the rows with too few distinct genes.  Rejecting
+repeated genes this way yields the same distribution as sequential sampling without replacement.
+
+The simulated cases are split into blocks of a fixed size and each block draws from its own
+random stream, derived from the seed with ``numpy.random.SeedSequence``.  The result is thus
+independent of the order in which the blocks are simulated, so the blocks can be distributed
+over processes or, with shards, over machines.
+"""
+
+import json
+import typing
+
+import attrs
+import cattrs
+import numpy as np
+
+from gene_ranking_shootout import executor as executor_
+from gene_ranking_shootout import genes as genes_
+from gene_ranking_shootout import models
+
+#: Number of cases simulated at once with the same random stream.
+BLOCK_SIZE = 10_000
+
+
+class AliasTable:
+    """Walker's alias table for drawing indices with given weights in constant time.
+
+    :param weights: The non-negative weights of the indices; indices with weight zero are
+        never drawn.
+    """
+
+    def __init__(self, weights: np.ndarray):
+        #: The indices with non-zero weight.
+        self.values = np.flatnonzero(weights > 0)
+        n = len(self.values)
+        scaled = (weights[self.values] * (n / weights[self.values].sum())).tolist()
+        #: Probability of keeping the drawn slot rather than using its alias.
+        self.prob = np.ones(n, dtype=np.float64)
+        #: The alias of each slot.
+        self.alias = np.arange(n)
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, g = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = g
+            scaled[g] += scaled[s] - 1.0
+            (small if scaled[g] < 1.0 else large).append(g)
+
+    def __len__(self):
+        return len(self.values)
+
+    def draw(self, rng: np.random.Generator, shape: typing.Tuple[int, ...]) -> np.ndarray:
+        """Draw indices with replacement into an array of ``shape``."""
+        slots = rng.integers(0, len(self.values), size=shape)
+        keep = rng.random(shape) < self.prob[slots]
+        return self.values[np.where(keep, slots, self.alias[slots])]
+
+
+def sample_without_replacement(
+    rng: np.random.Generator, table: AliasTable, rows: int, k: int
+) -> np.ndarray:
+    """Draw ``k`` distinct indices for each of ``rows`` rows.
+
+    :param rng: The random number generator to use.
+    :param table: The alias table to draw from.
+    :param rows: The number of rows to draw.
+    :param k: The number of distinct indices per row, at most ``len(table)``.
+    :returns: Array of shape ``(rows, k)`` with the indices in the order of drawing.
+    """
+    if k > len(table):
+        raise ValueError(f"Cannot draw {k} distinct values from {len(table)}")
+    result = np.empty((rows, k), dtype=np.int64)
+    todo = np.arange(rows)
+    # The draws so far of the rows in ``todo``, extended until each row has ``k`` distinct
+    # indices.  Drawing again from scratch instead would only keep the rows that were lucky
+    # enough to finish early, biasing the result towards the heavy indices.
+    draws = np.empty((rows, 0), dtype=np.int64)
+    more = k + k // 8 + 8
+    while len(todo):
+        draws = np.concatenate([draws, table.draw(rng, (len(todo), more))], axis=1)
+        n_draws = draws.shape[1]
+        # Flag the first occurrence of each index in each row by sorting (index, position)
+        # pairs packed into one integer.
+        packed = np.sort(draws * n_draws + np.arange(n_draws), axis=1)
+        sorted_draws, positions = np.divmod(packed, n_draws)
+        first_sorted = np.ones_like(sorted_draws, dtype=bool)
+        first_sorted[:, 1:] = sorted_draws[:, 1:] != sorted_draws[:, :-1]
+        first = np.empty_like(first_sorted)
+        np.put_along_axis(first, positions, first_sorted, axis=1)
+        # Keep the first ``k`` distinct indices of the rows that have enough of them and draw
+        # more for the others.
+        keep = first & (np.cumsum(first, axis=1) <= k)
+        complete = keep.sum(axis=1) == k
+        result[todo[complete]] = draws[complete][keep[complete]].reshape(-1, k)
+        todo = todo[~complete]
+        draws = draws[~complete]
+        more = n_draws
+    return result
+
+
+def shuffle_rows(rng: np.random.Generator, values: np.ndarray) -> np.ndarray:
+    """Return ``values`` with each row shuffled independently."""
+    # Sort random keys with the column index packed into the lowest bits, which is much faster
+    # than ``argsort()`` on random floats.
+    cols = values.shape[1]
+    assert cols < 2**16
+    keys = (rng.integers(0, 2**40, size=values.shape) << 16) | np.arange(cols)
+    order = np.sort(keys, axis=1) & 0xFFFF
+    return np.take_along_axis(values, order, axis=1)
+
+
+def parse_shard(value: str) -> typing.Tuple[int, int]:
+    """Parse shard specification ``"i/n"`` with ``1 <= i <= n``."""
+    try:
+        index, count = map(int, value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {value!r}, must be of the form i/n")
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {value!r}, must have 1 <= i <= n")
+    return index, count
+
+
+def shard_range(shard: typing.Tuple[int, int], total: int) -> typing.Tuple[int, int]:
+    """Return start and stop of the items of ``shard`` out of ``total`` items."""
+    index, count = shard
+    return (index - 1) * total // count, index * total // count
+
+
+class Simulation:
+    """Simulation of cases by adding random candidate genes to cases from the data sets.
+
+    :param cases: The cases to pick from.
+    :param genes: The genes with their rare variant counts.
+    :param case_count: The number of cases to simulate.
+    :param candidate_genes_count: The number of candidate genes to add to each case.
+    :param seed: The seed for the random number generator.
+    :param replace: Whether to pick cases with replacement, allowing for more simulated cases
+        than ``cases``; the names of the picked cases get a ``#N`` suffix to keep them unique.
+    :param block_size: The number of cases per block with its own random stream.
+    """
+
+    def __init__(
+        self,
+        cases: typing.Sequence[models.Case],
+        genes: genes_.GeneTable,
+        *,
+        case_count: int,
+        candidate_genes_count: int,
+        seed: int,
+        replace: bool = False,
+        block_size: int = BLOCK_SIZE,
+    ):
+        #: The cases to pick from.
+        self.cases = cases
+        #: The number of cases to simulate.
+        self.case_count = case_count
+        #: The number of candidate genes per case.
+        self.candidate_genes_count = candidate_genes_count
+        #: The seed for the random number generator.
+        self.seed = seed
+        #: Whether to pick cases with replacement.
+        self.replace = replace
+        #: The number of cases per block.
+        self.block_size = block_size
+        #: The Entrez IDs of all genes.
+        self.entrez_ids = np.array(
+            [genes_.format_entrez_id(value) for value in genes.entrez_ids.tolist()], dtype=object
+        )
+        #: Index of each case's disease gene in ``entrez_ids``, ``-1`` if missing.
+        self.disease_idx = genes.entrez_index([case.disease_gene_id for case in cases])
+        #: Alias table for drawing genes proportional to their counts.
+        self.table = AliasTable(genes.counts.astype(np.float64))
+        #: Indices of the picked cases when picking without replacement.
+        self.cases_idx: typing.Optional[np.ndarray] = None
+        if not replace:
+            # Picking without replacement needs all picks at once; they come from their own
+            # stream so that every shard computes the same picks.
+            rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(0,)))
+            self.cases_idx = rng.choice(len(cases), size=case_count, replace=False)
+        self._gene_json = [json.dumps(entrez_id) for entrez_id in self.entrez_ids]
+        self._prefixes: typing.Dict[int, str] = {}
+
+    def block_rng(self, block: int) -> np.random.Generator:
+        """Return the random number generator of the ``block``-th block."""
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(1, block)))
+
+    def draw_candidates(self, rng: np.random.Generator, cases_idx: np.ndarray) -> np.ndarray:
+        """Draw the candidate genes for the cases with ``cases_idx``.
+
+        :returns: Array with one row of indices into ``entrez_ids`` for each case.
+        """
+        k = self.candidate_genes_count
+        # Draw one gene more than needed and drop the disease gene if it was drawn, otherwise
+        # drop the last one drawn.
+        drawn = sample_without_replacement(rng, self.table, len(cases_idx), k + 1)
+        is_disease = drawn == self.disease_idx[cases_idx][:, None]
+        drop = np.where(is_disease.any(axis=1), is_disease.argmax(axis=1), k)
+        keep = np.arange(k + 1)[None, :] != drop[:, None]
+        return shuffle_rows(rng, drawn[keep].reshape(-1, k))
+
+    def simulate_block(
+        self, task: typing.Tuple[int, int, int]
+    ) -> typing.Tuple[int, np.ndarray, np.ndarray]:
+        """Simulate the cases of a block.
+
+        :param task: Triple of the block's index and start and stop of the simulated cases to
+            return; the whole block is simulated in any case so that the result does not depend
+            on how the cases are split.
+        :returns: Triple of start, indices of the picked cases, and the candidate genes from
+            ``draw_candidates()``.
+        """
+        block, start, stop = task
+        rng = self.block_rng(block)
+        first = block * self.block_size
+        last = min(first + self.block_size, self.case_count)
+        if self.cases_idx is None:
+            cases_idx = rng.integers(0, len(self.cases), size=last - first)
+        else:
+            cases_idx = self.cases_idx[first:last]
+        candidates = self.draw_candidates(rng, cases_idx)
+        return (
+            start,
+            cases_idx[start - first : stop - first],
+            candidates[start - first : stop - first],
+        )
+
+    def tasks(self, shard: typing.Tuple[int, int]) -> typing.List[typing.Tuple[int, int, int]]:
+        """Return the ``simulate_block()`` tasks for ``shard``."""
+        start, stop = shard_range(shard, self.case_count)
+        return [
+            (block, max(start, block * self.block_size), min(stop, (block + 1) * self.block_size))
+            for block in range(start // self.block_size, -(-stop // self.block_size))
+        ]
+
+    def iter_chunks(
+        self,
+        *,
+        shard: typing.Tuple[int, int] = (1, 1),
+        executor: typing.Optional[executor_.Executor] = None,
+    ) -> typing.Iterator[typing.Tuple[int, np.ndarray, np.ndarray]]:
+        """Simulate the cases block by block.
+
+        :param shard: Pair ``(i, n)`` for only simulating the ``i``-th of ``n`` equal parts.
+        :param executor: The executor to simulate the blocks with, serial by default.
+        :returns: Iterator of the results of ``simulate_block()``.
+        """
+        executor = executor or executor_.Executor()
+        for _, chunk in executor.map(self.simulate_block, self.tasks(shard)):
+            yield chunk
+
+    def case_name(self, case: models.Case, number: int) -> str:
+        """Return name of the simulated case ``number`` picked from ``case``."""
+        return f"{case.name}#{number}" if self.replace else case.name
+
+    def iter_cases(self, **kwargs) -> typing.Iterator[models.Case]:
+        """Simulate the cases; ``kwargs`` are passed to ``iter_chunks()``."""
+        for start, chunk_idx, candidates in self.iter_chunks(**kwargs):
+            for i, (idx, row) in enumerate(zip(chunk_idx, candidates)):
+                case = self.cases[idx]
+                yield attrs.evolve(
+                    case,
+                    name=self.case_name(case, start + i),
+                    candidate_gene_ids=self.entrez_ids[row].tolist(),
+                )
+
+    def render_block(self, task: typing.Tuple[int, int, int]) -> str:
+        """Simulate the cases of a block and return them in JSON Lines format.
+
+        The lines are identical to ``models.dump_cases(..., jsonl=True)`` but rendered from
+        precomputed JSON fragments, avoiding one ``Case`` object per simulated case.
+        """
+        start, chunk_idx, candidates = self.simulate_block(task)
+        lines = []
+        for i, (idx, row) in enumerate(zip(chunk_idx.tolist(), candidates.tolist())):
+            if idx not in self._prefixes:
+                # JSON of the case without name, up to the opening bracket of the genes.
+                record = cattrs.unstructure(attrs.evolve(self.cases[idx], candidate_gene_ids=[]))
+                del record["name"]
+                self._prefixes[idx] = json.dumps(record)[1:-2]
+            name = json.dumps(self.case_name(self.cases[idx], start + i))
+            genes = ", ".join([self._gene_json[gene] for gene in row])
+            lines.append(f'{{"name": {name}, {self._prefixes[idx]}{genes}]}}\n')
+        return "".join(lines)
+
+    def write_jsonl(
+        self,
+        f: typing.TextIO,
+        *,
+        shard: typing.Tuple[int, int] = (1, 1),
+        executor: typing.Optional[executor_.Executor] = None,
+    ):
+        """Simulate the cases and write them to ``f`` in JSON Lines format.
+
+        The output of the shards ``(1, n)`` to ``(n, n)`` concatenated is identical to the output
+        without shards.
+
+        :param shard: Pair ``(i, n)`` for only simulating the ``i``-th of ``n`` equal parts.
+        :param executor: The executor to simulate the blocks with, serial by default.
+        """
+        executor = executor or executor_.Executor()
+        for _, text in executor.map(self.render_block, self.tasks(shard)):
+            f.write(text)
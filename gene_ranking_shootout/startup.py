@@ -0,0 +1,158 @@
+"""Benchmark of the startup time of the command line interface.
+
+Each command is run ``repeat`` times in a fresh interpreter, as the user would run it, and the
+wall time from starting the process to its exit is measured.  Running ``python -c pass`` the
+same way gives the time of the interpreter itself, so the difference is what the package
+costs.  The imports of the CLI module are broken down with ``python -X importtime``.
+
+The CLI module only imports ``click`` and ``loguru``; the modules of the package, and with them
+NumPy, requests, cattrs etc., are imported by the commands that use them.
+"""
+
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+import attrs
+
+#: Code run by the interpreter for running the CLI.
+CLI_CODE = "from gene_ranking_shootout.cli import main; main()"
+
+#: The commands measured by default; ``{results}`` is replaced with a small results file.
+DEFAULT_COMMANDS = (
+    ("--help",),
+    ("dataset", "list"),
+    ("dataset", "head", "cada_cases_test", "--count", "1"),
+    ("benchmark", "summarize", "--bootstrap", "0", "{results}"),
+)
+
+#: Modules whose import the lightweight commands should avoid.
+HEAVY_MODULES = ("numpy", "requests", "tqdm", "cattrs")
+
+
+@attrs.frozen()
+class Measurement:
+    """The wall times of running one command."""
+
+    #: The command line arguments, ``None`` for the bare interpreter.
+    argv: typing.Optional[typing.Tuple[str, ...]]
+    #: The wall time of each run in seconds.
+    seconds: typing.List[float]
+
+    @property
+    def label(self) -> str:
+        return "(python)" if self.argv is None else " ".join(self.argv)
+
+    @property
+    def best(self) -> float:
+        return min(self.seconds)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.seconds)
+
+
+@attrs.frozen()
+class ImportTime:
+    """The import time of one module as reported by ``python -X importtime``."""
+
+    #: The module name.
+    module: str
+    #: Microseconds spent in the module itself.
+    self_us: int
+    #: Microseconds spent in the module and the modules it imports.
+    cumulative_us: int
+    #: The nesting level, ``0`` for the modules imported by the code run.
+    depth: int = 0
+
+
+def write_results_fixture(path: pathlib.Path, count: int = 100):
+    """Write ``count`` results for the first cases of the bundled test dataset to ``path``."""
+    from gene_ranking_shootout import datasets as datasets_
+    from gene_ranking_shootout import models
+
+    cases = datasets_.load_dataset("cada_cases_test")[:count]
+    with open(path, "wt") as outf:
+        for i, case in enumerate(cases):
+            result = models.Result(case=case, rank=i % 12, result_entrez_ids=[case.disease_gene_id])
+            models.dump_result_jsonl(result, outf)
+
+
+def run_command(argv: typing.Optional[typing.Sequence[str]]) -> float:
+    """Run the CLI with ``argv`` (or only the interpreter for ``None``), return the seconds."""
+    cmd = [sys.executable, "-c", "pass" if argv is None else CLI_CODE, *(argv or ())]
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def measure(
+    commands: typing.Sequence[typing.Sequence[str]] = DEFAULT_COMMANDS, *, repeat: int = 5
+) -> typing.Iterator[Measurement]:
+    """Measure the interpreter and then each of ``commands`` ``repeat`` times."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results_path = pathlib.Path(tmp_dir) / "results.jsonl"
+        write_results_fixture(results_path)
+        for argv in [None, *commands]:
+            if argv is not None:
+                argv = tuple(arg.replace("{results}", str(results_path)) for arg in argv)
+            # One run to warm up the file system cache and the compiled bytecode.
+            run_command(argv)
+            yield Measurement(argv=argv, seconds=[run_command(argv) for _ in range(repeat)])
+
+
+def parse_importtime(text: str) -> typing.List[ImportTime]:
+    """Parse the ``python -X importtime`` output ``text``."""
+    result = []
+    for line in text.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        # The module names are indented by two spaces per level after one space.
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        result.append(ImportTime(module.strip(), int(self_us), int(cumulative_us), depth))
+    return result
+
+
+def import_times(module: str = "gene_ranking_shootout.cli") -> typing.List[ImportTime]:
+    """Return the import times of ``module`` and the modules it imports, in import order."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    return parse_importtime(proc.stderr)
+
+
+def print_measurements(measurements: typing.Iterable[Measurement], outf: typing.TextIO):
+    """Print the best and median wall times, and the overhead over the bare interpreter."""
+    print(f"{'command':<56}{'best':>9}{'median':>9}{'package':>9}", file=outf)
+    python = None
+    for m in measurements:
+        if python is None:
+            python = m.best
+        overhead = f"{(m.best - python) * 1e3:>7.0f}ms" if m.argv is not None else ""
+        label = m.label if len(m.label) <= 54 else m.label[:51] + "..."
+        print(
+            f"{label:<56}{m.best * 1e3:>7.0f}ms{m.median * 1e3:>7.0f}ms{overhead:>9}",
+            file=outf,
+        )
+
+
+def print_import_times(times: typing.List[ImportTime], outf: typing.TextIO, *, top: int = 10):
+    """Print the total and the ``top`` slowest imports, nested ones included."""
+    imported = {t.module for t in times}
+    total = sum(t.cumulative_us for t in times if t.depth == 0)
+    heavy = [name for name in HEAVY_MODULES if name in imported]
+    print(f"import time of the CLI: {total / 1e3:.1f}ms", file=outf)
+    print(f"heavy modules imported: {', '.join(heavy) or 'none'}", file=outf)
+    print(f"{'module':<40}{'self':>10}{'cumulative':>12}", file=outf)
+    for t in sorted(times, key=lambda t: -t.cumulative_us)[:top]:
+        print(f"{t.module:<40}{t.self_us / 1e3:>8.1f}ms{t.cumulative_us / 1e3:>10.1f}ms", file=outf)
@@ -0,0 +1,280 @@
+"""Metrics of the results broken down by features of the cases.
+
+The features of all cases are read into arrays once and each stratification assigns an integer
+stratum code to every case.  The metrics of all strata are then computed in one grouped pass
+with ``numpy.bincount()`` instead of filtering the results for each stratum.
+
+The following stratifications exist (see ``STRATIFICATIONS``):
+
+``hpo-terms``
+    The number of HPO terms of the case.
+``candidates``
+    The number of candidate genes of the case.
+``gene-prior``
+    The gnomAD rare variant count of the disease gene, looked up in ``genes.GeneTable``.
+``omim``
+    The OMIM disease of the case, the most frequent ones and ``other``.
+``dataset``
+    The bundled dataset that the case was simulated from, found by the case name.
+"""
+
+import json
+import typing
+
+import attrs
+import numpy as np
+
+from gene_ranking_shootout import datasets as datasets_
+from gene_ranking_shootout import genes as genes_
+from gene_ranking_shootout import metrics as metrics_
+from gene_ranking_shootout import results as results_
+
+#: The available stratifications.
+STRATIFICATIONS = ("hpo-terms", "candidates", "gene-prior", "omim", "dataset")
+
+#: The datasets used for the ``dataset`` stratification by default; they partition the cases.
+DEFAULT_DATASETS = ("cada_clinvar_cases", "cada_collaborator_cases")
+
+
+@attrs.frozen()
+class ResultTable:
+    """The ranks and features of the cases of a results file, one array entry per result."""
+
+    #: The case names.
+    names: typing.List[str]
+    #: The ranks, ``0`` for missing.
+    ranks: np.ndarray
+    #: The number of HPO terms.
+    hpo_term_counts: np.ndarray
+    #: The number of candidate genes, ``-1`` if the case has none.
+    candidate_counts: np.ndarray
+    #: The integer Entrez IDs of the disease genes.
+    disease_gene_ids: np.ndarray
+    #: The OMIM IDs of the diseases.
+    disease_omim_ids: typing.List[str]
+
+    @classmethod
+    def read(cls, path) -> "ResultTable":
+        """Read the results file ``path`` (JSON Lines, JSON, or compact ``.npz``)."""
+        if results_.is_compact(path):
+            with results_.CompactResults.open(path) as compact:
+                return cls.from_arrays(compact.arrays)
+        names = []
+        omim_ids = []
+        columns: typing.List[typing.Tuple[int, int, int, int]] = []
+        with open(path, "rt") as f:
+            first_line = f.readline()
+            f.seek(0)
+            if first_line.lstrip().startswith("["):
+                records = json.load(f)
+            else:
+                records = (json.loads(line) for line in f if line.strip())
+            for record in records:
+                case = record["case"]
+                candidates = case.get("candidate_gene_ids")
+                names.append(case["name"])
+                omim_ids.append(case["disease_omim_id"])
+                columns.append(
+                    (
+                        record.get("rank") or 0,
+                        len(case["hpo_terms"]),
+                        -1 if candidates is None else len(candidates),
+                        genes_.parse_entrez_id(case["disease_gene_id"]),
+                    )
+                )
+        array = np.array(columns, dtype=np.int64).reshape(-1, 4)
+        return cls(
+            names=names,
+            ranks=array[:, 0],
+            hpo_term_counts=array[:, 1],
+            candidate_counts=array[:, 2],
+            disease_gene_ids=array[:, 3],
+            disease_omim_ids=omim_ids,
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays: typing.Mapping[str, np.ndarray]) -> "ResultTable":
+        """Build the table from the arrays of ``results.CompactResults``."""
+        candidate_counts = np.diff(arrays["candidate_gene_ids_offsets"])
+        return cls(
+            names=datasets_.decode_strings(arrays["names"], arrays["names_offsets"]),
+            ranks=np.asarray(arrays["ranks"], dtype=np.int64),
+            hpo_term_counts=np.diff(arrays["hpo_terms_offsets"]),
+            candidate_counts=np.where(arrays["has_candidates"], candidate_counts, -1),
+            disease_gene_ids=np.asarray(arrays["disease_gene_ids"], dtype=np.int64),
+            disease_omim_ids=datasets_.decode_strings(
+                arrays["disease_omim_ids"], arrays["disease_omim_ids_offsets"]
+            ),
+        )
+
+
+def bin_values(
+    values: np.ndarray, edges: typing.Sequence[int], labels: typing.Sequence[str]
+) -> typing.Tuple[typing.List[str], np.ndarray]:
+    """Assign ``values`` to the bins starting at ``edges``.
+
+    :returns: the ``labels`` of the bins and the bin of each value.
+    """
+    return list(labels), np.digitize(values, edges) - 1
+
+
+def by_hpo_terms(table: ResultTable) -> typing.Tuple[typing.List[str], np.ndarray]:
+    """Stratify by the number of HPO terms."""
+    return bin_values(
+        table.hpo_term_counts, [0, 1, 2, 3, 4, 6, 11], ["0", "1", "2", "3", "4-5", "6-10", "11+"]
+    )
+
+
+def by_candidates(table: ResultTable) -> typing.Tuple[typing.List[str], np.ndarray]:
+    """Stratify by the number of candidate genes."""
+    return bin_values(
+        table.candidate_counts,
+        [-1, 0, 1, 10, 100, 1000],
+        ["none", "0", "1-9", "10-99", "100-999", "1000+"],
+    )
+
+
+def by_gene_prior(
+    table: ResultTable, genes: genes_.GeneTable
+) -> typing.Tuple[typing.List[str], np.ndarray]:
+    """Stratify by the gnomAD rare variant count of the disease gene."""
+    index = genes.entrez_index(table.disease_gene_ids)
+    counts = np.where(index >= 0, np.asarray(genes.counts)[index], -1)
+    return bin_values(
+        counts, [-1, 0, 1, 10, 100, 1000], ["unknown", "0", "1-9", "10-99", "100-999", "1000+"]
+    )
+
+
+def by_omim(table: ResultTable, top_n: int = 20) -> typing.Tuple[typing.List[str], np.ndarray]:
+    """Stratify by the OMIM disease, keeping the ``top_n`` most frequent ones."""
+    values, inverse, counts = np.unique(
+        np.array(table.disease_omim_ids, dtype=str), return_inverse=True, return_counts=True
+    )
+    top = np.argsort(-counts, kind="stable")[:top_n]
+    # Map the top diseases to 0..top_n-1 and all others to top_n.
+    code_of_value = np.full(len(values), len(top))
+    code_of_value[top] = np.arange(len(top))
+    labels = [str(value) for value in values[top]]
+    if len(values) > len(top):
+        labels.append("other")
+    return labels, code_of_value[inverse.reshape(-1)]
+
+
+def by_dataset(
+    table: ResultTable, datasets: typing.Sequence[str] = DEFAULT_DATASETS
+) -> typing.Tuple[typing.List[str], np.ndarray]:
+    """Stratify by the first of the bundled ``datasets`` containing the case.
+
+    Cases picked with replacement by ``dataset simulate`` are found by their original name.
+    """
+    dataset_of: typing.Dict[str, int] = {}
+    for i, name in enumerate(datasets):
+        arrays = datasets_.load_dataset(name).arrays
+        for case_name in datasets_.decode_strings(arrays["names"], arrays["names_offsets"]):
+            dataset_of.setdefault(case_name, i)
+    unknown = len(datasets)
+    codes = np.array(
+        [dataset_of.get(name.split("#")[0], unknown) for name in table.names], dtype=np.int64
+    )
+    return [*datasets, "unknown"], codes
+
+
+def grouped_metrics(
+    ranks: np.ndarray, codes: np.ndarray, n_groups: int, *, max_k: int = 10
+) -> typing.List[metrics_.Metrics]:
+    """Compute the metrics of each group of ``ranks`` in one pass.
+
+    :param ranks: The ranks, ``0`` for missing.
+    :param codes: The group of each rank, from ``0`` to ``n_groups - 1``.
+    :param n_groups: The number of groups.
+    :param max_k: The largest ``k`` for the top-k accuracies.
+    """
+    n = np.bincount(codes, minlength=n_groups)
+    found = ranks > 0
+    found_n = np.bincount(codes[found], minlength=n_groups)
+    # Histogram of the ranks up to max_k per group, the cumulative sums are the top-k counts.
+    capped = np.where(found, np.minimum(ranks, max_k + 1), max_k + 1)
+    histogram = np.bincount(codes * (max_k + 2) + capped, minlength=n_groups * (max_k + 2))
+    top_k_counts = np.cumsum(histogram.reshape(n_groups, max_k + 2)[:, 1 : max_k + 1], axis=1)
+    reciprocal = np.where(found, 1.0 / np.maximum(ranks, 1), 0.0)
+    rr_sums = np.bincount(codes, weights=reciprocal, minlength=n_groups)
+    rank_sums = np.bincount(codes[found], weights=ranks[found], minlength=n_groups)
+    # Sorting by group and then rank puts the ranks of each group in order one after another,
+    # so the medians are at fixed offsets from the start of each group.
+    order = np.lexsort((ranks[found], codes[found]))
+    sorted_ranks = ranks[found][order].astype(np.float64)
+    starts = np.concatenate([[0], np.cumsum(found_n)[:-1]])
+    last = max(len(sorted_ranks) - 1, 0)
+    padded = np.append(sorted_ranks, np.nan)
+    lower = np.minimum(starts + (found_n - 1) // 2, last)
+    upper = np.minimum(starts + found_n // 2, last)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        medians = np.where(found_n > 0, (padded[lower] + padded[upper]) / 2.0, np.nan)
+        top_k = top_k_counts / n[:, None]
+        mrr = rr_sums / n
+        mean_rank = rank_sums / found_n
+    return [
+        metrics_.Metrics(
+            count=int(n[g]),
+            missing=int(n[g] - found_n[g]),
+            top_k=top_k[g].tolist(),
+            mrr=float(mrr[g]),
+            mean_rank=float(mean_rank[g]),
+            median_rank=float(medians[g]),
+        )
+        for g in range(n_groups)
+    ]
+
+
+def stratify(
+    table: ResultTable,
+    by: str,
+    *,
+    max_k: int = 10,
+    genes: typing.Optional[genes_.GeneTable] = None,
+    omim_top_n: int = 20,
+    datasets: typing.Sequence[str] = DEFAULT_DATASETS,
+) -> typing.List[typing.Tuple[str, metrics_.Metrics]]:
+    """Return the label and metrics of each non-empty stratum of ``table`` by ``by``.
+
+    :param by: One of ``STRATIFICATIONS``.
+    :param genes: The gene table for ``gene-prior``, loaded if not given.
+    """
+    if by == "hpo-terms":
+        labels, codes = by_hpo_terms(table)
+    elif by == "candidates":
+        labels, codes = by_candidates(table)
+    elif by == "gene-prior":
+        labels, codes = by_gene_prior(table, genes or genes_.GeneTable.load())
+    elif by == "omim":
+        labels, codes = by_omim(table, omim_top_n)
+    elif by == "dataset":
+        labels, codes = by_dataset(table, datasets)
+    else:
+        raise ValueError(f"Unknown stratification {by}, must be one of {STRATIFICATIONS}")
+    grouped = grouped_metrics(table.ranks, codes, len(labels), max_k=max_k)
+    return [(label, metrics) for label, metrics in zip(labels, grouped) if metrics.count]
+
+
+def print_strata(
+    by: str,
+    strata: typing.List[typing.Tuple[str, metrics_.Metrics]],
+    outf: typing.TextIO,
+    *,
+    top_k: typing.Sequence[int] = (1, 5, 10),
+):
+    """Print the metrics of the strata as table to ``outf``."""
+    width = max([len(by), *(len(label) for label, _ in strata)]) + 2
+    top_k = [k for k in top_k if strata and k <= len(strata[0][1].top_k)]
+    header = "".join(f"{f'top_{k}':>8}" for k in top_k)
+    print(
+        f"{by:<{width}}{'cases':>8}{'mssng':>7}{header}{'mrr':>8}{'mean':>8}{'median':>8}",
+        file=outf,
+    )
+    for label, m in strata:
+        top = "".join(f"{m.top_k[k - 1]:>8.1%}" for k in top_k)
+        print(
+            f"{label:<{width}}{m.count:>8}{m.missing:>7}{top}{m.mrr:>8.3f}{m.mean_rank:>8.2f}"
+            f"{m.median_rank:>8.1f}",
+            file=outf,
+        )
@@ -0,0 +1,254 @@
+"""Scaling of a method's latency and accuracy with the number of candidate genes.
+
+For each candidate count of the sweep, cases are simulated from a dataset with that many
+candidate genes and run with the method.  All counts use the same seed, so they pick the same
+cases and only differ in the candidates.  Each count is summarized by the latency percentiles of
+the cases (``perf.PerfSummary``), the throughput, and the top-k accuracies (``metrics.Metrics``;
+cases without result count as misses).
+
+Whether the latency grows linearly or worse with the number of candidates shows in the exponent
+of a power law ``latency ~ candidates^b`` fitted to the median latencies: ``b`` is about ``1``
+for linear growth, ``0`` for a constant latency, and larger than ``1`` for worse.
+
+With ``stand_in``, the web service methods are run against ``overhead.StandInServer`` instead,
+whose latency may grow with the number of genes in the request, so the sweep runs offline; the
+in-process ``phenix`` runner needs no server at all.
+"""
+
+import contextlib
+import json
+import math
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import typing
+
+import attrs
+import cattrs
+from loguru import logger
+import numpy as np
+
+from gene_ranking_shootout import genes as genes_
+from gene_ranking_shootout import matrix
+from gene_ranking_shootout import metrics as metrics_
+from gene_ranking_shootout import models
+from gene_ranking_shootout import overhead as overhead_
+from gene_ranking_shootout import perf as perf_
+from gene_ranking_shootout import runner as runner_
+from gene_ranking_shootout import simulate as simulate_
+
+#: The runners that can be run against the stand-in server.
+STAND_IN_RUNNERS = ("amelie", "exomiser", "varfish-phenix")
+
+#: The top-k accuracies reported.
+TOP_K = (1, 10)
+
+
+@attrs.frozen()
+class SizePoint:
+    """The measurements for one candidate count."""
+
+    #: The number of candidate genes of each case, besides the disease gene.
+    candidates: int
+    #: The number of cases.
+    cases: int
+    #: The number of results written.
+    results: int
+    #: Seconds for running the cases.
+    seconds: float
+    #: The mean latency of the cases in seconds.
+    latency_mean: float
+    #: The latency percentiles from ``perf.PERCENTILES`` in seconds.
+    latency_percentiles: typing.List[float]
+    #: The top-k accuracies for ``k`` in ``TOP_K``.
+    top_k: typing.Dict[str, float]
+    #: The mean reciprocal rank.
+    mrr: float
+
+    @property
+    def throughput(self) -> float:
+        """Cases per second."""
+        return self.cases / self.seconds if self.seconds > 0 else 0.0
+
+
+@attrs.frozen()
+class SweepReport:
+    """The measurements of a sweep."""
+
+    #: The runner, a key of ``matrix.RUNNERS``.
+    runner: str
+    #: The measurements by increasing candidate count.
+    points: typing.List[SizePoint]
+
+    @property
+    def latency_exponent(self) -> typing.Optional[float]:
+        """The exponent of the power law fitted to the median latencies, if there are at least
+        two candidate counts with positive latency.
+        """
+        xs, ys = [], []
+        for point in self.points:
+            if point.candidates > 0 and point.latency_percentiles and point.latency_percentiles[0]:
+                xs.append(math.log(point.candidates))
+                ys.append(math.log(point.latency_percentiles[0]))
+        if len(set(xs)) < 2:
+            return None
+        return float(np.polyfit(xs, ys, 1)[0])
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        """Return JSON-serializable dict of the report."""
+        return {
+            "runner": self.runner,
+            "percentiles": list(perf_.PERCENTILES),
+            "latency_exponent": self.latency_exponent,
+            "points": [
+                dict(cattrs.unstructure(point), throughput=point.throughput)
+                for point in self.points
+            ],
+        }
+
+    def print(self, outf: typing.TextIO):
+        """Print the report as table to ``outf``."""
+        percentiles = "".join(f"{f'p{p}':>10}" for p in perf_.PERCENTILES)
+        top_k = "".join(f"{f'top-{k}':>8}" for k in TOP_K)
+        print(
+            f"{'candidates':>10}{'cases':>7}{'results':>9}{'cases/s':>10}{'mean':>10}"
+            f"{percentiles}{top_k}{'MRR':>7}",
+            file=outf,
+        )
+        for p in self.points:
+            values = "".join(f"{perf_.format_seconds(v):>10}" for v in p.latency_percentiles)
+            accuracies = "".join(f"{p.top_k[f'top_{k}']:>8.1%}" for k in TOP_K)
+            print(
+                f"{p.candidates:>10}{p.cases:>7}{p.results:>9}{p.throughput:>10.1f}"
+                f"{perf_.format_seconds(p.latency_mean):>10}{values}{accuracies}{p.mrr:>7.3f}",
+                file=outf,
+            )
+        exponent = self.latency_exponent
+        if exponent is not None:
+            print(f"\nmedian latency ~ candidates^{exponent:.2f}", file=outf)
+
+
+def simulate_cases(
+    cases: typing.Sequence[models.Case],
+    genes: genes_.GeneTable,
+    *,
+    case_count: int,
+    candidates: int,
+    seed: int,
+) -> typing.List[models.Case]:
+    """Simulate ``case_count`` cases with ``candidates`` candidate genes from ``cases``."""
+    simulation = simulate_.Simulation(
+        cases,
+        genes,
+        case_count=case_count,
+        candidate_genes_count=candidates,
+        seed=seed,
+        replace=case_count > len(cases),
+    )
+    return list(simulation.iter_cases())
+
+
+def run_point(
+    the_runner: runner_.BaseRunner,
+    cases: typing.List[models.Case],
+    candidates: int,
+    *,
+    path_results: typing.Union[str, pathlib.Path],
+) -> SizePoint:
+    """Run ``cases`` with ``the_runner``, writing the results to ``path_results``."""
+    start = time.perf_counter()
+    try:
+        the_runner.run_cases(cases, str(path_results))
+    finally:
+        the_runner.close()
+    seconds = time.perf_counter() - start
+    results = list(models.iter_results(path_results))
+    summary = perf_.PerfSummary.from_results(results, slowest=0)
+    total = summary.phases.get("total")
+    # Cases without result count as misses.
+    ranks = np.concatenate(
+        [metrics_.ranks_of(results), np.zeros(len(cases) - len(results), dtype=np.int64)]
+    )
+    metrics = metrics_.Metrics.from_ranks(ranks, max_k=max(TOP_K), bootstrap=0)
+    return SizePoint(
+        candidates=candidates,
+        cases=len(cases),
+        results=len(results),
+        seconds=seconds,
+        latency_mean=total.mean if total else 0.0,
+        latency_percentiles=list(total.percentiles) if total else [],
+        top_k={f"top_{k}": metrics.top_k[k - 1] for k in TOP_K},
+        mrr=metrics.mrr,
+    )
+
+
+@contextlib.contextmanager
+def stand_in_args(
+    runner: str, *, latency: float, gene_latency: float
+) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    """Run a stand-in server within the ``with`` block, yield the runner's arguments for it.
+
+    :raises ValueError: if ``runner`` is not one of ``STAND_IN_RUNNERS`` or the fixtures of the
+        stand-in are missing, see ``overhead.check_fixtures_dir()``.
+    """
+    if runner not in STAND_IN_RUNNERS:
+        raise ValueError(
+            f"No stand-in for {runner}, only for {', '.join(STAND_IN_RUNNERS)}; "
+            "the phenix runner runs offline without one"
+        )
+    fixtures_dir = overhead_.check_fixtures_dir(overhead_.FIXTURES_DIR)
+    server = overhead_.StandInServer(fixtures_dir, latency, gene_latency)
+    with server.running():
+        args = overhead_.runner_args(overhead_.Scenario(runner, "cada"), server.url, 1)
+        del args["concurrency"]
+        yield args
+
+
+def run_sweep(
+    runner: str,
+    args: typing.Dict[str, typing.Any],
+    cases: typing.Sequence[models.Case],
+    candidate_counts: typing.Iterable[int],
+    *,
+    case_count: int = 100,
+    seed: int = 42,
+    results_dir: typing.Optional[typing.Union[str, pathlib.Path]] = None,
+) -> typing.Iterator[SizePoint]:
+    """Run the sweep, yielding the measurement of each candidate count when done.
+
+    :param runner: The runner, a key of ``matrix.RUNNERS``.
+    :param args: The keyword arguments of the runner class.
+    :param cases: The cases to simulate the cases of the sweep from.
+    :param candidate_counts: The numbers of candidate genes.
+    :param case_count: The number of cases per candidate count.
+    :param seed: The seed for simulating the cases.
+    :param results_dir: Keep the results of each candidate count in this directory as
+        ``candidates-<N>.jsonl``, they are discarded otherwise.
+    """
+    genes = genes_.GeneTable.load()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        out_dir = pathlib.Path(results_dir or tmp_dir)
+        os.makedirs(out_dir, exist_ok=True)
+        for candidates in sorted(candidate_counts):
+            logger.info("Running {} cases with {} candidates ...", case_count, candidates)
+            simulated = simulate_cases(
+                cases, genes, case_count=case_count, candidates=candidates, seed=seed
+            )
+            yield run_point(
+                matrix.RUNNERS[runner](**args),
+                simulated,
+                candidates,
+                path_results=out_dir / f"candidates-{candidates}.jsonl",
+            )
+
+
+def write_report(report: SweepReport, path: typing.Union[str, pathlib.Path, None] = None):
+    """Write ``report`` as JSON to ``path``, or to stdout."""
+    if path is None:
+        json.dump(report.to_json(), sys.stdout, indent=2)
+        print()
+        return
+    with open(path, "wt") as outputf:
+        json.dump(report.to_json(), outputf, indent=2)
@@ -0,0 +1,247 @@
+"""HTTP transport for the runners of remote ranking services.
+
+``Transport`` wraps a ``requests.Session`` and adds
+
+- a timeout for each attempt and an optional deadline for all attempts of a request,
+- bounded retries with jittered exponential backoff on timeouts, connection errors, and
+  transient HTTP status codes,
+- an optional ``AimdLimiter`` that adapts the number of requests in flight: it grows additively
+  while requests succeed fast and shrinks multiplicatively when requests fail or get slow, so a
+  shared server is not overloaded.
+"""
+
+import random
+import threading
+import time
+import typing
+
+import attrs
+import requests
+
+#: HTTP status codes that are retried.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+@attrs.define()
+class TransportStats:
+    """Counts of the requests of a ``Transport``."""
+
+    #: The number of requests, not counting retries.
+    requests: int = 0
+    #: The number of retried attempts.
+    retries: int = 0
+    #: The number of attempts that timed out.
+    timeouts: int = 0
+    #: The number of requests that failed after all retries.
+    failures: int = 0
+    #: The number of requests currently in flight, including their retries.
+    in_flight: int = 0
+
+
+class AimdLimiter:
+    """Limit of the requests in flight with additive increase and multiplicative decrease.
+
+    After each successful request, the limit grows by ``1 / limit``, i.e., by about one per
+    round of requests.  When a request fails or takes longer than ``latency_factor`` times the
+    fastest request seen so far, the limit is multiplied with ``decrease``, at most once per
+    ``cooldown`` seconds.
+
+    :param maximum: The maximal (and initial) number of requests in flight.
+    :param minimum: The minimal number of requests in flight.
+    :param decrease: Factor for decreasing the limit.
+    :param latency_factor: Slowdown over the fastest request that counts as overload.
+    :param cooldown: Minimal number of seconds between two decreases.
+    """
+
+    def __init__(
+        self,
+        maximum: int,
+        *,
+        minimum: int = 1,
+        decrease: float = 0.5,
+        latency_factor: float = 5.0,
+        cooldown: float = 1.0,
+    ):
+        #: The maximal number of requests in flight.
+        self.maximum = maximum
+        #: The minimal number of requests in flight.
+        self.minimum = minimum
+        #: Factor for decreasing the limit.
+        self.decrease = decrease
+        #: Slowdown over the fastest request that counts as overload.
+        self.latency_factor = latency_factor
+        #: Minimal number of seconds between two decreases.
+        self.cooldown = cooldown
+        #: The current limit.
+        self.limit = float(maximum)
+        #: The number of requests in flight.
+        self.in_flight = 0
+        self._min_latency: typing.Optional[float] = None
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    def __getstate__(self):
+        return {
+            key: getattr(self, key)
+            for key in ("maximum", "minimum", "decrease", "latency_factor", "cooldown")
+        }
+
+    def __setstate__(self, state):
+        maximum = state.pop("maximum")
+        self.__init__(maximum, **state)  # type: ignore[misc]
+
+    def acquire(self):
+        """Wait until another request may be sent."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, ok: bool, latency: float):
+        """Record the outcome of a request and allow the next one.
+
+        :param ok: Whether the request succeeded.
+        :param latency: The duration of the request in seconds.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if ok and (self._min_latency is None or latency < self._min_latency):
+                self._min_latency = latency
+            slow = self._min_latency is not None and (
+                latency > self.latency_factor * self._min_latency
+            )
+            now = time.monotonic()
+            if not ok or slow:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class Transport:
+    """Send HTTP requests with timeouts, retries, and optional adaptive concurrency.
+
+    :param session: The session to send the requests with.
+    :param timeout: Timeout in seconds for each attempt.
+    :param deadline: Maximal number of seconds for all attempts of a request, if any.
+    :param retries: The maximal number of retries of a request.
+    :param backoff: Base delay in seconds between retries, doubled for each retry.
+    :param max_backoff: Maximal delay in seconds between retries.
+    :param limiter: Limiter for the requests in flight, if any.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        *,
+        timeout: float = 60.0,
+        deadline: typing.Optional[float] = None,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        limiter: typing.Optional[AimdLimiter] = None,
+    ):
+        #: The session to send the requests with.
+        self.session = session
+        #: Timeout in seconds for each attempt.
+        self.timeout = timeout
+        #: Maximal number of seconds for all attempts of a request.
+        self.deadline = deadline
+        #: The maximal number of retries of a request.
+        self.retries = retries
+        #: Base delay in seconds between retries.
+        self.backoff = backoff
+        #: Maximal delay in seconds between retries.
+        self.max_backoff = max_backoff
+        #: Limiter for the requests in flight.
+        self.limiter = limiter
+        #: Request statistics.
+        self.stats = TransportStats()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add_stats(self, stats: TransportStats):
+        """Add the counts of ``stats``, e.g., of a copy of the transport in a worker process."""
+        self._count(**{key: value for key, value in attrs.asdict(stats).items() if value})
+
+    def _count(self, **counts: int):
+        with self._lock:
+            for key, value in counts.items():
+                setattr(self.stats, key, getattr(self.stats, key) + value)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send request, retrying on timeouts, connection errors, and ``RETRY_STATUSES``.
+
+        :param method: The HTTP method.
+        :param url: The URL.
+        :param kwargs: Further arguments for ``requests.Session.request()``.
+        :returns: the response, which may have a status code not in ``RETRY_STATUSES``
+            signalling an error.
+        :raises requests.RequestException: if the last attempt failed.
+        """
+        self._count(requests=1, in_flight=1)
+        try:
+            return self._request(method, url, **kwargs)
+        finally:
+            self._count(in_flight=-1)
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            error: typing.Optional[requests.RequestException] = None
+            response: typing.Optional[requests.Response] = None
+            if self.limiter:
+                self.limiter.acquire()
+            attempt_start = time.monotonic()
+            timeout = self.timeout
+            if self.deadline is not None:
+                timeout = max(0.001, min(timeout, self.deadline - (attempt_start - start)))
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.Timeout as e:
+                self._count(timeouts=1)
+                error = e
+            except requests.ConnectionError as e:
+                error = e
+            except BaseException:
+                if self.limiter:
+                    self.limiter.release(False, time.monotonic() - attempt_start)
+                raise
+            ok = response is not None and response.status_code not in RETRY_STATUSES
+            if self.limiter:
+                self.limiter.release(ok, time.monotonic() - attempt_start)
+            if response is not None and ok:
+                return response
+
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+            out_of_time = self.deadline is not None and (
+                time.monotonic() + delay - start > self.deadline
+            )
+            if attempt >= self.retries or out_of_time:
+                self._count(failures=1)
+                if response is not None:
+                    response.raise_for_status()
+                assert error is not None
+                raise error
+            self._count(retries=1)
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send GET request with ``request()``."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Send POST request with ``request()``."""
+        return self.request("POST", url, **kwargs)
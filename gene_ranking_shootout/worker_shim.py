@@ -0,0 +1,107 @@
+"""Persistent worker shim for running a command line tool many times in one process.
+
+This file is mounted into the tool containers and must only use the standard library.  It is
+called as ``python3 worker_shim.py TOOL_SCRIPT`` or ``python3 worker_shim.py --module
+TOOL_MODULE [LOAD_ARGS...]`` and then reads one JSON request per line from stdin.  Each request
+looks as follows::
+
+    {"args": ["--out_dir", "{workdir}"], "files": {"terms.txt": "..."}, "outputs": ["result.txt"]}
+
+The shim creates a fresh working directory, writes ``files`` into it, runs the tool with
+``args`` (``{workdir}`` is replaced by the working directory), and answers with one JSON line of
+either ``{"outputs": {"result.txt": "..."}}`` or ``{"error": "..."}``.
+
+``TOOL_SCRIPT`` is run as ``__main__`` for each request.  As with ``python3 TOOL_SCRIPT``, the
+directory of the script comes first in ``sys.path`` while it runs, so it can import its sibling
+modules.  The tool's imports are only paid for once, but state that the script loads at run
+time is loaded again for each request.
+
+``TOOL_MODULE`` avoids that for tools with a large model, e.g., CADA (see ``cada_worker.py``).
+It is run once at startup and defines ``load(*LOAD_ARGS)``, which returns the loaded state, and
+``run(state, args)``, which is called for each request like the tool's main script with
+``args``.
+"""
+
+import json
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import traceback
+
+
+class ScriptTool:
+    """Runs the main script of a tool for each request."""
+
+    def __init__(self, tool_script):
+        self.tool_script = tool_script
+
+    def run(self, args):
+        path = list(sys.path)
+        sys.argv = [self.tool_script] + args
+        sys.path.insert(0, os.path.dirname(os.path.realpath(self.tool_script)))
+        try:
+            runpy.run_path(self.tool_script, run_name="__main__")
+        finally:
+            sys.path[:] = path
+
+
+class ModuleTool:
+    """Loads a tool module once and calls its ``run()`` for each request."""
+
+    def __init__(self, tool_module, load_args):
+        namespace = runpy.run_path(tool_module, run_name="worker_tool")
+        self._run = namespace["run"]
+        self.state = namespace["load"](*load_args)
+
+    def run(self, args):
+        self._run(self.state, args)
+
+
+def handle(tool, request):
+    workdir = tempfile.mkdtemp(prefix="shim-")
+    cwd = os.getcwd()
+    argv = sys.argv
+    try:
+        for name, content in request.get("files", {}).items():
+            with open(os.path.join(workdir, name), "wt") as outputf:
+                outputf.write(content)
+        os.chdir(workdir)
+        try:
+            tool.run([arg.replace("{workdir}", workdir) for arg in request["args"]])
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                return {"error": "tool exited with code {}".format(e.code)}
+        outputs = {}
+        for name in request.get("outputs", []):
+            with open(os.path.join(workdir, name), "rt") as inputf:
+                outputs[name] = inputf.read()
+        return {"outputs": outputs}
+    except Exception:
+        return {"error": traceback.format_exc()}
+    finally:
+        sys.argv = argv
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv):
+    # Keep the original stdout for the protocol and send anything the tool prints to stderr.
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "wt")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    if argv[1] == "--module":
+        tool = ModuleTool(argv[2], argv[3:])
+    else:
+        tool = ScriptTool(argv[1])
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        response = handle(tool, json.loads(line))
+        protocol_out.write(json.dumps(response) + "\n")
+        protocol_out.flush()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,169 @@
+"""Worker processes for running command line tools.
+
+The workers are processes (usually containers) that receive one JSON request per line on stdin
+and answer with one JSON response per line on stdout.  They are either kept running for many
+requests (``WorkerPool``) or started for one batch of requests (``run_batch()``).  See
+``worker_shim.py`` for the program that is run inside the containers.
+"""
+
+import json
+import queue
+import subprocess
+import threading
+import typing
+
+import attrs
+from loguru import logger
+
+
+@attrs.frozen()
+class ToolCall:
+    """One run of a command line tool by the worker shim."""
+
+    #: The arguments to the tool, ``"{workdir}"`` is replaced by the working directory.
+    args: typing.List[str]
+    #: Name of the output file in the working directory.
+    output: str
+    #: Input files to write into the working directory, content by file name.
+    files: typing.Dict[str, str] = attrs.field(factory=dict)
+
+    def to_message(self) -> typing.Dict[str, typing.Any]:
+        """Return the request message for the worker shim."""
+        return {"args": self.args, "files": self.files, "outputs": [self.output]}
+
+
+class WorkerError(Exception):
+    """Raised when a worker process fails to answer a request."""
+
+
+def run_batch(
+    cmd: typing.List[str], messages: typing.List[typing.Dict[str, typing.Any]]
+) -> typing.List[typing.Optional[typing.Dict[str, typing.Any]]]:
+    """Start one worker with ``cmd``, send it all ``messages``, and wait for it to exit.
+
+    :returns: The responses in the order of ``messages``; ``None`` for each message that the
+        worker did not answer, e.g., because it crashed.
+    """
+    stdin = "".join(json.dumps(message) + "\n" for message in messages)
+    proc = subprocess.run(cmd, input=stdin, stdout=subprocess.PIPE, text=True)
+    responses: typing.List[typing.Optional[typing.Dict[str, typing.Any]]] = []
+    for line in proc.stdout.splitlines()[: len(messages)]:
+        try:
+            responses.append(json.loads(line))
+        except json.JSONDecodeError:
+            break
+    if proc.returncode:
+        logger.warning("Worker exited with code {}", proc.returncode)
+    return responses + [None] * (len(messages) - len(responses))
+
+
+class Worker:
+    """A single persistent worker process."""
+
+    def __init__(self, cmd: typing.List[str]):
+        #: The command used for starting the worker.
+        self.cmd = cmd
+        #: The worker process.
+        self.process = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1
+        )
+
+    def request(self, message: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+        """Send ``message`` to the worker and return its response.
+
+        :raises WorkerError: if the worker died or answered with garbage.
+        """
+        assert self.process.stdin is not None and self.process.stdout is not None
+        try:
+            self.process.stdin.write(json.dumps(message) + "\n")
+            self.process.stdin.flush()
+            line = self.process.stdout.readline()
+        except OSError as e:
+            raise WorkerError(f"Could not communicate with worker: {e}") from e
+        if not line:
+            raise WorkerError(f"Worker exited with code {self.process.poll()}")
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError as e:
+            raise WorkerError(f"Invalid response from worker: {line!r}") from e
+
+    def close(self, timeout: float = 10.0):
+        """Close stdin of the worker and wait for it to terminate."""
+        if self.process.stdin:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class WorkerPool:
+    """Pool of ``size`` persistent workers, all started with ``cmd``.
+
+    The workers are started lazily on the first request and requests may be sent from multiple
+    threads at the same time.  Pickling the pool (e.g., for ``multiprocessing``) only transfers
+    the configuration, each process starts its own workers.
+    """
+
+    def __init__(self, cmd: typing.List[str], size: int = 1):
+        #: The command used for starting each worker.
+        self.cmd = list(cmd)
+        #: The number of workers.
+        self.size = size
+        self._lock = threading.Lock()
+        self._workers: typing.List[Worker] = []
+        self._idle: "queue.Queue[Worker]" = queue.Queue()
+
+    def __getstate__(self):
+        return {"cmd": self.cmd, "size": self.size}
+
+    def __setstate__(self, state):
+        self.__init__(state["cmd"], state["size"])  # type: ignore[misc]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _ensure_started(self):
+        with self._lock:
+            if not self._workers:
+                logger.info("Starting {} worker(s): {}", self.size, " ".join(self.cmd))
+                for _ in range(self.size):
+                    worker = Worker(self.cmd)
+                    self._workers.append(worker)
+                    self._idle.put(worker)
+
+    def request(self, message: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+        """Send ``message`` to the next idle worker and return its response.
+
+        A worker that failed is replaced by a fresh one before the error is raised.
+
+        :raises WorkerError: if the worker failed.
+        """
+        self._ensure_started()
+        worker = self._idle.get()
+        try:
+            return worker.request(message)
+        except WorkerError:
+            worker.close(timeout=1.0)
+            with self._lock:
+                self._workers.remove(worker)
+                worker = Worker(self.cmd)
+                self._workers.append(worker)
+            raise
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        """Stop all workers; the pool restarts them on the next request."""
+        with self._lock:
+            for worker in self._workers:
+                worker.close()
+            self._workers = []
+            self._idle = queue.Queue()
@@ -0,0 +1,20 @@
+"""Stand-in for the CADA command line tool that writes the fixture ``result.txt``.
+
+Sleeps for ``$FAKE_TOOL_LATENCY`` seconds first, if set, to mimic the tool's run time.
+"""
+
+import argparse
+import os
+import pathlib
+import shutil
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--hpo_terms", required=True)
+parser.add_argument("--out_dir", required=True)
+args = parser.parse_args()
+
+time.sleep(float(os.environ.get("FAKE_TOOL_LATENCY", "0")))
+if args.hpo_terms == "HP:0000000":
+    raise SystemExit(1)
+shutil.copy(pathlib.Path(__file__).parent / "result.txt", pathlib.Path(args.out_dir) / "result.txt")
@@ -0,0 +1,32 @@
+"""Stand-in for the CADA tool module ``cada_worker.py`` that writes the fixture ``result.txt``.
+
+``load()`` appends a line to ``$FAKE_TOOL_LOADS``, if set, so that tests can count the model
+loads.  ``run()`` sleeps for ``$FAKE_TOOL_LATENCY`` seconds first, if set, to mimic the ranking.
+"""
+
+import argparse
+import os
+import pathlib
+import shutil
+import time
+
+RESULT_PATH = pathlib.Path(__file__).parent / "result.txt"
+
+
+def load(cada_dir="/app"):
+    if os.environ.get("FAKE_TOOL_LOADS"):
+        with open(os.environ["FAKE_TOOL_LOADS"], "at") as outputf:
+            print(os.getpid(), cada_dir, file=outputf)
+    return RESULT_PATH
+
+
+def run(state, args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hpo_terms", required=True)
+    parser.add_argument("--out_dir", required=True)
+    parsed = parser.parse_args(args)
+
+    time.sleep(float(os.environ.get("FAKE_TOOL_LATENCY", "0")))
+    if parsed.hpo_terms == "HP:0000000":
+        raise SystemExit(1)
+    shutil.copy(state, pathlib.Path(parsed.out_dir) / "result.txt")
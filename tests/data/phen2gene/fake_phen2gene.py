@@ -0,0 +1,26 @@
+"""Stand-in for Phen2Gene that writes the rows of the fixture output for the given genes.
+
+Sleeps for ``$FAKE_TOOL_LATENCY`` seconds first, if set, to mimic the tool's run time.
+"""
+
+import argparse
+import os
+import pathlib
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-f", required=True)
+parser.add_argument("-l", required=True)
+parser.add_argument("-out", required=True)
+args = parser.parse_args()
+
+time.sleep(float(os.environ.get("FAKE_TOOL_LATENCY", "0")))
+with open(args.l, "rt") as inputf:
+    genes = set(inputf.read().split())
+with open(pathlib.Path(__file__).parent / "output_file.associated_gene_list", "rt") as inputf:
+    header, *rows = inputf.read().splitlines()
+with open(pathlib.Path(args.out) / "output_file.associated_gene_list", "wt") as outputf:
+    print(header, file=outputf)
+    for row in rows:
+        if row.split("\t")[1] in genes:
+            print(row, file=outputf)
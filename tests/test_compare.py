@@ -0,0 +1,104 @@
+import io
+import json
+import math
+
+import numpy as np
+import pytest
+
+from gene_ranking_shootout import compare, models
+
+
+def write_results(path, ranks):
+    with open(path, "wt") as outf:
+        for name, rank in ranks.items():
+            case = models.Case(
+                name=name, disease_omim_id="unknown", disease_gene_id="Entrez:1", hpo_terms=[]
+            )
+            models.dump_result_jsonl(
+                models.Result(case=case, rank=rank, result_entrez_ids=["Entrez:1"]), outf
+            )
+
+
+def test_read_rank_matrix(tmp_path):
+    write_results(tmp_path / "result-a.jsonl", {"P1": 1, "P2": 3, "P3": 2})
+    write_results(tmp_path / "result-b.jsonl", {"P3": 1, "P4": 5, "P1": 2})
+    names, ranks = compare.read_rank_matrix(
+        [tmp_path / "result-a.jsonl", tmp_path / "result-b.jsonl"]
+    )
+    assert names == ["P1", "P2", "P3", "P4"]
+    assert ranks.tolist() == [[1, 2], [3, 0], [2, 1], [0, 5]]
+
+    comparison = compare.Comparison.from_files(
+        [tmp_path / "result-a.jsonl", tmp_path / "result-b.jsonl"], bootstrap=100
+    )
+    assert comparison.methods == ["a", "b"]
+    assert [m.missing for m in comparison.metrics] == [1, 1]
+    (pair,) = comparison.pairs
+    # Missing ranks count as rank 6.
+    assert (pair.wins_a, pair.wins_b, pair.ties) == (2, 2, 0)
+    assert pair.mean_rank_diff == pytest.approx((-1 - 3 + 1 + 1) / 4)
+    assert pair.mean_rank_diff_ci[0] <= pair.mean_rank_diff <= pair.mean_rank_diff_ci[1]
+    assert json.dumps(comparison.to_json())
+    outf = io.StringIO()
+    comparison.write_tsv(outf)
+    assert outf.getvalue().splitlines()[1].startswith("a\t4\t1\t")
+
+
+def test_paired_tests():
+    rng = np.random.default_rng(0)
+    better = rng.integers(1, 5, size=500)
+    worse = better + rng.integers(0, 3, size=500)
+    diffs = np.column_stack([better - worse, rng.integers(-3, 4, size=500), np.zeros(500)])
+    sign_p = compare.sign_test(diffs)
+    wilcoxon_p = compare.wilcoxon_test(diffs)
+    assert sign_p[0] < 1e-10 and wilcoxon_p[0] < 1e-10
+    assert sign_p[1] > 0.01 and wilcoxon_p[1] > 0.01
+    assert sign_p[2] == wilcoxon_p[2] == 1.0
+
+    # W+ = 30.5 with n = 8 and two pairs of ties: z = (30.5 - 18 - 0.5) / sqrt(51 - 0.25).
+    d = np.array([[1.0], [2.0], [-3.0], [4.0], [5.0], [5.0], [-1.0], [6.0]])
+    assert compare.wilcoxon_test(d)[0] == pytest.approx(0.0921, abs=1e-4)
+
+
+def naive_wilcoxon_p(d):
+    """The Wilcoxon p-value for one column, ranking the differences one by one."""
+    d = [x for x in d if x != 0]
+    n = len(d)
+    if not n:
+        return 1.0
+    absolute = sorted(abs(x) for x in d)
+    rank = {v: (absolute.index(v) + 1 + n - absolute[::-1].index(v)) / 2 for v in absolute}
+    w_plus = sum(rank[abs(x)] for x in d if x > 0)
+    counts = [absolute.count(v) for v in set(absolute)]
+    var = n * (n + 1) * (2 * n + 1) / 24 - sum(t**3 - t for t in counts) / 48
+    if var <= 0:
+        return 1.0
+    z = max(abs(w_plus - n * (n + 1) / 4) - 0.5, 0) / math.sqrt(var)
+    return math.erfc(z / math.sqrt(2))
+
+
+def test_wilcoxon_test_matches_naive():
+    rng = np.random.default_rng(1)
+    diffs = rng.integers(-4, 5, size=(60, 30)).astype(np.float64)
+    diffs[:, 0] = 0.0
+    diffs[:, 1] = 2.0
+    expected = [naive_wilcoxon_p(diffs[:, j].tolist()) for j in range(diffs.shape[1])]
+    assert compare.wilcoxon_test(diffs).tolist() == pytest.approx(expected)
+    assert compare.wilcoxon_test(np.zeros((0, 3))).tolist() == [1.0, 1.0, 1.0]
+
+
+def test_method_names(tmp_path):
+    paths = [
+        tmp_path / "a" / "results.jsonl",
+        tmp_path / "b" / "results.jsonl",
+        tmp_path / "b" / "results.npz",
+        tmp_path / "result-amelie.jsonl",
+    ]
+    assert compare.method_names(paths) == [
+        "a/results.jsonl",
+        "b/results.jsonl",
+        "results.npz",
+        "amelie",
+    ]
+    with pytest.raises(ValueError, match="more than once"):
+        compare.method_names([paths[0], paths[0]])
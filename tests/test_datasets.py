@@ -0,0 +1,76 @@
+import json
+
+import attrs
+import cattrs
+import pytest
+
+from gene_ranking_shootout import datasets, models
+
+
+def test_dataset_round_trip(tmp_path):
+    cases = models.load_cases_json(datasets.DATA_DIR / "cada_cases_test.json")
+    cases[0] = models.Case(
+        name="Patient:ünïcode",
+        disease_omim_id="OMIM:123456",
+        disease_gene_id="Entrez:1",
+        hpo_terms=[],
+        candidate_gene_ids=["Entrez:2", "Entrez:3"],
+    )
+    datasets.Dataset.compile(cases).save(tmp_path / "dataset")
+    dataset = datasets.Dataset.open(tmp_path / "dataset")
+    assert len(dataset) == len(cases)
+    assert list(dataset) == cases
+    assert dataset[5] == cases[5]
+    assert dataset[-1] == cases[-1]
+    assert list(dataset[10:20:3]) == cases[10:20:3]
+    assert list(dataset[10:20][2:4]) == cases[12:14]
+
+    dataset[100:110].save(tmp_path / "view")
+    assert list(datasets.Dataset.open(tmp_path / "view")) == cases[100:110]
+
+
+def test_write_dataset_chunks(tmp_path):
+    cases = models.load_cases_json(datasets.DATA_DIR / "cada_cases_test.json")[:100]
+    cases[3] = attrs.evolve(cases[3], candidate_gene_ids=["Entrez:2", "Entrez:3"])
+    assert datasets.write_dataset(cases, tmp_path / "dataset", chunk_size=7) == 100
+    dataset = datasets.Dataset.open(tmp_path / "dataset")
+    assert list(dataset) == cases
+    expected = datasets.Dataset.compile(cases).arrays
+    for name in datasets.ARRAYS:
+        assert dataset.arrays[name].dtype == expected[name].dtype
+        assert dataset.arrays[name].tolist() == expected[name].tolist()
+
+    assert datasets.write_dataset([], tmp_path / "empty") == 0
+    assert len(datasets.Dataset.open(tmp_path / "empty")) == 0
+
+    with pytest.raises(ValueError):
+        datasets.write_dataset(
+            [cases[0], attrs.evolve(cases[1], hpo_terms=["HPO:1"])], tmp_path / "invalid"
+        )
+    # The partially written dataset is removed.
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["dataset", "empty"]
+
+
+def test_dataset_load_json(tmp_path):
+    path = tmp_path / "cases.jsonl"
+    cases = models.load_cases_json(datasets.DATA_DIR / "cada_cases_test.json")[:10]
+    with open(path, "wt") as f:
+        models.dump_cases(cases, f, jsonl=True)
+    cache_dir = tmp_path / "cache"
+    assert list(datasets.Dataset.load(path, cache_dir=cache_dir)) == cases
+    assert len(list(cache_dir.iterdir())) == 1
+    assert list(datasets.Dataset.load(path, cache_dir=cache_dir)[:3]) == cases[:3]
+
+
+def test_dataset_compile_invalid():
+    case = models.Case(
+        name="x", disease_omim_id="unknown", disease_gene_id="Entrez:1", hpo_terms=["HP:12"]
+    )
+    with pytest.raises(ValueError):
+        datasets.Dataset.compile([case])
+
+
+def test_load_dataset():
+    dataset = datasets.load_dataset("cada_cases_test")
+    with open(datasets.DATA_DIR / "cada_cases_test.json") as f:
+        assert [cattrs.unstructure(case) for case in dataset] == json.load(f)
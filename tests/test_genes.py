@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from gene_ranking_shootout import genes
+
+
+def test_gene_table_load(tmp_path):
+    parsed = genes.GeneTable.from_tsv(genes.GNOMAD_COUNTS_PATH)
+    loaded = genes.GeneTable.load(cache_dir=tmp_path)
+    assert len(list(tmp_path.glob("gnomad_counts-*.npy"))) == 1
+    reloaded = genes.GeneTable.load(cache_dir=tmp_path)
+    assert isinstance(reloaded.records, np.memmap)
+    for table in (loaded, reloaded):
+        assert (table.records == parsed.records).all()
+
+
+def test_gene_table_lookups():
+    table = genes.GeneTable.from_tsv(genes.GNOMAD_COUNTS_PATH)
+    assert table.to_symbols(["Entrez:1", "Entrez:503538"]) == ["A1BG", "A1BG-AS1"]
+    assert table.to_entrez_ids(["A1BG-AS1", "A1BG"]) == ["Entrez:503538", "Entrez:1"]
+    assert table.symbol_of("Entrez:1") == "A1BG"
+    assert table.symbol_of("Entrez:999999999") is None
+    assert table.entrez_index(["Entrez:1", 0, "Entrez:503538"]).tolist() == [0, -1, 1]
+    assert table.symbol_index(["ZZZZZZ", "A1BG"]).tolist() == [-1, 0]
+    assert table.to_symbols([]) == []
+    with pytest.raises(KeyError):
+        table.to_entrez_ids(["A1BG", "NOT-A-GENE"])
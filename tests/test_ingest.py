@@ -0,0 +1,72 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from gene_ranking_shootout import datasets, ingest, models
+
+TSV = (
+    "Patient:1\tOMIM:607208\tEntrez:6323\tHP:0002069,HP:0001263\n"
+    "Patient:2\tEntrez:6910\tHP:0001627\n"
+    "header\tline\n"
+    "Patient:3\tOMIM:1\tEntrez:1\tHP:1\n"
+    "Patient:4\tOMIM:1\n"
+    "Patient:5\tOMIM:154700\tEntrez:2200\tHP:0001166, HP:0001519\n"
+)
+
+EXPECTED = [
+    models.Case(
+        name="Patient:1",
+        disease_omim_id="OMIM:607208",
+        disease_gene_id="Entrez:6323",
+        hpo_terms=["HP:0002069", "HP:0001263"],
+    ),
+    models.Case(
+        name="Patient:2",
+        disease_omim_id="unknown",
+        disease_gene_id="Entrez:6910",
+        hpo_terms=["HP:0001627"],
+    ),
+    models.Case(
+        name="Patient:5",
+        disease_omim_id="OMIM:154700",
+        disease_gene_id="Entrez:2200",
+        hpo_terms=["HP:0001166", "HP:0001519"],
+    ),
+]
+
+
+@pytest.mark.parametrize("format_", ingest.FORMATS)
+def test_convert_tsv(tmp_path, format_):
+    path_in = tmp_path / "cases.tsv.gz"
+    with gzip.open(path_in, "wt") as f:
+        f.write(TSV)
+    path_out = tmp_path / f"cases.{format_}"
+    stats = ingest.convert_tsv(str(path_in), str(path_out), format_=format_, chunk_size=2)
+    assert (stats.rows, stats.cases, stats.skipped) == (6, 3, 3)
+    assert stats.rows_per_second > 0
+    if format_ == "dataset":
+        assert list(datasets.Dataset.open(path_out)) == EXPECTED
+    else:
+        assert models.load_cases_json(path_out) == EXPECTED
+    if format_ == "json":
+        assert json.loads(path_out.read_text())[0]["name"] == "Patient:1"
+
+
+def test_iter_json_array():
+    data = [{"a": [1, "]", {"b": None}]}, 12345678901234567890, -1.5e-10, "x", []]
+    for text in (json.dumps(data), json.dumps(data, indent=2)):
+        for block_size in (1, 3, 1024):
+            assert list(models.iter_json_array(io.StringIO(text), block_size=block_size)) == data
+    for text in ("", "{}", "[1 2]", "[1,]", "[1,", "[1"):
+        with pytest.raises(ValueError):
+            list(models.iter_json_array(io.StringIO(text), block_size=2))
+
+
+def test_iter_cases_gzip(tmp_path):
+    for jsonl in (False, True):
+        path = tmp_path / "cases.json.gz"
+        with gzip.open(path, "wt") as f:
+            models.dump_cases(EXPECTED, f, jsonl=jsonl)
+        assert list(models.iter_cases(path)) == EXPECTED
@@ -0,0 +1,54 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+from gene_ranking_shootout import metrics, models, runner
+
+
+def test_metrics_from_ranks():
+    ranks = np.array([1, 1, 2, 3, 5, 12, 0, 4])
+    result = metrics.Metrics.from_ranks(ranks, max_k=5, bootstrap=500)
+    found = ranks[ranks > 0]
+    assert result.count == 8
+    assert result.missing == 1
+    assert result.top_k == [2 / 8, 3 / 8, 4 / 8, 5 / 8, 6 / 8]
+    assert result.mrr == pytest.approx((1 / found).sum() / 8)
+    assert result.mean_rank == pytest.approx(found.mean())
+    assert result.median_rank == np.median(found)
+    for name, value in result.values().items():
+        lower, upper = result.ci[name]
+        assert lower <= value <= upper
+
+    empty = metrics.Metrics.from_ranks(np.array([0, 0]), max_k=2)
+    assert empty.top_k == [0.0, 0.0]
+    assert empty.to_json()["metrics"]["mean_rank"] == {"value": None, "ci": [None, None]}
+
+
+def test_read_ranks(tmp_path):
+    case = models.Case(
+        name="Patient:1", disease_omim_id="unknown", disease_gene_id="Entrez:1", hpo_terms=[]
+    )
+    results = [
+        models.Result(case=case, rank=rank, result_entrez_ids=["Entrez:1"]) for rank in (3, 1)
+    ]
+    path = tmp_path / "results.jsonl"
+    with open(path, "wt") as outf:
+        for result in results:
+            models.dump_result_jsonl(result, outf)
+    assert metrics.read_ranks(path).tolist() == [3, 1]
+
+    outf = io.StringIO()
+    runner.BarPrinter(bars_top_n=2, outf=outf).print(results)
+    assert outf.getvalue().splitlines()[:4] == [
+        "    1:    1  #############",
+        "    2:    0  ",
+        "",
+        "3-..:    1  #############",
+    ]
+
+    outf = io.StringIO()
+    metrics.Metrics.from_ranks(metrics.read_ranks(path), bootstrap=0).write_tsv(outf)
+    assert outf.getvalue().splitlines()[3] == "\tall\ttop_1\t0.5\t\t"
+    assert json.dumps(metrics.Metrics.from_ranks(np.array([1]), max_k=1).to_json())
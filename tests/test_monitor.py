@@ -0,0 +1,75 @@
+import json
+import urllib.request
+
+from gene_ranking_shootout import cache, models, monitor, overhead, runner
+
+GENE_IDS = ["Entrez:6323", "Entrez:3785", "Entrez:4204", "Entrez:6792", "Entrez:5080"]
+
+
+def test_run_exports_metrics(tmp_path):
+    cases = overhead.make_cases(GENE_IDS, ["HP:0002069"], 6, candidate_genes_count=4)
+    cases_json = tmp_path / "cases.jsonl"
+    with open(cases_json, "wt") as outputf:
+        models.dump_cases(cases, outputf, jsonl=True)
+    server = overhead.StandInServer(overhead.FIXTURES_DIR)
+    with server.running():
+        for path in ("metrics.json", "metrics.prom"):
+            the_runner = runner.ExomiserRunner(
+                server.url,
+                "phenix",
+                cache=cache.RankingCache(tmp_path / "cache.sqlite"),
+                concurrency=2,
+                metrics_file=str(tmp_path / path),
+                metrics_interval=0.01,
+            )
+            the_runner.run(str(cases_json), str(tmp_path / "results.jsonl"))
+
+    # The first run asked the stand-in, the second one was answered from the cache.
+    prom = (tmp_path / "metrics.prom").read_text()
+    assert 'gene_ranking_shootout_cases_done_total{runner="ExomiserRunner"} 6' in prom
+    assert 'gene_ranking_shootout_cache_hit_rate{runner="ExomiserRunner"} 1.0' in prom
+    data = json.loads((tmp_path / "metrics.json").read_text())
+    assert (data["cases_total"], data["cases_done"], data["cases_failed"]) == (6, 6, 0)
+    assert data["http"]["requests"] == 6 and data["http"]["in_flight"] == 0
+    assert data["cache"]["hit_rate"] == 0.0
+    assert sum(data["latency"]["counts"]) == 6
+    # The stand-in ranks the genes by descending Entrez ID.
+    top_1 = sum(case.disease_gene_id == "Entrez:6792" for case in cases) / len(cases)
+    assert data["accuracy"] == {"top_1": top_1, "top_10": 1.0}
+
+
+def test_process_backend_metrics(tmp_path):
+    cases = overhead.make_cases(GENE_IDS, ["HP:0002069"], 6, candidate_genes_count=4)
+    cases_json = tmp_path / "cases.jsonl"
+    with open(cases_json, "wt") as outputf:
+        models.dump_cases(cases, outputf, jsonl=True)
+    server = overhead.StandInServer(overhead.FIXTURES_DIR)
+    with server.running():
+        runner.ExomiserRunner(
+            server.url,
+            "phenix",
+            backend="process",
+            concurrency=2,
+            metrics_file=str(tmp_path / "metrics.prom"),
+        ).run(str(cases_json), str(tmp_path / "results.jsonl"))
+    # The requests of the worker processes are counted, those in flight are not known.
+    prom = (tmp_path / "metrics.prom").read_text()
+    assert 'gene_ranking_shootout_http_requests_total{runner="ExomiserRunner"} 6' in prom
+    assert "in_flight" not in prom
+
+
+def test_metrics_server():
+    metrics = monitor.LiveMetrics(label="test")
+    metrics.add_cases(3)
+    metrics.record(models.Result(case=None, rank=2, result_entrez_ids=[], timings={"total": 0.2}))
+    metrics.record(None)
+    with monitor.MetricsServer(metrics).running() as server:
+        with urllib.request.urlopen(server.url) as response:
+            text = response.read().decode()
+        with urllib.request.urlopen(f"{server.url}.json") as response:
+            data = json.load(response)
+    assert 'gene_ranking_shootout_case_latency_seconds_bucket{runner="test",le="0.1"} 0' in text
+    assert 'gene_ranking_shootout_case_latency_seconds_bucket{runner="test",le="0.25"} 1' in text
+    assert 'gene_ranking_shootout_case_latency_seconds_count{runner="test"} 1' in text
+    assert data["accuracy"] == {"top_1": 0.0, "top_10": 0.5}
+    assert data["seconds_since_last_case"] >= 0
@@ -0,0 +1,34 @@
+import io
+
+import pytest
+
+from gene_ranking_shootout import overhead
+
+
+def test_run_suite(tmp_path):
+    measurements = list(overhead.run_suite(["exomiser", "cada-workers"], [5], [1, 2], latency=0.0))
+    assert [m.key for m in measurements] == [
+        ("exomiser", 5, 1),
+        ("exomiser", 5, 2),
+        ("cada-workers", 5, 1),
+        ("cada-workers", 5, 2),
+    ]
+    for m in measurements:
+        assert m.results == 5
+        assert m.throughput > 0
+        assert m.peak_rss_mb > 0
+
+    path = tmp_path / "measurements.jsonl"
+    with open(path, "wt") as outf:
+        for m in measurements:
+            overhead.dump_measurement_jsonl(m, outf)
+    assert overhead.load_measurements(path) == measurements
+
+    outf = io.StringIO()
+    overhead.print_measurement(measurements[0], outf, baseline={m.key: m for m in measurements})
+    assert outf.getvalue().rstrip().endswith("1.00x")
+
+
+def test_run_suite_missing_fixtures(tmp_path):
+    with pytest.raises(ValueError, match="not installed with the package"):
+        next(overhead.run_suite(["exomiser"], [5], [1], fixtures_dir=tmp_path))
@@ -0,0 +1,237 @@
+import json
+import math
+import os
+import pathlib
+
+import numpy as np
+import pytest
+import requests
+
+from gene_ranking_shootout import cache, genes, models, phenix, runner, transport
+
+HPO_DIR = pathlib.Path(__file__).parent / "data" / "phenix"
+
+
+@pytest.fixture(scope="module")
+def model():
+    return phenix.PhenixModel.from_dir(HPO_DIR)
+
+
+def test_ontology_from_obo():
+    ontology = phenix.Ontology.from_obo(HPO_DIR / "hp.obo")
+    assert ontology.version == "hp/releases/2024-01-01/fixture"
+    assert len(ontology.term_ids) == 12
+    assert "HP:0000999" not in ontology.index
+    assert ontology.index["HP:0002279"] == ontology.index["HP:0001250"]
+    gdd = ontology.index["HP:0001263"]
+    assert sorted(ontology.term_ids[p] for p in ontology.parents[gdd]) == [
+        "HP:0000707",
+        "HP:0012758",
+    ]
+
+
+def test_information_content(model):
+    ic = dict(zip(model.term_ids, model.information_content.tolist()))
+    assert ic["HP:0000001"] == 0.0
+    assert ic["HP:0000707"] == pytest.approx(math.log(7 / 4))
+    assert ic["HP:0002069"] == pytest.approx(math.log(7))
+    assert ic["HP:0001263"] == pytest.approx(math.log(7 / 2))
+
+
+def test_rank_matches_reference_scores(model):
+    """The ranking of the fixture query matches scores worked out by hand.
+
+    The expected scores in ``expected_scores.json`` were computed by hand from ``hp.obo`` and
+    ``genes_to_phenotype.txt`` of the fixture with the definition of the Phenix score in the
+    ``phenix`` module, rounded to four decimals, with ties in the order of the query genes.  They
+    are not a recorded VarFish response.
+    """
+    with open(HPO_DIR / "expected_scores.json") as f:
+        response = json.load(f)
+    gene_table = genes.GeneTable.load()
+    query = response["query"]
+    ((gene_ids, scores),) = model.rank(
+        [(query["terms"], gene_table.to_entrez_ids(query["gene_symbols"]))]
+    )
+    expected = response["result"]
+    assert gene_ids == gene_table.to_entrez_ids([entry["gene_symbol"] for entry in expected])
+    assert scores.tolist() == pytest.approx([entry["score"] for entry in expected], abs=1e-4)
+
+
+@pytest.mark.varfish
+@pytest.mark.skipif(
+    not os.environ.get("VARFISH_PHENIX_URL"), reason="VARFISH_PHENIX_URL is not set"
+)
+def test_rank_matches_varfish(model):
+    """The scores and rankings match those of ``varfish-server-worker``.
+
+    Needs a server started with the HPO data built from ``hp.obo`` and
+    ``genes_to_phenotype.txt`` of the fixture, e.g., ``VARFISH_PHENIX_URL`` set to
+    ``http://127.0.0.1:8081/hpo/sim/term-gene``.
+    """
+    base_url = os.environ["VARFISH_PHENIX_URL"]
+    gene_table = genes.GeneTable.load()
+    gene_ids = [f"Entrez:{gene_id}" for gene_id in model.gene_ids.tolist()]
+    rng = np.random.default_rng(42)
+    cases = [
+        models.Case(
+            name=f"Patient:{i}",
+            disease_omim_id="unknown",
+            disease_gene_id=gene_id,
+            hpo_terms=list(rng.choice(model.term_ids, size=rng.integers(1, 4), replace=False)),
+            candidate_gene_ids=[other for other in gene_ids if other != gene_id],
+        )
+        for i, gene_id in enumerate(gene_ids)
+    ]
+
+    # The scores of the server match the in-process ones.
+    the_transport = transport.Transport(requests.Session(), retries=0)
+    for case, (ranked, scores) in zip(
+        cases, model.rank([(case.hpo_terms, gene_ids) for case in cases])
+    ):
+        symbols = gene_table.to_symbols(gene_ids)
+        response = the_transport.get(
+            base_url, params={"terms": ",".join(case.hpo_terms), "gene_symbols": ",".join(symbols)}
+        ).json()
+        expected = dict(zip(gene_table.to_symbols(ranked), scores.tolist()))
+        actual = {entry["gene_symbol"]: entry["score"] for entry in response["result"]}
+        assert actual == pytest.approx(expected, abs=1e-4)
+
+    # Both runners rank the disease genes alike, up to the order of genes with equal scores.
+    varfish = runner.PhenixVarFishRunner(base_url, retries=0)
+    phenix_runner = runner.PhenixRunner(str(HPO_DIR))
+    for case in cases:
+        result = varfish.run_ranking(case)
+        expected = phenix_runner.run_ranking(case)
+        assert sorted(result.result_entrez_ids) == sorted(expected.result_entrez_ids)
+        ((ranked, scores),) = model.rank([(case.hpo_terms, expected.result_entrez_ids)])
+        score_of = dict(zip(ranked, scores.tolist()))
+        varfish_scores = [score_of[gene_id] for gene_id in result.result_entrez_ids]
+        assert varfish_scores == pytest.approx(sorted(varfish_scores, reverse=True))
+
+
+def naive_score(hpo_terms, gene_id):
+    """Score by comparing all pairs of terms, straight from the files."""
+    ontology = phenix.Ontology.from_obo(HPO_DIR / "hp.obo")
+
+    def ancestors(term):
+        result = {term}
+        for parent in ontology.parents[term]:
+            result |= ancestors(parent)
+        return result
+
+    annotations = {}
+    for entrez_id, term in phenix.read_annotations(HPO_DIR / "genes_to_phenotype.txt"):
+        if term in ontology.index:
+            annotations.setdefault(entrez_id, set()).add(ontology.index[term])
+    n = len(annotations)
+
+    def ic(term):
+        count = sum(1 for terms in annotations.values() if any(term in ancestors(t) for t in terms))
+        return math.log(n / count)
+
+    terms = {ontology.index[term] for term in hpo_terms if term in ontology.index}
+    if not terms or gene_id not in annotations:
+        return 0.0
+    return sum(
+        max(ic(a) for t in annotations[gene_id] for a in ancestors(q) & ancestors(t)) for q in terms
+    ) / len(terms)
+
+
+def test_rank_matches_naive(model):
+    rng = np.random.default_rng(42)
+    term_ids = [*model.term_ids, "HP:0002279", "HP:0009999"]
+    gene_ids = [f"Entrez:{gene_id}" for gene_id in [*model.gene_ids.tolist(), 4763]]
+    queries = [
+        (
+            list(rng.choice(term_ids, size=rng.integers(0, 4))),
+            list(rng.choice(gene_ids, size=rng.integers(1, 6), replace=False)),
+        )
+        for _ in range(20)
+    ]
+    for (hpo_terms, ids), (ranked, scores) in zip(queries, model.rank(queries)):
+        assert sorted(ranked) == sorted(ids)
+        expected = {gene_id: naive_score(hpo_terms, int(gene_id[7:])) for gene_id in ids}
+        assert scores.tolist() == pytest.approx([expected[gene_id] for gene_id in ranked])
+        # Ties keep the order of the genes in the query.
+        for a, b in zip(ranked, ranked[1:]):
+            if expected[a] == pytest.approx(expected[b]):
+                assert ids.index(a) < ids.index(b)
+
+
+def test_model_load_sidecar(tmp_path):
+    first = phenix.PhenixModel.load(HPO_DIR, cache_dir=tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
+    second = phenix.PhenixModel.load(HPO_DIR, cache_dir=tmp_path)
+    assert second.version == first.version
+    assert second.index == first.index
+    assert second.information_content.tolist() == first.information_content.tolist()
+
+
+def test_phenix_runner(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    cases = [
+        models.Case(
+            name="Patient:1",
+            disease_omim_id="OMIM:607208",
+            disease_gene_id="Entrez:6323",
+            hpo_terms=["HP:0002069", "HP:0001263"],
+            candidate_gene_ids=["Entrez:3785", "Entrez:4204", "Entrez:5080"],
+        ),
+        # The disease gene has the same score as the candidate, it is ranked below it.
+        models.Case(
+            name="Patient:2",
+            disease_omim_id="OMIM:142900",
+            disease_gene_id="Entrez:6910",
+            hpo_terms=["HP:0001627"],
+            candidate_gene_ids=["Entrez:2200"],
+        ),
+    ]
+    the_runner = runner.PhenixRunner(str(HPO_DIR), batch_size=2)
+    path = tmp_path / "results.jsonl"
+    the_runner.run_cases(cases, str(path))
+    results = list(models.iter_results(path))
+    assert [result.rank for result in results] == [1, 2]
+    assert results[0].result_entrez_ids == [
+        "Entrez:6323",
+        "Entrez:4204",
+        "Entrez:3785",
+        "Entrez:5080",
+    ]
+    assert {"invoke", "total", "rank"} <= set(results[0].timings)
+    single = runner.PhenixRunner(str(HPO_DIR), batch_size=1).run_ranking(cases[1])
+    assert single.result_entrez_ids == results[1].result_entrez_ids
+
+
+def test_phenix_runner_tied_disease_genes(tmp_path, monkeypatch):
+    """Cases with the same genes but another disease gene are not merged or cached together."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    case_a = models.Case(
+        name="Patient:A",
+        disease_omim_id="OMIM:142900",
+        disease_gene_id="Entrez:6910",
+        hpo_terms=["HP:0001627"],
+        candidate_gene_ids=["Entrez:2200"],
+    )
+    case_b = models.Case(
+        name="Patient:B",
+        disease_omim_id="unknown",
+        disease_gene_id="Entrez:2200",
+        hpo_terms=["HP:0001627"],
+        candidate_gene_ids=["Entrez:6910"],
+    )
+    assert runner.PhenixRunner(str(HPO_DIR)).run_ranking(case_b).rank == 2
+    ranking_cache = cache.RankingCache(tmp_path / "cache.sqlite3")
+    for expected_hits in (0, 2):
+        the_runner = runner.PhenixRunner(str(HPO_DIR), cache=ranking_cache)
+        path = tmp_path / "results.jsonl"
+        the_runner.run_cases([case_a, case_b], str(path))
+        assert [result.rank for result in models.iter_results(path)] == [2, 2]
+        assert ranking_cache.stats.hits == expected_hits
+    # Also a later run of case B alone does not get the cached ranking of case A.
+    ranking_cache = cache.RankingCache(tmp_path / "other.sqlite3")
+    for case in (case_a, case_b):
+        the_runner = runner.PhenixRunner(str(HPO_DIR), cache=ranking_cache)
+        the_runner.run_cases([case], str(path))
+        assert [result.rank for result in models.iter_results(path)] == [2]
+    assert ranking_cache.stats.hits == 0
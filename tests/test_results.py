@@ -0,0 +1,72 @@
+import pytest
+
+from gene_ranking_shootout import datasets, metrics, models, results, strata
+
+
+def make_results():
+    cases = models.load_cases_json(datasets.DATA_DIR / "cada_cases_test.json")[:50]
+    return [
+        models.Result(
+            case=case,
+            rank=i % 7,
+            result_entrez_ids=[f"Entrez:{j}" for j in range(i % 13)],
+            timings={"total": 0.5 * i, "end": 1e9 + i} if i % 3 else None,
+        )
+        for i, case in enumerate(cases)
+    ]
+
+
+def write_jsonl(path, values):
+    with open(path, "wt") as f:
+        for result in values:
+            models.dump_result_jsonl(result, f)
+
+
+def test_compact_results_round_trip(tmp_path):
+    expected = make_results()
+    write_jsonl(tmp_path / "results.jsonl", expected)
+    assert results.convert(tmp_path / "results.jsonl", tmp_path / "results.npz") == 50
+    with results.CompactResults.open(tmp_path / "results.npz") as compact:
+        assert len(compact) == 50
+        assert list(compact) == expected
+        assert compact[-1] == expected[-1]
+        assert compact[3:6] == expected[3:6]
+    # The file is closed, the arrays read stay available.
+    assert compact.arrays._npz.fid is None
+    assert compact.ranks.tolist() == [result.rank for result in expected]
+    assert list(models.iter_results(tmp_path / "results.npz")) == expected
+
+    results.convert(tmp_path / "results.npz", tmp_path / "back.jsonl")
+    with open(tmp_path / "results.jsonl") as f, open(tmp_path / "back.jsonl") as g:
+        assert f.read() == g.read()
+
+
+def test_compact_results_keep_top_k(tmp_path):
+    expected = make_results()
+    write_jsonl(tmp_path / "results.jsonl", expected)
+    results.convert(tmp_path / "results.jsonl", tmp_path / "results.npz", keep_top_k=3)
+    with results.CompactResults.open(tmp_path / "results.npz") as compact:
+        assert [result.result_entrez_ids for result in compact] == [
+            result.result_entrez_ids[:3] for result in expected
+        ]
+        assert [result.rank for result in compact] == [result.rank for result in expected]
+
+
+def test_compact_results_readers(tmp_path):
+    write_jsonl(tmp_path / "results.jsonl", make_results())
+    results.convert(tmp_path / "results.jsonl", tmp_path / "results.npz")
+    jsonl, npz = tmp_path / "results.jsonl", tmp_path / "results.npz"
+    assert list(metrics.iter_ranks(npz)) == list(metrics.iter_ranks(jsonl))
+    assert metrics.read_ranks(npz).tolist() == metrics.read_ranks(jsonl).tolist()
+    table, expected = strata.ResultTable.read(npz), strata.ResultTable.read(jsonl)
+    assert table.names == expected.names
+    assert table.disease_omim_ids == expected.disease_omim_ids
+    for name in ("ranks", "hpo_term_counts", "candidate_counts", "disease_gene_ids"):
+        assert getattr(table, name).tolist() == getattr(expected, name).tolist()
+
+
+def test_compact_results_invalid_gene_id():
+    result = make_results()[0]
+    result = models.Result(case=result.case, rank=1, result_entrez_ids=["HGNC:1"])
+    with pytest.raises(ValueError):
+        results.CompactResults.compile([result])
@@ -0,0 +1,351 @@
+import http.server
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+
+import attrs
+import cattrs
+import pytest
+
+from gene_ranking_shootout import cache, matrix, models, perf, runner, worker_shim
+
+
+class ExomiserStubHandler(http.server.BaseHTTPRequestHandler):
+    """Stub for the Exomiser prioritiser API that ranks genes by descending numeric ID."""
+
+    protocol_version = "HTTP/1.1"
+    #: Number of requests received.
+    requests = 0
+
+    def do_POST(self):
+        ExomiserStubHandler.requests += 1
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        gene_ids = sorted(payload["genes"], key=int, reverse=True)
+        body = json.dumps({"results": [{"geneId": gene_id} for gene_id in gene_ids]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def exomiser_url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ExomiserStubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cases_json(tmp_path):
+    cases = [
+        models.Case(
+            name=f"Patient:{i}",
+            disease_omim_id="unknown",
+            disease_gene_id=f"Entrez:{i}",
+            hpo_terms=["HP:0001263"],
+            candidate_gene_ids=[f"Entrez:{i + j}" for j in range(1, 6)],
+        )
+        for i in range(1, 21)
+    ]
+    path = tmp_path / "cases.json"
+    path.write_text(json.dumps(cattrs.unstructure(cases)))
+    return path
+
+
+@pytest.mark.parametrize(
+    "backend,concurrency", [(None, 0), (None, 4), ("thread", 4), ("process", 2), ("async", 4)]
+)
+def test_exomiser_runner_concurrency(exomiser_url, cases_json, tmp_path, backend, concurrency):
+    path_results = tmp_path / "results.json"
+    exomiser_runner = runner.ExomiserRunner(
+        exomiser_url, "phenix", backend=backend, concurrency=concurrency, chunksize=3
+    )
+    exomiser_runner.run(str(cases_json), str(path_results))
+    # Also the requests sent by worker processes are counted.
+    assert exomiser_runner.transport.stats.requests == 20
+
+    results = list(models.iter_results(path_results))
+    assert [result.case.name for result in results] == [f"Patient:{i}" for i in range(1, 21)]
+    assert {result.rank for result in results} == {6}
+    assert results[0].result_entrez_ids == [f"Entrez:{i}" for i in range(6, 0, -1)]
+
+
+@pytest.fixture
+def fake_cada_cmd():
+    fake_cada = pathlib.Path(__file__).parent / "data" / "cada" / "fake_cada.py"
+    return [sys.executable, str(runner.WORKER_SHIM_PATH), str(fake_cada)]
+
+
+@pytest.fixture
+def cada_cases():
+    case = models.Case(
+        name="Patient:1",
+        disease_omim_id="unknown",
+        disease_gene_id="Entrez:3798",
+        hpo_terms=["HP:0001258"],
+        candidate_gene_ids=["Entrez:6683", "Entrez:1"],
+    )
+    bad_case = attrs.evolve(case, name="Patient:2", hpo_terms=["HP:0000000"])
+    return [case, bad_case, attrs.evolve(case, name="Patient:3")]
+
+
+def check_cada_results(results):
+    assert results[1] is None
+    for result in (results[0], results[2]):
+        assert result is not None
+        assert result.rank == 2
+        assert result.result_entrez_ids == ["Entrez:6683", "Entrez:3798"]
+
+
+def test_cada_runner_worker_pool(fake_cada_cmd, cada_cases):
+    cada_runner = runner.CadaRunner(workers=2, worker_cmd=fake_cada_cmd)
+    try:
+        results = [cada_runner.run_ranking(case) for case in cada_cases]
+    finally:
+        cada_runner.close()
+    check_cada_results(results)
+
+
+def test_cada_runner_worker_module(cada_cases, tmp_path, monkeypatch):
+    podman_dir = pathlib.Path(__file__).parent / "data" / "podman"
+    monkeypatch.setenv("PATH", f"{podman_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_TOOL_LOADS", str(tmp_path / "loads.txt"))
+    cada_runner = runner.CadaRunner(workers=2)
+    assert cada_runner.worker_cmd[-3:] == ["--module", runner.WORKER_MODULE_MOUNT, "/app"]
+    try:
+        results = [cada_runner.run_ranking(case) for case in cada_cases * 3]
+    finally:
+        cada_runner.close()
+    check_cada_results(results[:3])
+    # The model is loaded once per worker, not for each of the nine cases.
+    loads = (tmp_path / "loads.txt").read_text().splitlines()
+    assert len(loads) == 2
+    assert len({line.split()[0] for line in loads}) == 2
+    assert all(line.endswith(" /app") for line in loads)
+
+
+def test_worker_shim_sibling_imports(tmp_path):
+    tool_dir = tmp_path / "tool"
+    tool_dir.mkdir()
+    (tool_dir / "sibling.py").write_text("GREETING = 'hello'\n")
+    (tool_dir / "tool.py").write_text(
+        "import sys\n"
+        "import sibling\n"
+        "with open(sys.argv[1], 'wt') as f:\n"
+        "    f.write(sibling.GREETING)\n"
+    )
+    request = {"args": ["{workdir}/out.txt"], "outputs": ["out.txt"]}
+    path = list(sys.path)
+    response = worker_shim.handle(worker_shim.ScriptTool(str(tool_dir / "tool.py")), request)
+    assert response == {"outputs": {"out.txt": "hello"}}
+    assert sys.path == path
+
+
+def test_cada_runner_dedup(fake_cada_cmd, cada_cases, tmp_path):
+    cases = [
+        cada_cases[0],
+        attrs.evolve(cada_cases[0], name="Patient:4", candidate_gene_ids=["Entrez:79152"]),
+        attrs.evolve(
+            cada_cases[0],
+            name="Patient:5",
+            disease_gene_id="Entrez:23503",
+            candidate_gene_ids=["Entrez:6683"],
+        ),
+    ]
+    cada_runner = runner.CadaRunner(worker_cmd=fake_cada_cmd, workers=1)
+    assert len({cache.hash_json(cada_runner.dedup_key(case)) for case in cases}) == 1
+    merged = cada_runner.merge_cases(cases)
+    assert merged.candidate_gene_ids == ["Entrez:6683", "Entrez:1", "Entrez:79152", "Entrez:23503"]
+
+    cases_json = tmp_path / "cases.json"
+    cases_json.write_text(json.dumps(cattrs.unstructure(cases)))
+    cada_runner.run(str(cases_json), str(tmp_path / "results.jsonl"))
+    results = list(models.iter_results(tmp_path / "results.jsonl"))
+    assert [result.result_entrez_ids for result in results] == [
+        ["Entrez:6683", "Entrez:3798"],
+        ["Entrez:3798", "Entrez:79152"],
+        ["Entrez:6683", "Entrez:23503"],
+    ]
+    assert [result.rank for result in results] == [2, 1, 2]
+
+
+def test_cada_runner_batch(fake_cada_cmd, cada_cases):
+    cada_runner = runner.CadaRunner(batch_size=3, worker_cmd=fake_cada_cmd)
+    check_cada_results(cada_runner.run_ranking_batch(cada_cases))
+
+
+def test_exomiser_runner_cache(exomiser_url, cases_json, tmp_path):
+    path_cache = tmp_path / "cache.sqlite3"
+    for expected_hits in (0, 20):
+        ranking_cache = cache.RankingCache(path_cache)
+        exomiser_runner = runner.ExomiserRunner(exomiser_url, "phenix", cache=ranking_cache)
+        exomiser_runner.run(str(cases_json), str(tmp_path / "results.json"))
+        assert ranking_cache.stats.hits == expected_hits
+        assert ranking_cache.stats.misses == 20 - expected_hits
+
+    exomiser_runner.invalidate_cache()
+    ranking_cache.max_size = 0
+    ranking_cache.put("key", "runner", ["Entrez:1"])
+    ranking_cache.evict()
+    assert ranking_cache.get("key") is None
+
+
+def test_exomiser_runner_resume(exomiser_url, cases_json, tmp_path):
+    path_results = tmp_path / "results.jsonl"
+    exomiser_runner = runner.ExomiserRunner(exomiser_url, "phenix")
+    exomiser_runner.run(str(cases_json), str(path_results))
+    lines = path_results.read_text().splitlines(keepends=True)
+    assert len(lines) == 20
+
+    # Simulate crash while writing the sixth result.
+    path_results.write_text("".join(lines[:5]) + lines[5][:10])
+    exomiser_runner.run(str(cases_json), str(path_results), resume=True)
+
+    def without_timings(lines):
+        records = [json.loads(line) for line in lines]
+        for record in records:
+            assert record.pop("timings")
+        return records
+
+    assert without_timings(path_results.read_text().splitlines()) == without_timings(lines)
+
+
+def test_exomiser_runner_compact_results(exomiser_url, cases_json, tmp_path):
+    path_jsonl, path_npz = tmp_path / "results.jsonl", tmp_path / "results.npz"
+    runner.ExomiserRunner(exomiser_url, "phenix").run(str(cases_json), str(path_jsonl))
+    runner.ExomiserRunner(exomiser_url, "phenix").run(str(cases_json), str(path_npz))
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "cases.json",
+        "results.jsonl",
+        "results.npz",
+    ]
+    assert [(r.case, r.rank, r.result_entrez_ids) for r in models.iter_results(path_npz)] == [
+        (r.case, r.rank, r.result_entrez_ids) for r in models.iter_results(path_jsonl)
+    ]
+
+
+def test_run_matrix(exomiser_url, cases_json, tmp_path):
+    config = cattrs.structure(
+        {
+            "methods": [
+                {
+                    "name": "exomiser",
+                    "runner": "exomiser",
+                    "args": {"base_url": exomiser_url, "concurrency": 2},
+                    "expand": {"algorithm": ["phenix", "phive"]},
+                },
+                {
+                    "name": "exomiser-hiphive",
+                    "runner": "exomiser",
+                    "args": {"base_url": exomiser_url, "algorithm": "hiphive"},
+                },
+            ]
+        },
+        matrix.MatrixConfig,
+    )
+    outcomes = matrix.run_matrix(config, models.load_cases_json(cases_json), tmp_path / "out")
+    assert [outcome.name for outcome in outcomes] == [
+        "exomiser-phenix",
+        "exomiser-phive",
+        "exomiser-hiphive",
+    ]
+    for outcome in outcomes:
+        assert outcome.error is None
+        assert outcome.path == tmp_path / "out" / f"{outcome.name}.jsonl"
+        assert [result.rank for result in models.iter_results(outcome.path)] == [6] * 20
+
+    with pytest.raises(ValueError):
+        attrs.evolve(config, methods=config.methods * 2).expanded()
+    with pytest.raises(ValueError):
+        matrix.MatrixConfig(methods=[matrix.MethodConfig(name="x", runner="unknown")]).expanded()
+
+
+@pytest.mark.parametrize("unordered", [False, True])
+def test_exomiser_runner_dedup(exomiser_url, cases_json, tmp_path, unordered):
+    cases = models.load_cases_json(cases_json)
+    # Same query as the first case but with another of the genes as disease gene.
+    cases += [
+        attrs.evolve(
+            case,
+            name=f"{case.name}-copy",
+            disease_gene_id=case.candidate_gene_ids[0],
+            candidate_gene_ids=[case.disease_gene_id, *case.candidate_gene_ids[1:]],
+        )
+        for case in cases
+    ]
+    cases_json.write_text(json.dumps(cattrs.unstructure(cases)))
+    ExomiserStubHandler.requests = 0
+    runner.ExomiserRunner(exomiser_url, "phenix", concurrency=3, ordered=not unordered).run(
+        str(cases_json), str(tmp_path / "results.jsonl")
+    )
+    assert ExomiserStubHandler.requests == 20
+
+    results = list(models.iter_results(tmp_path / "results.jsonl"))
+    if unordered:
+        results.sort(key=lambda result: cases.index(result.case))
+    assert [result.case for result in results] == cases
+    assert [result.rank for result in results] == [6] * 20 + [5] * 20
+
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+    """Answers each request only after 2 seconds."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(2.0)
+        self.send_error(503)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_exomiser_runner_deadline(cases_json, tmp_path):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        exomiser_runner = runner.ExomiserRunner(
+            f"http://127.0.0.1:{server.server_port}",
+            "phenix",
+            timeout=0.3,
+            retries=100,
+            deadline=1.0,
+            concurrency=1,
+        )
+        case = models.load_cases_json(cases_json)[0]
+        start = time.monotonic()
+        exomiser_runner.run_cases([case], str(tmp_path / "results.jsonl"))
+        # Without the deadline, the 100 retries would take minutes.
+        assert time.monotonic() - start < 3.0
+    finally:
+        server.shutdown()
+        server.server_close()
+    stats = exomiser_runner.transport.stats
+    assert (stats.requests, stats.failures) == (1, 1)
+    assert stats.timeouts >= 2
+    assert list(models.iter_results(tmp_path / "results.jsonl")) == []
+
+
+def test_exomiser_runner_timings(exomiser_url, cases_json, tmp_path):
+    path_results = tmp_path / "results.jsonl"
+    runner.ExomiserRunner(exomiser_url, "phenix").run(str(cases_json), str(path_results))
+    results = list(models.iter_results(path_results))
+    for result in results:
+        assert set(perf.PHASES) | {"total", "end"} == set(result.timings)
+        assert sum(result.timings[name] for name in perf.PHASES) <= result.timings["total"]
+
+    summary = perf.PerfSummary.from_results(results, slowest=3)
+    assert summary.count == summary.timed == 20
+    assert summary.phases["invoke"].count == 20
+    assert len(summary.slowest) == 3
+    assert sum(count for _, count in summary.histogram) == 20
@@ -0,0 +1,135 @@
+import os
+import pathlib
+import socket
+import time
+
+import pytest
+
+from gene_ranking_shootout import models, runner, shards
+
+HPO_DIR = pathlib.Path(__file__).parent / "data" / "phenix"
+
+GENE_IDS = ["Entrez:6323", "Entrez:3785", "Entrez:4204", "Entrez:6792", "Entrez:5080"]
+
+
+@pytest.fixture
+def cases():
+    return [
+        models.Case(
+            name=f"Patient:{i}",
+            disease_omim_id="OMIM:607208",
+            disease_gene_id=GENE_IDS[i % len(GENE_IDS)],
+            hpo_terms=["HP:0002069", "HP:0001263"][: 1 + i % 2],
+            candidate_gene_ids=[g for g in GENE_IDS if g != GENE_IDS[i % len(GENE_IDS)]],
+        )
+        for i in range(11)
+    ]
+
+
+@pytest.fixture
+def cases_json(cases, tmp_path):
+    path = tmp_path / "cases.jsonl"
+    with open(path, "wt") as outputf:
+        models.dump_cases(cases, outputf, jsonl=True)
+    return str(path)
+
+
+@pytest.fixture
+def phenix_runner(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return lambda: runner.PhenixRunner(str(HPO_DIR), batch_size=4)
+
+
+def result_names(path):
+    return [result.case.name for result in models.iter_results(path)]
+
+
+def test_shards_merge(cases, cases_json, phenix_runner, tmp_path):
+    paths = []
+    for index in range(1, 4):
+        path = str(tmp_path / f"shard-{index}.jsonl")
+        phenix_runner().run(cases_json, path, shard=(index, 3))
+        assert result_names(path) == [case.name for case in cases[index - 1 :: 3]]
+        paths.append(path)
+
+    merged = tmp_path / "merged.jsonl"
+    report = shards.merge_results(paths, merged, cases=cases)
+    assert report.results == len(cases) and not report.missing
+    assert result_names(merged) == [case.name for case in cases]
+
+    with pytest.raises(ValueError, match="Duplicate result"):
+        shards.merge_results([*paths, paths[0]], merged, cases=cases)
+    with pytest.raises(ValueError, match="no result"):
+        shards.merge_results(paths[:2], merged, cases=cases)
+    with pytest.raises(ValueError, match="not in the run"):
+        shards.merge_results(paths, merged, cases=cases[:5])
+    report = shards.merge_results(
+        paths[:2], tmp_path / "merged.npz", cases=cases, allow_missing=True
+    )
+    assert report.missing == [case.name for case in cases[2::3]]
+    assert result_names(tmp_path / "merged.npz") == [
+        case.name for case in cases if case.name not in report.missing
+    ]
+
+
+def test_merge_results_temporary_file(cases, cases_json, phenix_runner, tmp_path, monkeypatch):
+    path = str(tmp_path / "shard.jsonl")
+    phenix_runner().run(cases_json, path)
+    # Another host with the same process ID writes its merged results at the same time.
+    monkeypatch.setattr(socket, "gethostname", lambda: "host-1")
+    replaced = []
+    monkeypatch.setattr(os, "replace", lambda src, dst: replaced.append(src) or os.rename(src, dst))
+    shards.merge_results([path], tmp_path / "merged.jsonl", cases=cases)
+    monkeypatch.setattr(socket, "gethostname", lambda: "host-2")
+    shards.merge_results([path], tmp_path / "merged.jsonl", cases=cases)
+    assert len(set(replaced)) == 2
+    assert result_names(tmp_path / "merged.jsonl") == [case.name for case in cases]
+
+
+def test_work_queue_claims(cases, tmp_path):
+    path = tmp_path / "queue"
+    queue = shards.WorkQueue.create(path, cases, chunk_size=4)
+    # A second worker opens the same queue, other cases are rejected.
+    other = shards.WorkQueue.create(path, cases, chunk_size=4)
+    with pytest.raises(ValueError, match="other cases"):
+        shards.WorkQueue.create(path, cases[:5], chunk_size=4)
+    assert queue.status() == shards.QueueStatus(todo=3, claimed=0, done=0)
+
+    first, second = queue.claim(), other.claim()
+    assert {first, second} == {"000000", "000001"}
+    assert [case.name for case in queue.chunk_cases(cases, "000002")] == [
+        "Patient:8",
+        "Patient:9",
+        "Patient:10",
+    ]
+    assert queue.status() == shards.QueueStatus(todo=1, claimed=2, done=0)
+
+    # The stale claim of a crashed worker is run again.
+    old = time.time() - 3600
+    os.utime(path / "claimed" / second, (old, old))
+    assert queue.requeue_stale(60) == [second]
+    assert queue.claim() == second
+
+    for name in (first, second):
+        results_path = tmp_path / f"{name}.jsonl"
+        results_path.write_text("")
+        queue.complete(name, results_path)
+    assert queue.status() == shards.QueueStatus(todo=1, claimed=0, done=2)
+    assert not queue.status().complete
+
+
+def test_run_queue(cases, cases_json, phenix_runner, tmp_path):
+    queue_dir = str(tmp_path / "queue")
+    results_json = tmp_path / "results.jsonl"
+    # A worker that crashed after claiming a chunk.
+    crashed = shards.WorkQueue.create(queue_dir, cases, chunk_size=4)
+    assert crashed.claim() == "000000"
+
+    phenix_runner().run_queue(cases_json, queue_dir, str(results_json), chunk_size=4)
+    assert not results_json.exists()
+    assert crashed.status() == shards.QueueStatus(todo=0, claimed=1, done=2)
+
+    phenix_runner().run_queue(
+        cases_json, queue_dir, str(results_json), chunk_size=4, requeue_after=0
+    )
+    assert result_names(results_json) == [case.name for case in cases]
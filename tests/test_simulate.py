@@ -0,0 +1,104 @@
+import io
+import pathlib
+
+import numpy as np
+import pytest
+
+from gene_ranking_shootout import executor
+from gene_ranking_shootout import genes as genes_
+from gene_ranking_shootout import models, simulate
+
+
+@pytest.fixture(scope="module")
+def genes():
+    return genes_.GeneTable.from_tsv(genes_.GNOMAD_COUNTS_PATH)
+
+
+@pytest.fixture(scope="module")
+def cases():
+    return models.load_cases_json(
+        pathlib.Path(models.__file__).parent / "data" / "cada_cases_test.json"
+    )
+
+
+def test_sample_without_replacement():
+    table = simulate.AliasTable(np.array([0.0, 1.0, 2.0, 0.0, 4.0, 8.0]))
+    rng = np.random.default_rng(42)
+    drawn = simulate.sample_without_replacement(rng, table, 1000, 4)
+    assert drawn.shape == (1000, 4)
+    assert all(sorted(row) == [1, 2, 4, 5] for row in drawn.tolist())
+    # The heaviest index is drawn first most of the time.
+    assert 0.4 < np.mean(drawn[:, 0] == 5) < 0.65
+
+
+def test_sample_without_replacement_exact():
+    # The light indices are rarely all drawn in the first round of draws, so most rows need
+    # more rounds, which must not change the distribution.
+    weights = np.array([100.0, 1.0, 1.0, 1.0])
+    table = simulate.AliasTable(weights)
+    rng = np.random.default_rng(42)
+    rows = 20_000
+    drawn = simulate.sample_without_replacement(rng, table, rows, 4)
+    # The first index is drawn with probability proportional to its weight.
+    first = np.bincount(drawn[:, 0], minlength=4) / rows
+    expected = weights / weights.sum()
+    tolerance = 5 * np.sqrt(expected * (1 - expected) / rows)
+    assert np.all(np.abs(first - expected) < tolerance)
+
+
+@pytest.mark.parametrize("replace", [False, True])
+def test_simulation(cases, genes, replace):
+    def make():
+        return simulate.Simulation(
+            cases,
+            genes,
+            case_count=50,
+            candidate_genes_count=10,
+            seed=1,
+            replace=replace,
+        )
+
+    simulated = list(make().iter_cases())
+    assert simulated == list(make().iter_cases())
+    assert len({case.name for case in simulated}) == 50
+    for case in simulated:
+        assert len(set(case.candidate_gene_ids)) == 10
+        assert case.disease_gene_id not in case.candidate_gene_ids
+
+    jsonl = io.StringIO()
+    make().write_jsonl(jsonl)
+    expected = io.StringIO()
+    models.dump_cases(simulated, expected, jsonl=True)
+    assert jsonl.getvalue() == expected.getvalue()
+
+
+@pytest.mark.parametrize("replace", [False, True])
+def test_simulation_shards(cases, genes, replace):
+    simulation = simulate.Simulation(
+        cases,
+        genes,
+        case_count=95,
+        candidate_genes_count=5,
+        seed=1,
+        replace=replace,
+        block_size=10,
+    )
+    expected = io.StringIO()
+    simulation.write_jsonl(expected)
+    assert len(expected.getvalue().splitlines()) == 95
+
+    sharded = io.StringIO()
+    for i in range(1, 5):
+        simulation.write_jsonl(sharded, shard=(i, 4))
+    assert sharded.getvalue() == expected.getvalue()
+
+    parallel = io.StringIO()
+    simulation.write_jsonl(parallel, executor=executor.Executor("process", 2))
+    assert parallel.getvalue() == expected.getvalue()
+
+
+def test_parse_shard():
+    assert simulate.parse_shard("2/3") == (2, 3)
+    for value in ("0/3", "4/3", "1", "a/b"):
+        with pytest.raises(ValueError):
+            simulate.parse_shard(value)
@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+from click.testing import CliRunner
+
+from gene_ranking_shootout import startup
+from gene_ranking_shootout.cli import main
+
+
+def test_cli_import_is_lightweight():
+    code = (
+        "import sys, gene_ranking_shootout.cli; "
+        "print(','.join(sorted(m for m in sys.modules if m.startswith('gene_ranking_shootout')"
+        " or m in ('numpy', 'requests', 'tqdm', 'cattrs'))))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    assert output.strip() == "gene_ranking_shootout,gene_ranking_shootout.cli"
+
+
+def test_lazy_choice():
+    result = CliRunner().invoke(main, ["benchmark", "summarize", "--by", "bogus", "x.jsonl"])
+    assert result.exit_code == 2
+    assert "hpo-terms" in result.output
+
+
+def test_parse_importtime():
+    text = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |     click.types\n"
+        "import time:       200 |        300 |   click\n"
+        "import time:        50 |        350 | gene_ranking_shootout.cli\n"
+    )
+    assert startup.parse_importtime(text) == [
+        startup.ImportTime("click.types", 100, 100, 2),
+        startup.ImportTime("click", 200, 300, 1),
+        startup.ImportTime("gene_ranking_shootout.cli", 50, 350, 0),
+    ]
+
+
+def test_measure():
+    python, help_ = startup.measure([("--help",)], repeat=1)
+    assert python.argv is None and len(python.seconds) == 1
+    assert help_.argv == ("--help",) and help_.best > 0
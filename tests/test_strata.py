@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from gene_ranking_shootout import genes, metrics, models, strata
+
+
+def test_grouped_metrics():
+    rng = np.random.default_rng(0)
+    ranks = rng.integers(0, 15, size=1000)
+    codes = rng.integers(0, 4, size=1000)
+    codes[codes == 2] = 3  # group 2 stays empty
+    grouped = strata.grouped_metrics(ranks, codes, 4, max_k=5)
+    assert grouped[2].count == 0
+    for g in (0, 1, 3):
+        expected = metrics.Metrics.from_ranks(ranks[codes == g], max_k=5, bootstrap=0)
+        assert (grouped[g].count, grouped[g].missing) == (expected.count, expected.missing)
+        assert grouped[g].values() == pytest.approx(expected.values())
+
+
+def test_stratify(tmp_path):
+    path = tmp_path / "results.jsonl"
+    with open(path, "wt") as outf:
+        for i, rank in enumerate([1, 3, 2, 7]):
+            case = models.Case(
+                name=f"Patient:SCV000281758#{i}" if i else "Patient:unknown",
+                disease_omim_id="OMIM:617360" if i % 2 else "unknown",
+                disease_gene_id="Entrez:8621",
+                hpo_terms=["HP:0001508"] * (i + 1),
+                candidate_gene_ids=["Entrez:1"] * 10 if i else None,
+            )
+            models.dump_result_jsonl(models.Result(case, rank, ["Entrez:8621"]), outf)
+    table = strata.ResultTable.read(path)
+    assert table.ranks.tolist() == [1, 3, 2, 7]
+
+    def summary(by, **kwargs):
+        return [(label, m.count, m.mean_rank) for label, m in strata.stratify(table, by, **kwargs)]
+
+    assert summary("hpo-terms") == [("1", 1, 1.0), ("2", 1, 3.0), ("3", 1, 2.0), ("4-5", 1, 7.0)]
+    assert summary("candidates") == [("none", 1, 1.0), ("10-99", 3, 4.0)]
+    assert summary("omim", omim_top_n=1) == [("OMIM:617360", 2, 5.0), ("other", 2, 1.5)]
+    assert summary("dataset", datasets=["cada_cases_validate"]) == [
+        ("cada_cases_validate", 3, 4.0),
+        ("unknown", 1, 1.0),
+    ]
+    table = genes.GeneTable.from_tsv(genes.GNOMAD_COUNTS_PATH)
+    assert len(strata.by_gene_prior(strata.ResultTable.read(path), table)[1]) == 4
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from gene_ranking_shootout import datasets, overhead, sweep
+
+
+def test_stand_in_sweep(tmp_path):
+    cases = datasets.load_dataset("cada_cases_test")
+    with sweep.stand_in_args("exomiser", latency=0.0, gene_latency=0.0005) as args:
+        points = list(
+            sweep.run_sweep("exomiser", args, cases, [40, 5], case_count=6, results_dir=tmp_path)
+        )
+    assert [point.candidates for point in points] == [5, 40]
+    for point in points:
+        assert (point.cases, point.results) == (6, 6)
+        assert point.throughput > 0
+        assert 0 <= point.top_k["top_1"] <= point.top_k["top_10"] <= 1
+        assert (tmp_path / f"candidates-{point.candidates}.jsonl").exists()
+    # The latency of the stand-in grows with the candidate genes.
+    assert points[1].latency_percentiles[0] > points[0].latency_percentiles[0]
+
+    report = sweep.SweepReport(runner="exomiser", points=points)
+    assert report.latency_exponent > 0
+    path = tmp_path / "sweep.json"
+    sweep.write_report(report, path)
+    data = json.loads(path.read_text())
+    assert [point["candidates"] for point in data["points"]] == [5, 40]
+    assert data["latency_exponent"] == report.latency_exponent
+
+
+def test_stand_in_args_unsupported():
+    with pytest.raises(ValueError, match="No stand-in for phenix"):
+        with sweep.stand_in_args("phenix", latency=0.0, gene_latency=0.0):
+            pass
+
+
+def test_stand_in_args_missing_fixtures(monkeypatch, tmp_path):
+    monkeypatch.setattr(overhead, "FIXTURES_DIR", tmp_path)
+    with pytest.raises(ValueError, match="No test fixtures"):
+        with sweep.stand_in_args("exomiser", latency=0.0, gene_latency=0.0):
+            pass
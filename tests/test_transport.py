@@ -0,0 +1,77 @@
+import http.server
+import threading
+import time
+
+import pytest
+import requests
+
+from gene_ranking_shootout import transport
+
+
+class FlakyHandler(http.server.BaseHTTPRequestHandler):
+    """Answers ``/fail/N`` with 503 for the first N requests and ``/slow`` after a delay."""
+
+    protocol_version = "HTTP/1.1"
+    #: Number of requests received per path.
+    counts: dict = {}
+
+    def do_GET(self):
+        count = self.counts[self.path] = self.counts.get(self.path, 0) + 1
+        if self.path == "/slow":
+            time.sleep(0.5)
+        status = 503 if self.path.startswith("/fail/") and count <= int(self.path[6:]) else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def base_url():
+    FlakyHandler.counts = {}
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_transport_retries(base_url):
+    the_transport = transport.Transport(requests.Session(), retries=2, backoff=0.01)
+    assert the_transport.get(f"{base_url}/fail/2").status_code == 200
+    with pytest.raises(requests.HTTPError):
+        the_transport.get(f"{base_url}/fail/3")
+    assert the_transport.stats == transport.TransportStats(
+        requests=2, retries=4, timeouts=0, failures=1
+    )
+
+
+def test_transport_timeout(base_url):
+    the_transport = transport.Transport(requests.Session(), timeout=0.1, retries=1, backoff=0.01)
+    with pytest.raises(requests.Timeout):
+        the_transport.get(f"{base_url}/slow")
+    assert the_transport.stats == transport.TransportStats(
+        requests=1, retries=1, timeouts=2, failures=1
+    )
+
+
+def test_aimd_limiter():
+    limiter = transport.AimdLimiter(8, cooldown=0.0)
+    limiter.acquire()
+    limiter.release(True, 0.1)
+    assert limiter.limit == 8
+    limiter.acquire()
+    limiter.release(False, 0.1)
+    assert limiter.limit == 4
+    limiter.acquire()
+    limiter.release(True, 1.0)  # much slower than the fastest request
+    assert limiter.limit == 2
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(True, 0.1)
+    assert 3 < limiter.limit < 4
+    assert limiter.in_flight == 0